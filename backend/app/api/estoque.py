@@ -1,18 +1,242 @@
-from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Dict, List, Tuple
+import asyncio
 import logging
-from ..models.estoque import EntradaEstoqueRequest, EntradaEstoqueResponse, ProdutoInfo
-from ..services.tiny_api import tiny_client
+from ..models.estoque import (
+    EntradaEstoqueRequest, EntradaEstoqueResponse, ProdutoInfo,
+    ProdutosLoteRequest, ProdutosLoteResponse
+)
+from estoque_comum.leitura import resumo as resumo_leituras
+from estoque_comum.metricas import consulta_cache
+from estoque_comum.tiny import nome_movimentacao
+from ..services.tiny_api import tiny_client, extrair_saldos
 from ..core.redis_client import redis_client
 from ..services.cache_produtos import cache_produtos
+from ..services.eventos import hub_eventos, formatar_sse
+from ..core.config import settings
+from ..core.http_cache import etag_fraco, etag_corresponde, cabecalhos_cache, nao_modificado
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/entrada", response_model=EntradaEstoqueResponse)
-async def entrada_estoque(entrada: EntradaEstoqueRequest):
+MAX_CODIGOS_POR_CONSULTA = 200
+
+def _delta_movimentacao(tipo: str, quantidade: int) -> Optional[int]:
+    """Variação do saldo causada pela movimentação (None para balanço)"""
+    if tipo == 'E':
+        return quantidade
+    if tipo == 'S':
+        return -quantidade
+    return None
+
+async def _saldo_apos_movimentacao(
+    codigo: str,
+    produto_id: str,
+    tipo: str,
+    quantidade: int,
+    deposito: Optional[str] = None
+) -> Optional[int]:
+    """
+    Atualiza o saldo cacheado após a movimentação no Tiny.
+    Com saldo recente em cache aplica só a diferença, atomicamente no Redis;
+    senão relê o Tiny e grava se nenhuma outra movimentação interferiu.
+    """
+    saldo = await cache_produtos.concluir_movimentacao(
+        codigo, _delta_movimentacao(tipo, quantidade), deposito=deposito
+    )
+    if saldo is not None:
+        return saldo
+    saldos = await _saldo_do_tiny(codigo, produto_id)
+    return saldos[0] if saldos else None
+
+async def _saldo_do_tiny(
+    codigo: str,
+    produto_id: str,
+    versao: Optional[int] = None
+) -> Optional[Tuple[int, Dict[str, int]]]:
+    """
+    Lê saldo total e por depósito no Tiny e grava no cache com checagem de
+    versão (a versão precisa ter sido lida antes da consulta ao Tiny, por
+    isso a leitura é fresca e não reaproveita o cache de leitura do cliente).
+    """
+    if versao is None:
+        versao = await cache_produtos.versao_saldo(codigo)
+    estoque_info = await tiny_client.obter_estoque(produto_id, fresco=True)
+    if not estoque_info:
+        return None
+    
+    saldo, depositos = extrair_saldos(estoque_info)
+    try:
+        await cache_produtos.definir_saldo(codigo, saldo, versao, depositos)
+    except Exception as e:
+        logger.debug(f"Não foi possível cachear saldo: {e}")
+    return saldo, depositos
+
+def _produto_info_do_cache(
+    codigo: str,
+    registro: Dict[str, str],
+    exigir_depositos: bool = False
+) -> Optional[ProdutoInfo]:
+    """Monta o ProdutoInfo a partir do hash, se estiver completo e com saldo recente"""
+    completo = (
+        bool(registro.get('id') and registro.get('nome') and 'saldo' in registro)
+        and cache_produtos.saldo_valido(registro.get('saldo_em'))
+        and (not exigir_depositos or 'depositos_em' in registro)
+    )
+    consulta_cache('redis', completo)
+    if not completo:
+        return None
+    return ProdutoInfo(
+        id=registro['id'],
+        codigo=codigo,
+        nome=registro['nome'],
+        unidade=registro.get('unidade') or 'UN',
+        saldo=int(registro['saldo']),
+        depositos=cache_produtos.depositos_do_registro(registro)
+    )
+
+async def _produto_info_do_tiny(codigo: str, registro: Dict[str, str]) -> Optional[ProdutoInfo]:
+    """
+    Completa no Tiny o que faltar no cache (cadastro e/ou saldo).
+    Com o id conhecido as chamadas saem em paralelo; sem ele, a pesquisa
+    pelo código vem primeiro e a gravação do cadastro corre junto do saldo.
+    """
+    versao = int(registro.get('versao') or 0)
+    produto_id = registro.get('id')
+    if produto_id and registro.get('nome'):
+        # Produto em cache, só o saldo precisa ser relido
+        produto = {'id': produto_id, 'nome': registro['nome'], 'unidade': registro.get('unidade')}
+        saldos = await _saldo_do_tiny(codigo, produto_id, versao)
+    elif produto_id:
+        # Só o índice código -> id: detalhes e saldo são independentes
+        produto, saldos = await asyncio.gather(
+            tiny_client.obter_produto(produto_id),
+            _saldo_do_tiny(codigo, produto_id, versao)
+        )
+        if not produto:
+            return None
+        await _cachear_produto(codigo, produto)
+    else:
+        # Buscar do Tiny
+        produto = await tiny_client.buscar_produto_por_codigo(codigo)
+        
+        if not produto:
+            return None
+        
+        _, saldos = await asyncio.gather(
+            _cachear_produto(codigo, produto),
+            _saldo_do_tiny(codigo, produto['id'], versao)
+        )
+    
+    saldo, depositos = saldos or (0, {})
+    
+    return ProdutoInfo(
+        id=produto['id'],
+        codigo=codigo,
+        nome=produto.get('nome', 'Sem nome'),
+        unidade=produto.get('unidade') or 'UN',
+        saldo=saldo,
+        depositos=depositos
+    )
+
+async def _publicar_movimentacao(
+    tipo: str,
+    codigo: str,
+    produto_id: str,
+    quantidade: int,
+    saldo: Optional[int],
+    deposito: Optional[str]
+) -> None:
+    """Avisa os dashboards conectados ao stream (falha aqui não afeta a movimentação)"""
+    try:
+        await hub_eventos.publicar({
+            'tipo': tipo,
+            'codigo': codigo,
+            'produto_id': produto_id,
+            'quantidade': quantidade,
+            'saldo': saldo,
+            'deposito': deposito,
+            'origem': 'api'
+        })
+    except Exception as e:
+        logger.debug(f"Não foi possível publicar evento: {e}")
+
+def _resposta_movimentacao(
+    mensagem: str,
+    produto_id: str,
+    saldo_atual: Optional[int],
+    deposito_pedido: str,
+    resultado: Dict,
+    debug: bool
+) -> EntradaEstoqueResponse:
+    """
+    Resposta compacta; o retorno bruto do Tiny só vai em modo debug.
+    Sem TINY_ENVIAR_DEPOSITO a movimentação cai no depósito padrão: a
+    resposta diz onde ela foi registrada e avisa quando não é o pedido.
+    """
+    deposito_aplicado = resultado.get('deposito')
+    if deposito_aplicado and deposito_aplicado != deposito_pedido:
+        mensagem += f" (registrada no depósito {deposito_aplicado}, não em {deposito_pedido})"
+    resposta = EntradaEstoqueResponse(
+        success=True,
+        message=mensagem,
+        produto_id=produto_id,
+        saldo_atual=saldo_atual,
+        deposito_aplicado=deposito_aplicado
+    )
+    if debug or settings.TINY_RESPOSTA_COMPLETA:
+        resposta.tiny_response = resultado.get('response')
+    return resposta
+
+async def _cachear_produto(codigo: str, produto: Dict) -> None:
+    """Grava o cadastro no cache sem derrubar a consulta em caso de falha"""
+    try:
+        await cache_produtos.cachear_produto({**produto, 'codigo': codigo})
+    except Exception as e:
+        logger.debug(f"Não foi possível cachear: {e}")
+
+async def _resolver_produtos(codigos: List[str], exigir_depositos: bool = False) -> ProdutosLoteResponse:
+    """
+    Resolve vários códigos: todos os hashes numa única ida ao Redis e, para
+    os ausentes ou vencidos, consultas ao Tiny em paralelo (o limitador do
+    cliente Tiny segura a taxa e a concorrência).
+    """
+    codigos = list(dict.fromkeys(c.strip() for c in codigos if c and c.strip()))
+    registros = await cache_produtos.obter_registros(codigos)
+    
+    produtos: Dict[str, ProdutoInfo] = {}
+    faltantes = []
+    for codigo, registro in zip(codigos, registros):
+        produto_info = _produto_info_do_cache(codigo, registro, exigir_depositos)
+        if produto_info:
+            produtos[codigo] = produto_info
+        else:
+            faltantes.append((codigo, registro))
+    
+    if faltantes:
+        logger.info(f"Lote: {len(produtos)} do cache, {len(faltantes)} buscados no Tiny")
+        resultados = await asyncio.gather(
+            *(_produto_info_do_tiny(codigo, registro) for codigo, registro in faltantes),
+            return_exceptions=True
+        )
+        for (codigo, _), resultado in zip(faltantes, resultados):
+            if isinstance(resultado, Exception):
+                logger.error(f"Erro ao buscar {codigo} no lote: {resultado}")
+            elif resultado:
+                produtos[codigo] = resultado
+    
+    nao_encontrados = [codigo for codigo in codigos if codigo not in produtos]
+    # Mantém a ordem pedida
+    return ProdutosLoteResponse(
+        produtos={codigo: produtos[codigo] for codigo in codigos if codigo in produtos},
+        nao_encontrados=nao_encontrados
+    )
+
+@router.post("/entrada", response_model=EntradaEstoqueResponse, response_model_exclude_unset=True)
+async def entrada_estoque(entrada: EntradaEstoqueRequest, debug: bool = False):
     """
-    Realiza entrada de estoque no sistema
+    Realiza entrada de estoque no sistema (?debug=true inclui a resposta bruta do Tiny)
     """
     try:
         # 1. Buscar produto pelo código (primeiro no cache)
@@ -27,51 +251,49 @@ async def entrada_estoque(entrada: EntradaEstoqueRequest):
                 detail=f"Produto com código {entrada.codigo_produto} não encontrado"
             )
         
-        # Obter dados completos do produto
-        produto = await cache_produtos.obter_produto(entrada.codigo_produto)
-        produto_nome = produto.get('nome', 'Sem nome') if produto else entrada.codigo_produto
+        # Só o nome é usado: em memória quando conhecido, senão cache/API
+        produto_nome = cache_produtos.nome_por_codigo(entrada.codigo_produto)
+        if not produto_nome:
+            produto = await cache_produtos.obter_produto(entrada.codigo_produto)
+            produto_nome = produto.get('nome', 'Sem nome') if produto else entrada.codigo_produto
         
         # 2. Alterar estoque no Tiny
         logger.info(f"Alterando estoque do produto {produto_id}: +{entrada.quantidade}")
-        resultado = await tiny_client.alterar_estoque(
-            produto_id=produto_id,
-            quantidade=entrada.quantidade,
-            tipo=entrada.tipo,
-            deposito=entrada.deposito,
-            observacoes=entrada.descricao or f"Entrada via Dashboard - {entrada.data.strftime('%d/%m/%Y %H:%M')}"
-        )
-        
-        if not resultado['success']:
-            raise HTTPException(
-                status_code=400,
-                detail=resultado['message']
+        await cache_produtos.iniciar_movimentacao(entrada.codigo_produto)
+        pendente = True
+        try:
+            resultado = await tiny_client.alterar_estoque(
+                produto_id=produto_id,
+                quantidade=entrada.quantidade,
+                tipo=entrada.tipo,
+                deposito=entrada.deposito,
+                observacoes=entrada.descricao or f"Entrada via Dashboard - {entrada.data.strftime('%d/%m/%Y %H:%M')}"
             )
-        
-        # 3. Buscar estoque atualizado
-        estoque_info = await tiny_client.obter_estoque(produto_id)
-        saldo_atual = None
-        
-        if estoque_info:
-            saldo_atual = int(float(estoque_info.get('produto', {}).get('saldo', '0')))
             
-            # 4. Salvar no cache Redis
-            cache_key = f"estoque:produto:{entrada.codigo_produto}"
-            cache_data = {
-                'produto_id': produto_id,
-                'codigo': entrada.codigo_produto,
-                'nome': produto_nome,
-                'saldo': saldo_atual,
-                'ultima_atualizacao': entrada.data.isoformat()
-            }
-            try:
-                await redis_client.set(cache_key, cache_data, ex=3600)  # Cache por 1 hora
-            except Exception as e:
-                logger.debug(f"Não foi possível cachear produto: {e}")
+            if not resultado['success']:
+                raise HTTPException(
+                    status_code=400,
+                    detail=resultado['message']
+                )
+            
+            # 3-4. Atualizar saldo no cache Redis (_saldo_apos_movimentacao
+            # começa encerrando a movimentação)
+            pendente = False
+            saldo_atual = await _saldo_apos_movimentacao(
+                entrada.codigo_produto, produto_id, entrada.tipo, entrada.quantidade,
+                resultado.get('deposito')
+            )
+        finally:
+            # Erro do Tiny, exceção ou cancelamento: não deixa a marca de
+            # movimentação pendente até o TTL
+            if pendente:
+                await cache_produtos.concluir_movimentacao(entrada.codigo_produto, None, sucesso=False)
         
         # 5. Registrar operação no histórico
         historico_key = f"estoque:historico:{entrada.codigo_produto}:{entrada.data.timestamp()}"
+        tipo_evento = nome_movimentacao(entrada.tipo)
         historico_data = {
-            'tipo': 'entrada',
+            'tipo': tipo_evento,
             'quantidade': entrada.quantidade,
             'deposito': entrada.deposito,
             'descricao': entrada.descricao,
@@ -83,12 +305,14 @@ async def entrada_estoque(entrada: EntradaEstoqueRequest):
         except Exception as e:
             logger.debug(f"Não foi possível salvar histórico: {e}")
         
-        return EntradaEstoqueResponse(
-            success=True,
-            message=f"Entrada de {entrada.quantidade} unidades realizada com sucesso para o produto {produto_nome}",
-            produto_id=produto_id,
-            saldo_atual=saldo_atual,
-            tiny_response=resultado.get('response')
+        await _publicar_movimentacao(
+            tipo_evento, entrada.codigo_produto, produto_id, entrada.quantidade,
+            saldo_atual, resultado.get('deposito')
+        )
+        
+        return _resposta_movimentacao(
+            f"Entrada de {entrada.quantidade} unidades realizada com sucesso para o produto {produto_nome}",
+            produto_id, saldo_atual, entrada.deposito, resultado, debug
         )
         
     except HTTPException:
@@ -100,10 +324,10 @@ async def entrada_estoque(entrada: EntradaEstoqueRequest):
             detail=f"Erro interno ao processar entrada: {str(e)}"
         )
 
-@router.post("/saida", response_model=EntradaEstoqueResponse)
-async def saida_estoque(saida: EntradaEstoqueRequest):
+@router.post("/saida", response_model=EntradaEstoqueResponse, response_model_exclude_unset=True)
+async def saida_estoque(saida: EntradaEstoqueRequest, debug: bool = False):
     """
-    Realiza saída de estoque no sistema
+    Realiza saída de estoque no sistema (?debug=true inclui a resposta bruta do Tiny)
     """
     try:
         # 1. Buscar produto pelo código
@@ -121,45 +345,38 @@ async def saida_estoque(saida: EntradaEstoqueRequest):
 
         # 2. Alterar estoque no Tiny (subtraindo a quantidade)
         logger.info(f"Alterando estoque do produto {produto_id}: -{saida.quantidade}")
-        resultado = await tiny_client.alterar_estoque(
-            produto_id=produto_id,
-            quantidade=saida.quantidade,
-            tipo='S',  # 'S' para saída
-            deposito=saida.deposito,
-            observacoes=saida.descricao or f"Saída via Dashboard - {saida.data.strftime('%d/%m/%Y %H:%M')}"
-        )
-
-        if not resultado['success']:
-            raise HTTPException(
-                status_code=400,
-                detail=resultado['message']
+        await cache_produtos.iniciar_movimentacao(saida.codigo_produto)
+        pendente = True
+        try:
+            resultado = await tiny_client.alterar_estoque(
+                produto_id=produto_id,
+                quantidade=saida.quantidade,
+                tipo='S',  # 'S' para saída
+                deposito=saida.deposito,
+                observacoes=saida.descricao or f"Saída via Dashboard - {saida.data.strftime('%d/%m/%Y %H:%M')}"
             )
 
-        # 3. Buscar estoque atualizado
-        estoque_info = await tiny_client.obter_estoque(produto_id)
-        saldo_atual = None
-
-        if estoque_info:
-            saldo_atual = int(float(estoque_info.get('produto', {}).get('saldo', '0')))
-
-            # 4. Salvar no cache Redis
-            cache_key = f"estoque:produto:{saida.codigo_produto}"
-            cache_data = {
-                'produto_id': produto_id,
-                'codigo': saida.codigo_produto,
-                'nome': produto_nome,
-                'saldo': saldo_atual,
-                'ultima_atualizacao': saida.data.isoformat()
-            }
-            try:
-                await redis_client.set(cache_key, cache_data, ex=3600)
-            except Exception as e:
-                logger.debug(f"Não foi possível cachear produto: {e}")
+            if not resultado['success']:
+                raise HTTPException(
+                    status_code=400,
+                    detail=resultado['message']
+                )
+
+            # 3-4. Atualizar saldo no cache Redis (_saldo_apos_movimentacao
+            # começa encerrando a movimentação)
+            pendente = False
+            saldo_atual = await _saldo_apos_movimentacao(
+                saida.codigo_produto, produto_id, 'S', saida.quantidade,
+                resultado.get('deposito')
+            )
+        finally:
+            if pendente:
+                await cache_produtos.concluir_movimentacao(saida.codigo_produto, None, sucesso=False)
 
         # 5. Registrar operação no histórico
         historico_key = f"estoque:historico:{saida.codigo_produto}:{saida.data.timestamp()}"
         historico_data = {
-            'tipo': 'saida',
+            'tipo': nome_movimentacao('S'),
             'quantidade': saida.quantidade,
             'deposito': saida.deposito,
             'descricao': saida.descricao,
@@ -171,12 +388,14 @@ async def saida_estoque(saida: EntradaEstoqueRequest):
         except Exception as e:
             logger.debug(f"Não foi possível salvar histórico: {e}")
 
-        return EntradaEstoqueResponse(
-            success=True,
-            message=f"Saída de {saida.quantidade} unidades realizada com sucesso para o produto {produto_nome}",
-            produto_id=produto_id,
-            saldo_atual=saldo_atual,
-            tiny_response=resultado.get('response')
+        await _publicar_movimentacao(
+            nome_movimentacao('S'), saida.codigo_produto, produto_id, saida.quantidade,
+            saldo_atual, resultado.get('deposito')
+        )
+
+        return _resposta_movimentacao(
+            f"Saída de {saida.quantidade} unidades realizada com sucesso para o produto {produto_nome}",
+            produto_id, saldo_atual, saida.deposito, resultado, debug
         )
 
     except HTTPException:
@@ -189,50 +408,40 @@ async def saida_estoque(saida: EntradaEstoqueRequest):
         )
 
 @router.get("/produto/{codigo}", response_model=Optional[ProdutoInfo])
-async def buscar_produto(codigo: str):
+async def buscar_produto(codigo: str, request: Request, response: Response):
     """
-    Busca informações do produto pelo código
+    Busca informações do produto pelo código (com ETag: If-None-Match -> 304)
     """
+    if_none_match = request.headers.get('if-none-match')
     try:
         # Tentar buscar do cache primeiro (se Redis estiver disponível)
-        cache_key = f"estoque:produto:{codigo}"
+        registro = {}
         try:
-            cached = await redis_client.get(cache_key)
-            if cached:
-                return ProdutoInfo(**cached)
+            registro = await cache_produtos.obter_registro(codigo)
+            produto_info = _produto_info_do_cache(codigo, registro)
+            if produto_info:
+                # A versão muda a cada saldo gravado e atualizado_em a cada cadastro
+                etag = etag_fraco(codigo, registro.get('versao'), registro.get('atualizado_em'))
+                if etag_corresponde(if_none_match, etag):
+                    return nao_modificado(etag)
+                response.headers.update(cabecalhos_cache(etag))
+                return produto_info
         except Exception as e:
             logger.debug(f"Cache não disponível: {e}")
         
-        # Buscar do Tiny
-        produto = await tiny_client.buscar_produto_por_codigo(codigo)
+        produto_info = await _produto_info_do_tiny(codigo, registro)
         
-        if not produto:
+        if not produto_info:
             raise HTTPException(
                 status_code=404,
                 detail=f"Produto {codigo} não encontrado"
             )
         
-        # Buscar estoque
-        estoque_info = await tiny_client.obter_estoque(produto['id'])
-        saldo = 0
-        
-        if estoque_info:
-            saldo = int(float(estoque_info.get('produto', {}).get('saldo', '0')))
-        
-        produto_info = ProdutoInfo(
-            id=produto['id'],
-            codigo=codigo,
-            nome=produto.get('nome', 'Sem nome'),
-            unidade=produto.get('unidade', 'UN'),
-            saldo=saldo
-        )
-        
-        # Salvar no cache (se Redis estiver disponível)
-        try:
-            await redis_client.set(cache_key, produto_info.dict(), ex=3600)
-        except Exception as e:
-            logger.debug(f"Não foi possível cachear: {e}")
-        
+        # Veio do Tiny: o ETag sai do próprio conteúdo
+        etag = etag_fraco(produto_info.model_dump_json())
+        if etag_corresponde(if_none_match, etag):
+            return nao_modificado(etag)
+        response.headers.update(cabecalhos_cache(etag))
         return produto_info
         
     except HTTPException:
@@ -244,6 +453,82 @@ async def buscar_produto(codigo: str):
             detail=f"Erro ao buscar produto: {str(e)}"
         )
 
+@router.post("/produtos/batch", response_model=ProdutosLoteResponse)
+async def buscar_produtos_lote(lote: ProdutosLoteRequest):
+    """
+    Busca vários produtos de uma vez (mesmo formato de /produto/{codigo})
+    """
+    try:
+        return await _resolver_produtos(lote.codigos)
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar produtos em lote: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao buscar produtos: {str(e)}"
+        )
+
+@router.get("/depositos", response_model=ProdutosLoteResponse)
+async def saldos_por_deposito(
+    codigos: str = Query(..., description="Códigos separados por vírgula (ex: PH-510,PH-511)")
+):
+    """
+    Retorna o saldo por depósito de vários produtos de uma vez
+    """
+    lista = codigos.split(',')
+    if len(lista) > MAX_CODIGOS_POR_CONSULTA:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo de {MAX_CODIGOS_POR_CONSULTA} códigos por consulta"
+        )
+    
+    try:
+        return await _resolver_produtos(lista, exigir_depositos=True)
+        
+    except Exception as e:
+        logger.error(f"Erro ao consultar depósitos: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro ao consultar depósitos: {str(e)}"
+        )
+
+@router.get("/stream")
+async def stream_movimentacoes(
+    codigos: Optional[str] = Query(None, description="Filtrar por códigos separados por vírgula (vazio = todos)")
+):
+    """
+    Stream (Server-Sent Events) das movimentações de estoque em tempo real
+    """
+    filtro = [c.strip() for c in codigos.split(',') if c.strip()] if codigos else None
+    
+    async def gerar():
+        # Assina só quando o stream começa: um cliente que desconecta antes
+        # da primeira iteração não deixa assinante pendurado no hub
+        assinante = hub_eventos.assinar(filtro)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(
+                        assinante.fila.get(), timeout=settings.ESTOQUE_EVENTOS_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    # Mantém a conexão viva em proxies que derrubam conexões ociosas
+                    yield ": keepalive\n\n"
+                    continue
+                if assinante.perdidos:
+                    yield formatar_sse('perdidos', {'quantidade': assinante.perdidos})
+                    assinante.perdidos = 0
+                yield formatar_sse('movimentacao', evento)
+        finally:
+            hub_eventos.cancelar(assinante)
+    
+    return StreamingResponse(
+        gerar(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/historico/{codigo}")
 async def historico_produto(codigo: str, limit: int = 10):
     """
@@ -257,11 +542,24 @@ async def historico_produto(codigo: str, limit: int = 10):
     }
 
 @router.post("/cache/popular")
-async def popular_cache_produtos(inicio: int = 1, fim: int = 999):
+async def popular_cache_produtos(inicio: int = 1, fim: int = 999, reconstruir: bool = False):
     """
-    Popula cache com produtos PH
+    Popula cache com produtos PH (?reconstruir=true monta uma versão nova
+    do cache em segundo plano e troca quando termina, sem esvaziar o atual)
     """
     try:
+        if reconstruir:
+            iniciada = cache_produtos.reconstruir_em_segundo_plano(
+                lambda versao: cache_produtos.popular_cache_produtos_ph(inicio, fim, versao=versao)
+            )
+            if not iniciada:
+                raise HTTPException(status_code=409, detail="Reconstrução já em andamento")
+            return {
+                "success": True,
+                "message": "Reconstrução do cache iniciada em segundo plano",
+                "versao_atual": cache_produtos.namespace.versao
+            }
+        
         logger.info(f"Iniciando população de cache: PH-{inicio:03d} até PH-{fim:03d}")
         resultado = await cache_produtos.popular_cache_produtos_ph(inicio, fim)
         
@@ -271,6 +569,8 @@ async def popular_cache_produtos(inicio: int = 1, fim: int = 999):
             "detalhes": resultado
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao popular cache: {e}")
         raise HTTPException(
@@ -279,13 +579,19 @@ async def popular_cache_produtos(inicio: int = 1, fim: int = 999):
         )
 
 @router.get("/cache/produtos")
-async def listar_produtos_cacheados(prefixo: str = "PH"):
+async def listar_produtos_cacheados(request: Request, response: Response, prefixo: str = "PH"):
     """
-    Lista produtos no cache
+    Lista produtos no cache (com ETag: If-None-Match -> 304)
     """
     try:
         produtos = await cache_produtos.listar_produtos_cacheados(prefixo)
         
+        # Lista já vem ordenada; o ETag cobre inclusões, remoções e renomeações
+        etag = etag_fraco(prefixo, *(f"{p['codigo']}:{p['id']}:{p['nome']}" for p in produtos))
+        if etag_corresponde(request.headers.get('if-none-match'), etag):
+            return nao_modificado(etag)
+        response.headers.update(cabecalhos_cache(etag))
+        
         return {
             "total": len(produtos),
             "produtos": produtos
@@ -298,6 +604,17 @@ async def listar_produtos_cacheados(prefixo: str = "PH"):
             detail=f"Erro ao listar cache: {str(e)}"
         )
 
+@router.get("/cache/leituras")
+async def estatisticas_leituras():
+    """
+    Leituras do Tiny pelo cache de leitura do cliente, por método:
+    contagem por resultado (hit, miss, compartilhado...) e taxa de acerto
+    """
+    return resumo_leituras()
+
+# Sem prefixo a versão antiga só é apagada depois da carência
+_MENSAGEM_CACHE_LIMPO = "Cache limpo; as chaves anteriores serão apagadas em segundo plano"
+
 @router.delete("/cache")
 async def limpar_cache_produtos(prefixo: Optional[str] = None):
     """
@@ -308,7 +625,7 @@ async def limpar_cache_produtos(prefixo: Optional[str] = None):
         
         return {
             "success": True,
-            "message": f"{count} chaves removidas do cache"
+            "message": f"{count} chaves removidas do cache" if prefixo else _MENSAGEM_CACHE_LIMPO
         }
         
     except Exception as e:
@@ -324,11 +641,11 @@ async def limpar_cache_post():
     Limpa cache de produtos (POST para compatibilidade)
     """
     try:
-        count = await cache_produtos.limpar_cache()
+        await cache_produtos.limpar_cache()
         
         return {
             "success": True,
-            "message": f"{count} chaves removidas do cache"
+            "message": _MENSAGEM_CACHE_LIMPO
         }
         
     except Exception as e:
@@ -341,36 +658,43 @@ async def limpar_cache_post():
 @router.post("/popular-cache-bulk")
 async def popular_cache_bulk(data: dict):
     """
-    Popula cache com múltiplos produtos de uma vez
+    Popula cache com múltiplos produtos de uma vez. Com "substituir": true
+    os produtos formam uma versão nova do cache, que substitui a atual de
+    uma vez (sem passar por limpar-cache).
     """
     try:
         produtos = data.get('produtos', [])
         logger.info(f"Populando cache com {len(produtos)} produtos")
         
-        sucesso = 0
-        falhas = 0
-        
-        for produto in produtos:
-            try:
-                produto_id = produto.get('id')
-                codigo = produto.get('codigo')
-                
-                if produto_id and codigo:
-                    await cache_produtos.salvar_produto_cache(codigo, produto_id)
-                    sucesso += 1
-                else:
+        async def gravar(versao: Optional[int] = None) -> Dict[str, int]:
+            sucesso = 0
+            falhas = 0
+            for produto in produtos:
+                try:
+                    produto_id = produto.get('id')
+                    codigo = produto.get('codigo')
+                    
+                    if produto_id and codigo:
+                        await cache_produtos.salvar_produto_cache(codigo, produto_id, versao=versao)
+                        sucesso += 1
+                    else:
+                        falhas += 1
+                except Exception as e:
+                    logger.error(f"Erro ao cachear {produto}: {e}")
                     falhas += 1
-            except Exception as e:
-                logger.error(f"Erro ao cachear {produto}: {e}")
-                falhas += 1
+            return {"sucesso": sucesso, "falhas": falhas}
         
-        return {
-            "success": True,
-            "total": len(produtos),
-            "sucesso": sucesso,
-            "falhas": falhas
-        }
+        if data.get('substituir'):
+            resultado = await cache_produtos.reconstruir(gravar)
+            if not resultado['success']:
+                raise HTTPException(status_code=409, detail=resultado['message'])
+        else:
+            resultado = {"success": True, **await gravar()}
         
+        return {"total": len(produtos), **resultado}
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao popular cache em lote: {e}")
         raise HTTPException(
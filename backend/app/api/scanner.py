@@ -0,0 +1,111 @@
+"""
+Canal WebSocket para estações com leitor de código de barras
+
+Cada mensagem é um EntradaEstoqueRequest (mais um 'id' opcional do
+cliente para casar a resposta). O recebimento é confirmado na hora
+('recebido') e as movimentações são processadas em ordem, uma a uma por
+conexão, pela mesma lógica de /entrada e /saida; o resultado volta
+depois ('ok' ou 'erro') sem bloquear as leituras seguintes.
+"""
+import asyncio
+import json
+from typing import Any, Dict
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+from ..models.estoque import EntradaEstoqueRequest
+from .estoque import entrada_estoque, saida_estoque
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Movimentações aguardando processamento por conexão; cheia, a leitura do
+# socket para e o próprio TCP segura o leitor
+MAX_PENDENTES_POR_CONEXAO = 100
+
+
+class ConexaoScanner:
+    """Fila ordenada de movimentações de uma conexão"""
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=MAX_PENDENTES_POR_CONEXAO)
+        self._envio = asyncio.Lock()
+        self.aberta = True
+
+    async def enviar(self, mensagem: Dict[str, Any]) -> None:
+        # Leitura e processamento respondem em paralelo; um envio por vez
+        if not self.aberta:
+            return
+        async with self._envio:
+            try:
+                await self.websocket.send_json(mensagem)
+            except Exception:
+                self.aberta = False
+
+    async def processar(self) -> None:
+        """Aplica as movimentações na ordem em que chegaram"""
+        while True:
+            item = await self.fila.get()
+            if item is None:
+                return
+            mensagem_id, movimento = item
+            try:
+                if movimento.tipo == 'S':
+                    resultado = await saida_estoque(movimento)
+                else:
+                    resultado = await entrada_estoque(movimento)
+                await self.enviar({
+                    'id': mensagem_id,
+                    'status': 'ok',
+                    'resultado': resultado.model_dump(mode='json', exclude_unset=True)
+                })
+            except HTTPException as e:
+                await self.enviar({'id': mensagem_id, 'status': 'erro', 'detail': e.detail})
+            except Exception as e:
+                logger.exception("Erro ao processar movimentação do scanner")
+                await self.enviar({'id': mensagem_id, 'status': 'erro', 'detail': str(e)})
+
+
+@router.websocket("/scanner")
+async def scanner_websocket(websocket: WebSocket):
+    """
+    Recebe movimentações em sequência e devolve os resultados de forma assíncrona
+    """
+    await websocket.accept()
+    conexao = ConexaoScanner(websocket)
+    processamento = asyncio.create_task(conexao.processar())
+
+    try:
+        while True:
+            texto = await websocket.receive_text()
+            try:
+                dados = json.loads(texto)
+            except ValueError:
+                await conexao.enviar({'status': 'invalido', 'detail': 'JSON inválido'})
+                continue
+            if not isinstance(dados, dict):
+                await conexao.enviar({'status': 'invalido', 'detail': 'Mensagem deve ser um objeto JSON'})
+                continue
+            
+            # Mesmo schema do endpoint HTTP
+            mensagem_id = dados.pop('id', None)
+            try:
+                movimento = EntradaEstoqueRequest.model_validate(dados)
+            except ValidationError as e:
+                await conexao.enviar({
+                    'id': mensagem_id,
+                    'status': 'invalido',
+                    'detail': e.errors(include_url=False, include_context=False)
+                })
+                continue
+
+            await conexao.enviar({'id': mensagem_id, 'status': 'recebido'})
+            await conexao.fila.put((mensagem_id, movimento))
+    except WebSocketDisconnect:
+        logger.info(f"Scanner desconectado com {conexao.fila.qsize()} movimentações pendentes")
+    finally:
+        # Movimentações confirmadas como 'recebido' são concluídas mesmo sem o cliente
+        conexao.aberta = False
+        await conexao.fila.put(None)
+        await processamento
@@ -11,10 +11,60 @@ class Settings(BaseSettings):
     
     # Redis
     REDIS_URL: str = os.getenv("VALKEY_PUBLIC_URL", "redis://localhost:6379")
+    REDIS_CODEC: str = "msgpack"  # json | orjson | msgpack
     
     # Tiny API
     TINY_API_TOKEN: str = os.getenv("TINY_API_TOKEN", "")
     TINY_API_BASE_URL: str = "https://api.tiny.com.br/api2"
+    # O Tiny rejeitou o campo 'deposito' nos nossos testes; sem ele a
+    # movimentação cai no depósito padrão da conta (a resposta de
+    # /entrada e /saida traz o depósito aplicado em deposito_aplicado)
+    TINY_ENVIAR_DEPOSITO: bool = False
+    TINY_DEPOSITO_PADRAO: str = "Geral"
+    TINY_REQUISICOES_POR_MINUTO: int = 60  # limite do plano Tiny
+    TINY_MAX_CONCORRENCIA: int = 4  # requisições simultâneas ao Tiny
+    TINY_RESPOSTA_COMPLETA: bool = False  # devolve tiny_response sem precisar de ?debug=true
+    # Cache read-through das leituras do Tiny (segundos; 0 não grava)
+    TINY_CACHE_CADASTRO_TTL: int = 900  # pesquisa por código e produto.obter
+    TINY_CACHE_ESTOQUE_TTL: int = 10  # invalidado a cada movimentação feita por aqui
+    TINY_CACHE_NEGATIVO_TTL: int = 60  # produto inexistente
+    
+    # Cache de produtos
+    CACHE_PRODUTO_TTL: int = 86400  # 24 horas
+    CACHE_PRODUTO_TTL_JITTER: float = 0.1  # até 10% a menos, espalha as expirações
+    CACHE_XFETCH_BETA: float = 1.0  # >1 antecipa mais o refresh
+    CACHE_LOCK_TTL: int = 30  # segundos
+    CACHE_SALDO_TTL: int = 3600  # idade máxima do saldo confirmado pelo Tiny
+    CACHE_MOVIMENTO_TIMEOUT: int = 60  # após isso uma movimentação pendente é ignorada
+    
+    # Índice código -> id/nome em memória, carregado do Redis ao subir
+    CACHE_INDICE_AQUECER: bool = True
+    # Cópia local do índice (msgpack), usada abaixo do Redis e lida na subida;
+    # no fly.io aponte para um volume montado para sobreviver a deploys. Vazio desliga
+    CACHE_INDICE_ARQUIVO: str = "data/indice_produtos.msgpack"
+    CACHE_INDICE_SNAPSHOT_INTERVALO: int = 300  # segundos entre gravações (só se mudou)
+    # Namespace versionado (reconstrução sem janela de cache vazio)
+    CACHE_NAMESPACE_VERIFICAR: float = 2.0  # segundos entre releituras do ponteiro de versão
+    CACHE_NAMESPACE_CARENCIA: int = 30  # segundos antes de apagar a versão antiga
+    
+    # Subida do processo (máquina do fly.io acordando): acima disso o relatório avisa no log
+    INICIALIZACAO_ORCAMENTO_MS: int = 1500
+    
+    # Cache HTTP (ETag + Cache-Control) nas consultas
+    HTTP_CACHE_MAX_AGE: int = 0  # 0 = navegador sempre revalida (barato, responde 304)
+    
+    # Compressão das respostas (brotli, com gzip para quem não aceita br)
+    COMPRESSAO_TAMANHO_MINIMO: int = 1024  # bytes; respostas menores vão sem compressão
+    COMPRESSAO_BROTLI_QUALIDADE: int = 4  # 0-11; acima de ~5 o custo de CPU cresce rápido
+    
+    # Log de acesso: fração amostrada + todas as lentas e com erro 5xx
+    LOG_ACESSO_AMOSTRA: float = 0.01
+    LOG_ACESSO_LENTO_MS: int = 1000
+    
+    # Eventos de movimentação (SSE)
+    ESTOQUE_EVENTOS_CANAL: str = "estoque:eventos"
+    ESTOQUE_EVENTOS_FILA: int = 100  # eventos pendentes por cliente antes de descartar
+    ESTOQUE_EVENTOS_KEEPALIVE: int = 15  # segundos entre comentários de keepalive
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["*"]
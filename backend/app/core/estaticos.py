@@ -0,0 +1,181 @@
+"""
+Build do React servido da memória
+
+Na inicialização o diretório static é lido uma vez: cada arquivo ganha
+hash de conteúdo (ETag), tipo e, se for texto, variantes gzip/brotli já
+comprimidas. As variantes são gravadas ao lado do arquivo (.gz/.br) e
+reaproveitadas nas próximas inicializações; dá para gerá-las no build com
+
+    python -m app.core.estaticos static
+
+Arquivos com hash no nome (main.3f2a1b4c.js) nunca mudam e vão com cache
+imutável de um ano; os demais (index.html, manifest.json) são revalidados
+pelo ETag a cada carga. Nenhuma requisição toca o sistema de arquivos,
+exceto arquivos grandes demais para a memória.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from .http_cache import etag_corresponde
+import logging
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Nomes com hash de conteúdo gerados pelo build (main.3f2a1b4c.js, 787.8c1e2d3f.chunk.css)
+PADRAO_HASH = re.compile(r"\.[0-9a-f]{8,}\.")
+TIPOS_COMPRIMIVEIS = (
+    "text/", "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "image/svg+xml",
+)
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+TAMANHO_MINIMO_COMPRESSAO = 1024  # abaixo disso não compensa
+TAMANHO_MAXIMO_MEMORIA = 4 * 1024 * 1024  # maiores (ex: source maps) ficam no disco
+EXTENSOES = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass
+class Arquivo:
+    """Arquivo do build com metadados calculados na inicialização"""
+    caminho: Path
+    tipo: str
+    tamanho: int
+    hash: str
+    imutavel: bool
+    conteudo: Optional[bytes] = None  # None = servido do disco
+    variantes: Dict[str, bytes] = field(default_factory=dict)  # 'br'/'gzip' -> corpo comprimido
+
+    @property
+    def cache_control(self) -> str:
+        return CACHE_IMUTAVEL if self.imutavel else CACHE_REVALIDAR
+
+
+def _comprimir(conteudo: bytes, codificacao: str) -> bytes:
+    if codificacao == "br":
+        return brotli.compress(conteudo, quality=11)
+    return gzip.compress(conteudo, compresslevel=9, mtime=0)
+
+
+def _variante(caminho: Path, conteudo: bytes, codificacao: str) -> bytes:
+    """Lê a variante pré-comprimida do disco ou gera (e tenta gravar) uma nova"""
+    arquivo_variante = caminho.with_name(caminho.name + EXTENSOES[codificacao])
+    try:
+        if arquivo_variante.stat().st_mtime >= caminho.stat().st_mtime:
+            return arquivo_variante.read_bytes()
+    except OSError:
+        pass
+    comprimido = _comprimir(conteudo, codificacao)
+    try:
+        arquivo_variante.write_bytes(comprimido)
+    except OSError:
+        pass  # diretório somente leitura: fica só na memória
+    return comprimido
+
+
+class ArquivosEstaticos:
+    """Tabela em memória caminho da URL -> arquivo do build"""
+
+    def __init__(self, diretorio: Path):
+        self.diretorio = Path(diretorio)
+        self.arquivos: Dict[str, Arquivo] = {}
+        self.index: Optional[Arquivo] = None
+        self.existe = False
+        # Lista de arquivos calculada na carga (servida por /api/debug/static)
+        self.manifesto: List[Dict[str, Any]] = []
+
+    @property
+    def disponivel(self) -> bool:
+        return self.index is not None
+
+    def carregar(self) -> "ArquivosEstaticos":
+        self.existe = self.diretorio.is_dir()
+        if not self.existe:
+            logger.error(f"Pasta static não encontrada em: {self.diretorio.absolute()}")
+            return self
+
+        codificacoes = ["gzip"] + (["br"] if brotli else [])
+        for caminho in sorted(self.diretorio.rglob("*")):
+            if not caminho.is_file() or caminho.suffix in (".br", ".gz"):
+                continue
+            relativo = caminho.relative_to(self.diretorio).as_posix()
+            tipo = mimetypes.guess_type(caminho.name)[0] or "application/octet-stream"
+            tamanho = caminho.stat().st_size
+            conteudo = caminho.read_bytes()
+            arquivo = Arquivo(
+                caminho=caminho,
+                tipo=tipo,
+                tamanho=tamanho,
+                hash=hashlib.blake2b(conteudo, digest_size=12).hexdigest(),
+                imutavel=bool(PADRAO_HASH.search(caminho.name)),
+            )
+            if tamanho <= TAMANHO_MAXIMO_MEMORIA:
+                arquivo.conteudo = conteudo
+                if tamanho >= TAMANHO_MINIMO_COMPRESSAO and tipo.startswith(TIPOS_COMPRIMIVEIS):
+                    arquivo.variantes = {
+                        codificacao: _variante(caminho, conteudo, codificacao)
+                        for codificacao in codificacoes
+                    }
+            self._registrar(relativo, arquivo)
+            self.manifesto.append({
+                "caminho": relativo,
+                "tamanho": tamanho,
+                "hash": arquivo.hash,
+                "tipo": tipo,
+                "imutavel": arquivo.imutavel,
+                "em_memoria": arquivo.conteudo is not None,
+                "variantes": {c: len(v) for c, v in arquivo.variantes.items()},
+            })
+
+        self.index = self.arquivos.get("index.html")
+        logger.info(
+            f"{len(self.manifesto)} arquivos estáticos carregados de "
+            f"{self.diretorio.absolute()} (index.html: {'sim' if self.index else 'não'})"
+        )
+        return self
+
+    def _registrar(self, relativo: str, arquivo: Arquivo) -> None:
+        # /static/x -> static/x, como o StaticFiles montado em /static fazia
+        self.arquivos[f"static/{relativo}"] = arquivo
+        # Build do React copiado inteiro: o HTML pede /static/js/... que está em static/static/js/...
+        if relativo.startswith("static/"):
+            self.arquivos.setdefault(relativo, arquivo)
+        # index.html, favicon.ico, manifest.json... servidos na raiz
+        if "/" not in relativo:
+            self.arquivos.setdefault(relativo, arquivo)
+
+    def obter(self, caminho_url: str) -> Optional[Arquivo]:
+        return self.arquivos.get(caminho_url.lstrip("/"))
+
+    def responder(self, arquivo: Arquivo, request: Request) -> Response:
+        """Escolhe a variante pelo Accept-Encoding e responde 304 se o ETag bater"""
+        aceita = request.headers.get("accept-encoding", "")
+        codificacao = next((c for c in ("br", "gzip") if c in arquivo.variantes and c in aceita), None)
+        etag = f'"{arquivo.hash}-{codificacao}"' if codificacao else f'"{arquivo.hash}"'
+        headers = {"ETag": etag, "Cache-Control": arquivo.cache_control, "Vary": "Accept-Encoding"}
+
+        if etag_corresponde(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        if arquivo.conteudo is None:
+            return FileResponse(arquivo.caminho, media_type=arquivo.tipo, headers=headers)
+        if codificacao:
+            headers["Content-Encoding"] = codificacao
+            return Response(arquivo.variantes[codificacao], media_type=arquivo.tipo, headers=headers)
+        return Response(arquivo.conteudo, media_type=arquivo.tipo, headers=headers)
+
+
+if __name__ == "__main__":
+    # Pré-comprime o build (ex: no Dockerfile, depois de copiar o React)
+    logging.basicConfig(level=logging.INFO)
+    ArquivosEstaticos(Path(sys.argv[1] if len(sys.argv) > 1 else "static")).carregar()
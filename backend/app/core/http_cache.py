@@ -0,0 +1,44 @@
+"""
+ETags fracos e respostas 304 para as consultas de produto
+
+O ETag sai de dados que já mudam a cada alteração (versão do saldo e
+timestamp do cadastro no hash do produto), então um hit no cache pode
+responder 304 sem montar nem serializar o corpo.
+"""
+import hashlib
+from typing import Any, Dict, Optional
+from fastapi import Response
+from .config import settings
+
+
+def etag_fraco(*partes: Any) -> str:
+    """ETag fraco (W/"...") a partir das partes informadas"""
+    digest = hashlib.blake2b(
+        "\x1f".join(str(parte) for parte in partes).encode(), digest_size=8
+    ).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara com If-None-Match usando comparação fraca (RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    valor = etag.removeprefix("W/")
+    return any(
+        candidato.strip().removeprefix("W/") == valor
+        for candidato in if_none_match.split(",")
+    )
+
+
+def cabecalhos_cache(etag: str) -> Dict[str, str]:
+    return {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={settings.HTTP_CACHE_MAX_AGE}, must-revalidate",
+    }
+
+
+def nao_modificado(etag: str) -> Response:
+    """Resposta 304 sem corpo, com os mesmos cabeçalhos de cache"""
+    return Response(status_code=304, headers=cabecalhos_cache(etag))
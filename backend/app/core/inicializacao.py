@@ -0,0 +1,81 @@
+"""
+Orçamento de tempo da inicialização
+
+No fly.io a máquina para quando fica ociosa e a primeira requisição paga
+a subida inteira do processo. Cada etapa marca aqui quanto tempo passou
+desde o início do processo (não desde o import deste módulo, para contar
+também o interpretador e o uvicorn), e o relatório final vai para o log
+e para /api/ready, com aviso quando passa do orçamento.
+
+Este módulo deve ser importado antes de tudo em main.py e não importa
+nada pesado (nem as configurações).
+"""
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _inicio_do_processo() -> float:
+    """Epoch em que o processo começou (/proc no Linux; senão, agora)"""
+    try:
+        with open("/proc/self/stat") as f:
+            # O nome do executável pode ter espaços: os campos vêm depois do ')'
+            campos = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        # starttime (campo 22) em ticks desde o boot
+        idade = uptime - int(campos[19]) / os.sysconf("SC_CLK_TCK")
+        return time.time() - max(0.0, idade)
+    except (OSError, ValueError, IndexError, AttributeError):  # pragma: no cover - fora do Linux
+        return time.time()
+
+
+class Inicializacao:
+    """Marcos da subida do processo, em ms desde o início"""
+
+    def __init__(self, inicio: Optional[float] = None):
+        self.inicio = _inicio_do_processo() if inicio is None else inicio
+        self.etapas: Dict[str, float] = {}
+        self.orcamento_ms: Optional[int] = None
+        self.concluida = False
+
+    def marcar(self, etapa: str) -> float:
+        """Registra que a etapa terminou agora; devolve os ms desde o início"""
+        decorrido = round((time.time() - self.inicio) * 1000, 1)
+        self.etapas[etapa] = decorrido
+        return decorrido
+
+    def relatorio(self) -> Dict[str, Any]:
+        """Etapas (acumulado e duração de cada uma) e situação do orçamento"""
+        etapas = []
+        anterior = 0.0
+        for nome, decorrido in self.etapas.items():
+            etapas.append({"etapa": nome, "ms": decorrido, "duracao_ms": round(decorrido - anterior, 1)})
+            anterior = decorrido
+        relatorio: Dict[str, Any] = {"concluida": self.concluida, "total_ms": anterior, "etapas": etapas}
+        if self.orcamento_ms:
+            relatorio["orcamento_ms"] = self.orcamento_ms
+            relatorio["dentro_do_orcamento"] = anterior <= self.orcamento_ms
+        return relatorio
+
+    def concluir(self, etapa: str = "pronto") -> Dict[str, Any]:
+        """Marca a última etapa e registra o relatório no log"""
+        self.marcar(etapa)
+        self.concluida = True
+        relatorio = self.relatorio()
+        resumo = ", ".join(f"{e['etapa']} {e['duracao_ms']:.0f}ms" for e in relatorio["etapas"])
+        if relatorio.get("dentro_do_orcamento") is False:
+            logger.warning(
+                f"Inicialização em {relatorio['total_ms']:.0f}ms, acima do orçamento de "
+                f"{self.orcamento_ms}ms ({resumo})"
+            )
+        else:
+            logger.info(f"Inicialização em {relatorio['total_ms']:.0f}ms ({resumo})")
+        return relatorio
+
+
+# Instância global (o relógio começa no início do processo)
+inicializacao = Inicializacao()
@@ -0,0 +1,51 @@
+"""
+Log de acesso amostrado e estruturado (uma linha JSON por requisição logada)
+
+Substitui o access log do uvicorn (rode com --no-access-log): só uma
+fração das requisições é registrada, mais todas as lentas e as que
+terminam em erro 5xx, que são as que importam para investigar.
+"""
+import json
+import random
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import logging
+
+logger = logging.getLogger("acesso")
+
+
+class LogAcessoMiddleware:
+    def __init__(self, app: ASGIApp, amostra: float = 0.01, lento_ms: float = 1000):
+        self.app = app
+        self.amostra = amostra
+        self.lento_ms = lento_ms
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        status = 500
+        tamanho = 0
+
+        async def enviar(message: Message) -> None:
+            nonlocal status, tamanho
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                tamanho += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            if status >= 500 or duracao_ms >= self.lento_ms or random.random() < self.amostra:
+                logger.info(json.dumps({
+                    "metodo": scope["method"],
+                    "caminho": scope["path"],
+                    "status": status,
+                    "duracao_ms": round(duracao_ms, 1),
+                    "bytes": tamanho,
+                    "amostra": self.amostra,
+                }))
@@ -0,0 +1,46 @@
+"""
+Métricas HTTP do backend FastAPI (exportadas em /metrics)
+
+MetricasMiddleware observa a duração de cada requisição no histograma
+http_requisicao_segundos por método, rota e status. A rota é o template
+casado (ex: /api/v2/estoque/produto/{codigo}), não o caminho, para o
+número de séries não crescer com os códigos consultados. As demais
+métricas (chamadas ao Tiny, limitador, Redis, camadas de cache) são
+registradas pelo estoque_comum e por CacheProdutos no mesmo registro.
+"""
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from estoque_comum.metricas import registro
+
+REQUISICOES = registro.histograma(
+    "http_requisicao_segundos",
+    "Duração das requisições HTTP por método, rota e status",
+    ("metodo", "rota", "status"),
+)
+
+
+class MetricasMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        inicio = time.perf_counter()
+        status = 500
+
+        async def enviar(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            # O roteador do FastAPI deixa a rota casada no próprio scope
+            rota = getattr(scope.get("route"), "path", None) or "desconhecida"
+            REQUISICOES.observar(
+                time.perf_counter() - inicio, metodo=scope["method"], rota=rota, status=str(status)
+            )
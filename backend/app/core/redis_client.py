@@ -1,97 +1,30 @@
-import redis
+"""
+Cliente Redis do backend FastAPI
+
+Operações e codecs ficam em estoque_comum.cache (os mesmos do Flask);
+aqui só a URL e o codec vindos das configurações.
+"""
+from estoque_comum.cache import (  # noqa: F401 - reexportados para o resto do app
+    CAMPOS_PRODUTO, CODECS, LUA_LIBERAR_TRAVA, Codec, MsgpackCodec, ORJSONCodec, CacheRedisAsync,
+    msgpack, obter_codec, orjson, projetar,
+)
 from .config import settings
-import json
-from typing import Optional, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
-class RedisClient:
-    def __init__(self):
-        self.client = None
-        self.connected = False
-        try:
-            # Conecta ao Redis
-            # Para Upstash, a URL já virá com rediss:// incluindo SSL
-            self.client = redis.from_url(
-                settings.REDIS_URL, 
-                decode_responses=True
-            )
-            # Testa conexão
-            self.client.ping()
-            self.connected = True
-            logger.info("Conexão Redis estabelecida com sucesso")
-        except Exception as e:
-            logger.error(f"Erro ao conectar com Redis: {e}")
-            # Não levanta erro para permitir app iniciar sem Redis
-            logger.warning("Aplicativo iniciará sem Redis. Algumas funcionalidades estarão limitadas.")
-            self.connected = False
-    
-    async def get(self, key: str) -> Optional[Any]:
-        """Busca valor no Redis"""
-        if not self.connected or not self.client:
-            return None
-        try:
-            value = self.client.get(key)
-            if value:
-                try:
-                    return json.loads(value)
-                except json.JSONDecodeError:
-                    return value
-            return None
-        except Exception as e:
-            logger.error(f"Erro ao buscar {key} no Redis: {e}")
-            return None
-    
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
-        """Salva valor no Redis"""
-        if not self.connected or not self.client:
-            return False
-        try:
-            if isinstance(value, (dict, list)):
-                value = json.dumps(value)
-            return self.client.set(key, value, ex=ex)
-        except Exception as e:
-            logger.error(f"Erro ao salvar {key} no Redis: {e}")
-            return False
-    
-    async def delete(self, key: str) -> bool:
-        """Remove chave do Redis"""
-        if not self.connected or not self.client:
-            return False
-        try:
-            return self.client.delete(key) > 0
-        except Exception as e:
-            logger.error(f"Erro ao deletar {key} no Redis: {e}")
-            return False
-    
-    async def exists(self, key: str) -> bool:
-        """Verifica se chave existe"""
-        if not self.connected or not self.client:
-            return False
-        try:
-            return self.client.exists(key) > 0
-        except Exception as e:
-            logger.error(f"Erro ao verificar {key} no Redis: {e}")
-            return False
+class RedisClient(CacheRedisAsync):
+    def __init__(self, conectar: bool = True):
+        super().__init__(settings.REDIS_URL, settings.REDIS_CODEC, conectar=conectar)
 
-class DummyRedisClient:
+class DummyRedisClient(CacheRedisAsync):
     """Cliente Redis falso para quando Redis não está disponível"""
-    async def get(self, key: str) -> None:
-        return None
-    
-    async def set(self, key: str, value: Any, ex: Optional[int] = None) -> bool:
-        return False
-    
-    async def delete(self, key: str) -> bool:
-        return False
-    
-    async def exists(self, key: str) -> bool:
-        return False
+    def __init__(self):
+        super().__init__(None)
 
-# Instância global
+# Instância global (sem rede no import: o lifespan do app conecta em segundo plano)
 try:
-    redis_client = RedisClient()
+    redis_client = RedisClient(conectar=False)
 except Exception as e:
     logger.error(f"Falha ao criar cliente Redis: {e}")
     logger.warning("Usando cliente Redis falso")
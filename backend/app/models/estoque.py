@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict, List
 
 class EntradaEstoqueRequest(BaseModel):
     codigo_produto: str = Field(..., description="Código do produto (ex: PH-510)")
@@ -26,6 +26,9 @@ class EntradaEstoqueResponse(BaseModel):
     message: str
     produto_id: Optional[str] = None
     saldo_atual: Optional[int] = None
+    deposito_aplicado: Optional[str] = Field(
+        None, description="Depósito em que o Tiny registrou a movimentação (pode diferir do pedido)"
+    )
     tiny_response: Optional[dict] = None
     
 class ProdutoInfo(BaseModel):
@@ -33,4 +36,19 @@ class ProdutoInfo(BaseModel):
     codigo: str
     nome: str
     unidade: str
-    saldo: int
\ No newline at end of file
+    saldo: int
+    depositos: Dict[str, int] = Field(default_factory=dict, description="Saldo por depósito")
+
+class ProdutosLoteRequest(BaseModel):
+    codigos: List[str] = Field(..., min_length=1, max_length=200, description="Códigos dos produtos")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "codigos": ["PH-510", "PH-511", "PH-512"]
+            }
+        }
+
+class ProdutosLoteResponse(BaseModel):
+    produtos: Dict[str, ProdutoInfo]
+    nao_encontrados: List[str] = []
\ No newline at end of file
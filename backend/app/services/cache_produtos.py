@@ -1,24 +1,311 @@
 """
 Serviço de cache de produtos PH no Redis
 Mantém um índice rápido de código -> ID para produtos PH
+
+Cada produto é um hash em produto:{codigo} com id, codigo, nome, unidade,
+saldo, saldo por depósito (deposito:{nome}) e timestamps, para que o
+saldo possa ser lido ou incrementado campo a campo sem reescrever o
+registro inteiro.
+
+Proteção contra stampede: TTL com jitter para as entradas não expirarem
+todas juntas, recálculo probabilístico antecipado (XFetch) e lock por
+chave para que só um worker consulte o Tiny enquanto os demais continuam
+servindo o valor antigo.
+
+O mapa código -> id/nome também fica na memória do processo (indice),
+carregado do Redis numa varredura em segundo plano logo que o app sobe:
+a primeira /entrada depois de a máquina acordar não espera pelo Redis
+para resolver o id. O id de um código não muda no Tiny, então o índice
+não expira; limpar_cache o esvazia junto.
+
+Abaixo do Redis ainda há a cópia local do índice (indice_local): um
+arquivo msgpack gravado periodicamente e lido na subida, consultado só
+quando o Redis não tem o código (fora do ar, vazio depois de um deploy)
+e antes de recorrer ao Tiny.
+
+As chaves ficam num namespace versionado (namespace_produtos): reconstruir
+grava uma versão nova em segundo plano e só então troca o ponteiro, e
+limpar_cache troca para uma versão vazia antes de apagar a anterior.
 """
-import json
-from typing import Dict, Any, Optional, List
-from ..core.redis_client import redis_client
+import asyncio
+import math
+import os
+import random
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Any, Optional, List, Set, Tuple
+from estoque_comum.metricas import consulta_cache
+from ..core.config import settings
+from ..core.redis_client import redis_client, projetar, obter_codec, CAMPOS_PRODUTO, LUA_LIBERAR_TRAVA
+from .namespace_produtos import NamespaceProdutos
 from .tiny_api import tiny_client
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def deve_recalcular(delta: float, expira_em: float, beta: float = 1.0, agora: Optional[float] = None) -> bool:
+    """
+    Decide se a entrada deve ser recalculada antes de expirar (XFetch).
+
+    delta é o tempo (s) que o último recálculo levou; quanto mais caro o
+    recálculo e mais perto da expiração, maior a chance de antecipar.
+    """
+    agora = time.time() if agora is None else agora
+    # 1 - random() fica em (0, 1], evitando log(0)
+    return agora - delta * beta * math.log(1.0 - random.random()) >= expira_em
+
+
+# Scripts Lua que atualizam o saldo de forma atômica no Redis.
+# Campos de controle no hash: versao (movimentações concluídas + saldos
+# gravados), pendentes e pendentes_em (movimentações enviadas ao Tiny e
+# ainda sem resposta) e depositos_em (divisão por depósito conhecida).
+
+CAMPO_DEPOSITO = "deposito:"
+
+_LUA_GARANTIR_TTL = """
+if redis.call('TTL', KEYS[1]) < 0 then
+  redis.call('EXPIRE', KEYS[1], ARGV[#ARGV])
+end
+"""
+
+_LUA_REMOVER_DEPOSITOS = """
+local function remover_depositos()
+  for _, campo in ipairs(redis.call('HKEYS', KEYS[1])) do
+    if string.sub(campo, 1, 9) == 'deposito:' then
+      redis.call('HDEL', KEYS[1], campo)
+    end
+  end
+  redis.call('HDEL', KEYS[1], 'depositos_em')
+end
+"""
+
+# ARGV: agora, ttl
+LUA_INICIAR_MOVIMENTACAO = """
+redis.call('HINCRBY', KEYS[1], 'pendentes', 1)
+redis.call('HSET', KEYS[1], 'pendentes_em', ARGV[1])
+""" + _LUA_GARANTIR_TTL + """
+return 1
+"""
+
+# ARGV: quantidade ('' = desconhecida), agora, idade máxima do saldo, sucesso (1/0),
+#       depósito movimentado ('' = desconhecido), ttl
+# Sem sucesso confirmado (erro, timeout) a movimentação pode ter sido
+# registrada no Tiny: o saldo passa a ser desconhecido, como sem quantidade
+LUA_CONCLUIR_MOVIMENTACAO = _LUA_REMOVER_DEPOSITOS + """
+if tonumber(redis.call('HGET', KEYS[1], 'pendentes') or '0') > 0 then
+  redis.call('HINCRBY', KEYS[1], 'pendentes', -1)
+end
+local versao = redis.call('HINCRBY', KEYS[1], 'versao', 1)
+""" + _LUA_GARANTIR_TTL + """
+local campos = redis.call('HMGET', KEYS[1], 'saldo', 'saldo_em')
+if ARGV[4] ~= '1' or ARGV[1] == '' or not campos[1] or not campos[2]
+   or tonumber(ARGV[2]) - tonumber(campos[2]) >= tonumber(ARGV[3]) then
+  -- Sem saldo confiável para incrementar: invalida e deixa para o Tiny
+  redis.call('HDEL', KEYS[1], 'saldo', 'saldo_em')
+  remover_depositos()
+  return false
+end
+local saldo = redis.call('HINCRBY', KEYS[1], 'saldo', ARGV[1])
+local campo = 'deposito:' .. ARGV[5]
+if ARGV[5] ~= '' and redis.call('HEXISTS', KEYS[1], campo) == 1 then
+  redis.call('HINCRBY', KEYS[1], campo, ARGV[1])
+else
+  -- Não sabemos em qual depósito caiu: a divisão será relida do Tiny
+  remover_depositos()
+end
+return {saldo, versao}
+"""
+
+# ARGV: saldo, agora, versão lida antes da consulta ao Tiny, timeout de pendência,
+#       nº de depósitos (-1 = divisão não informada), nome1, saldo1, ..., ttl
+LUA_DEFINIR_SALDO = _LUA_REMOVER_DEPOSITOS + """
+local campos = redis.call('HMGET', KEYS[1], 'versao', 'pendentes', 'pendentes_em')
+if tonumber(campos[1] or '0') ~= tonumber(ARGV[3]) then
+  return false
+end
+if tonumber(campos[2] or '0') > 0
+   and tonumber(ARGV[2]) - tonumber(campos[3] or '0') < tonumber(ARGV[4]) then
+  return false
+end
+local versao = redis.call('HINCRBY', KEYS[1], 'versao', 1)
+redis.call('HSET', KEYS[1], 'saldo', ARGV[1], 'saldo_em', ARGV[2], 'pendentes', 0)
+local n = tonumber(ARGV[5])
+if n >= 0 then
+  remover_depositos()
+  for i = 0, n - 1 do
+    redis.call('HSET', KEYS[1], 'deposito:' .. ARGV[6 + 2 * i], ARGV[7 + 2 * i])
+  end
+  redis.call('HSET', KEYS[1], 'depositos_em', ARGV[2])
+end
+""" + _LUA_GARANTIR_TTL + """
+return versao
+"""
+
+
 class CacheProdutos:
     """Gerencia cache de produtos no Redis"""
     
     def __init__(self):
         self.prefix = "produto:"
-        self.index_prefix = "produto:index:"
+        self.lock_prefix = "produto:lock:"
+        self.ttl = settings.CACHE_PRODUTO_TTL
+        self.ttl_jitter = settings.CACHE_PRODUTO_TTL_JITTER
+        self.xfetch_beta = settings.CACHE_XFETCH_BETA
+        self.lock_ttl = settings.CACHE_LOCK_TTL
+        self.saldo_ttl = settings.CACHE_SALDO_TTL
+        self.movimento_timeout = settings.CACHE_MOVIMENTO_TIMEOUT
+        # Atualizações em andamento neste processo (evita tarefas duplicadas)
+        self._atualizando: Dict[str, asyncio.Task] = {}
+        # Índice em memória: codigo -> {'id', 'nome'}
+        self.indice: Dict[str, Dict[str, str]] = {}
+        self.estado_indice = "vazio"  # vazio | aquecendo | pronto
+        # Cópia local (último recurso antes do Tiny): codigo -> {'id', 'nome'}
+        self.indice_local: Dict[str, Dict[str, str]] = {}
+        self.arquivo_indice = settings.CACHE_INDICE_ARQUIVO
+        self._codec_indice = obter_codec("msgpack")
+        self._indice_alterado = False
+        # Versão das chaves (ponteiro no Redis) e coletas de versões antigas agendadas
+        self.namespace = NamespaceProdutos(redis_client, self.prefix, settings.CACHE_NAMESPACE_VERIFICAR)
+        self.carencia = settings.CACHE_NAMESPACE_CARENCIA
+        self.reconstrucao_ttl = 3600  # trava entre processos; população pelo Tiny é lenta
+        self._reconstrucao: Optional[asyncio.Task] = None
+        self._coletas: Set[asyncio.Task] = set()
+    
+    def _ttl_com_jitter(self) -> int:
+        """TTL base reduzido aleatoriamente para espalhar as expirações"""
+        return max(1, int(self.ttl * (1 - random.random() * self.ttl_jitter)))
+    
+    def chave(self, codigo: str, versao: Optional[int] = None) -> str:
+        """Chave do hash do produto na versão atual (ou na informada)"""
+        return f"{self.namespace.prefixo(versao)}{codigo}"
+    
+    def _indexar(self, codigo: str, produto_id: str, nome: Optional[str] = None) -> None:
+        """Guarda o produto no índice em memória (mantém o nome já conhecido)"""
+        entrada = self.indice.setdefault(codigo, {})
+        if entrada.get('id') != str(produto_id) or (nome and entrada.get('nome') != nome):
+            self._indice_alterado = True
+        entrada['id'] = str(produto_id)
+        if nome:
+            entrada['nome'] = nome
+    
+    def nome_por_codigo(self, codigo: str) -> Optional[str]:
+        """Nome conhecido em memória (índice ou cópia local), sem ir ao Redis"""
+        entrada = self.indice.get(codigo) or self.indice_local.get(codigo) or {}
+        return entrada.get('nome')
+    
+    def _ler_snapshot(self) -> Dict[str, Dict[str, str]]:
+        with open(self.arquivo_indice, 'rb') as f:
+            dados = self._codec_indice.decode(f.read())
+        return {
+            codigo: {'id': produto_id, 'nome': nome} if nome else {'id': produto_id}
+            for codigo, produto_id, nome in dados['produtos']
+        }
+    
+    def _gravar_snapshot(self, produtos: Dict[str, Dict[str, str]]) -> None:
+        # Grava ao lado e troca com rename: quem lê nunca vê o arquivo pela metade
+        pasta = os.path.dirname(self.arquivo_indice)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        temporario = f"{self.arquivo_indice}.{os.getpid()}.tmp"
+        dados = {
+            'versao': 1,
+            'gerado_em': time.time(),
+            'produtos': [[codigo, e['id'], e.get('nome')] for codigo, e in produtos.items()]
+        }
+        with open(temporario, 'wb') as f:
+            f.write(self._codec_indice.encode(dados))
+        os.replace(temporario, self.arquivo_indice)
+    
+    async def carregar_snapshot(self) -> int:
+        """Lê a cópia local do índice (na subida, antes do Redis responder)"""
+        if not self.arquivo_indice:
+            return 0
+        try:
+            self.indice_local = await asyncio.to_thread(self._ler_snapshot)
+            logger.info(f"Cópia local do índice carregada: {len(self.indice_local)} produtos")
+        except FileNotFoundError:
+            logger.info(f"Sem cópia local do índice em {self.arquivo_indice}")
+        except Exception as e:
+            logger.warning(f"Cópia local do índice ignorada ({self.arquivo_indice}): {e}")
+        return len(self.indice_local)
+    
+    async def salvar_snapshot(self, forcar: bool = False) -> bool:
+        """
+        Grava índice + cópia local no arquivo, se o índice mudou desde a
+        última gravação. Códigos só conhecidos pela cópia anterior são
+        mantidos, para uma queda do Redis não encolher o arquivo.
+        """
+        if not self.arquivo_indice or not (self._indice_alterado or forcar):
+            return False
+        self._indice_alterado = False
+        produtos = {**self.indice_local, **self.indice}
+        try:
+            await asyncio.to_thread(self._gravar_snapshot, produtos)
+            self.indice_local = produtos
+            logger.debug(f"Cópia local do índice gravada: {len(produtos)} produtos")
+            return True
+        except Exception as e:
+            self._indice_alterado = True
+            logger.error(f"Erro ao gravar cópia local do índice: {e}")
+            return False
+    
+    async def manter_snapshot(self, intervalo: float) -> None:
+        """Grava a cópia local a cada intervalo (tarefa de fundo do app)"""
+        while True:
+            await asyncio.sleep(intervalo)
+            await self.salvar_snapshot()
+    
+    async def aquecer_indice(self) -> int:
+        """
+        Carrega o índice em memória a partir do Redis: espera a primeira
+        conexão e lê id/codigo/nome de todos os produtos numa varredura
+        (SCAN + HMGET em pipeline, numa thread). Sem Redis o índice fica
+        vazio e as consultas seguem o caminho normal.
+        """
+        self.estado_indice = "aquecendo"
+        carregados = 0
+        try:
+            if await redis_client.aguardar_conexao() != 'conectado':
+                return 0
+            versao = await self.namespace.atualizar()
+            registros = await redis_client.varrer_campos(f"{self.namespace.prefixo(versao)}*", ['id', 'codigo', 'nome'])
+            for chave, (produto_id, codigo, nome) in registros:
+                if not produto_id or not codigo or not self.namespace.pertence(chave, versao):
+                    continue
+                # O que foi cacheado durante a varredura é mais novo: não sobrescreve
+                if codigo not in self.indice:
+                    self._indexar(codigo, produto_id, nome)
+                    carregados += 1
+            logger.info(f"Índice de produtos aquecido: {carregados} produtos")
+            return carregados
+        except Exception as e:
+            logger.error(f"Erro ao aquecer índice de produtos: {e}")
+            return carregados
+        finally:
+            self.estado_indice = "pronto"
+    
+    def _desembrulhar(self, registro: Dict[str, str]) -> Tuple[Optional[Dict[str, Any]], float, float]:
+        """Separa produto e metadados XFetch de um hash lido do Redis"""
+        if not registro.get('nome'):
+            # Só o id é conhecido (ex: popular-cache-bulk): produto incompleto
+            return None, 0.0, float('inf')
+        produto = projetar(registro, CAMPOS_PRODUTO)
+        if 'saldo' in produto:
+            produto['saldo'] = int(produto['saldo'])
+        return produto, float(registro.get('delta', 0)), float(registro.get('expira_em', 'inf'))
         
-    async def cachear_produto(self, produto: Dict[str, Any]) -> bool:
-        """Cacheia um produto no Redis"""
+    async def cachear_produto(
+        self,
+        produto: Dict[str, Any],
+        delta: float = 0.0,
+        versao: Optional[int] = None
+    ) -> bool:
+        """
+        Cacheia um produto no Redis. Numa versão em reconstrução o saldo
+        não é gravado: movimentações feitas até a troca só atualizam a
+        versão atual, então o saldo da nova é relido do Tiny.
+        """
         try:
             codigo = produto.get('codigo')
             produto_id = produto.get('id')
@@ -26,13 +313,24 @@ class CacheProdutos:
             if not codigo or not produto_id:
                 return False
             
-            # Salvar produto completo
-            key = f"{self.prefix}{codigo}"
-            await redis_client.set(key, produto, ex=86400)  # 24 horas
+            ttl = self._ttl_com_jitter()
+            agora = time.time()
             
-            # Criar índice código -> ID
-            index_key = f"{self.index_prefix}{codigo}"
-            await redis_client.set(index_key, produto_id, ex=86400)
+            # Só os campos usados, com metadados para o XFetch. O saldo é
+            # gravado apenas se veio do Tiny; senão o já cacheado é mantido.
+            campos = projetar(produto, CAMPOS_PRODUTO)
+            if versao is not None:
+                campos.pop('saldo', None)
+            campos.update({
+                'atualizado_em': agora,
+                'delta': delta,
+                'expira_em': agora + ttl
+            })
+            if 'saldo' in campos:
+                campos['saldo'] = int(float(campos['saldo']))
+                campos['saldo_em'] = agora
+            await redis_client.hset(self.chave(codigo, versao), campos, ex=ttl)
+            self._indexar(codigo, produto_id, produto.get('nome'))
             
             logger.info(f"Produto {codigo} cacheado com sucesso")
             return True
@@ -41,23 +339,106 @@ class CacheProdutos:
             logger.error(f"Erro ao cachear produto: {e}")
             return False
     
+    async def _adquirir_lock(self, codigo: str) -> Optional[str]:
+        """Tenta obter o lock de recálculo da chave; retorna o token se conseguiu"""
+        token = uuid.uuid4().hex
+        if await redis_client.set(f"{self.lock_prefix}{codigo}", token, ex=self.lock_ttl, nx=True):
+            return token
+        return None
+    
+    async def _liberar_lock(self, codigo: str, token: str) -> None:
+        """Libera o lock, se ainda for nosso (comparar e apagar atomicamente)"""
+        await redis_client.executar_script(LUA_LIBERAR_TRAVA, [f"{self.lock_prefix}{codigo}"], [token])
+    
+    async def _buscar_na_api(self, codigo: str, fresco: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Busca no Tiny e cacheia, registrando quanto tempo o recálculo levou.
+        fresco=True ignora o cache de leitura do cliente Tiny (refresh antecipado).
+        """
+        inicio = time.monotonic()
+        produto = await tiny_client.buscar_produto_por_codigo(codigo, fresco=fresco)
+        if produto:
+            await self.cachear_produto(produto, delta=time.monotonic() - inicio)
+        return produto
+    
+    async def _atualizar_em_background(self, codigo: str) -> None:
+        """Recalcula a entrada se conseguir o lock; senão outro worker já está nisso"""
+        try:
+            token = await self._adquirir_lock(codigo)
+            if not token:
+                return
+            try:
+                logger.debug(f"Atualizando antecipadamente o cache de {codigo}")
+                await self._buscar_na_api(codigo, fresco=True)
+            finally:
+                await self._liberar_lock(codigo, token)
+        except Exception as e:
+            logger.error(f"Erro ao atualizar cache de {codigo}: {e}")
+        finally:
+            self._atualizando.pop(codigo, None)
+    
+    def _agendar_atualizacao(self, codigo: str) -> None:
+        """Agenda o recálculo sem bloquear quem está lendo o valor antigo"""
+        if codigo not in self._atualizando:
+            self._atualizando[codigo] = asyncio.create_task(self._atualizar_em_background(codigo))
+    
+    async def _buscar_com_lock(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """
+        Cache miss: apenas o dono do lock consulta o Tiny; os demais aguardam
+        o valor aparecer no cache por até lock_ttl antes de desistir.
+        """
+        if not getattr(redis_client, 'connected', False):
+            return await self._buscar_na_api(codigo)
+        
+        token = await self._adquirir_lock(codigo)
+        if token:
+            try:
+                return await self._buscar_na_api(codigo)
+            finally:
+                await self._liberar_lock(codigo, token)
+        
+        prazo = time.monotonic() + self.lock_ttl
+        espera = 0.05
+        while time.monotonic() < prazo:
+            await asyncio.sleep(espera)
+            produto = self._desembrulhar(await redis_client.hgetall(self.chave(codigo)))[0]
+            if produto:
+                return produto
+            if not await redis_client.exists(f"{self.lock_prefix}{codigo}"):
+                break
+            espera = min(espera * 2, 0.5)
+        
+        # Lock expirou ou foi liberado sem gravar (ex: produto inexistente)
+        return await self._buscar_na_api(codigo)
+    
     async def obter_id_por_codigo(self, codigo: str) -> Optional[str]:
         """Obtém ID do produto pelo código (cache rápido)"""
         try:
-            index_key = f"{self.index_prefix}{codigo}"
-            produto_id = await redis_client.get(index_key)
+            entrada = self.indice.get(codigo)
+            consulta_cache('memoria', bool(entrada))
+            if entrada:
+                return entrada['id']
+            
+            produto_id = (await redis_client.hmget(self.chave(codigo), ['id']))[0]
+            consulta_cache('redis', bool(produto_id))
             
             if produto_id:
                 logger.debug(f"ID do produto {codigo} encontrado no cache: {produto_id}")
+                self._indexar(codigo, produto_id)
                 return produto_id
             
+            # Redis fora do ar ou sem a chave: cópia local antes do Tiny
+            local = self.indice_local.get(codigo)
+            consulta_cache('local', bool(local))
+            if local:
+                logger.debug(f"ID do produto {codigo} encontrado na cópia local: {local['id']}")
+                return local['id']
+            
             # Se não está no cache, buscar na API
             logger.info(f"Produto {codigo} não está no cache, buscando na API...")
-            produto = await tiny_client.buscar_produto_por_codigo(codigo)
+            produto = await self._buscar_com_lock(codigo)
             
             if produto:
-                # Cachear para próximas buscas
-                await self.cachear_produto(produto)
                 return produto.get('id')
                 
             return None
@@ -70,32 +451,115 @@ class CacheProdutos:
         """Obtém produto completo do cache ou API"""
         try:
             # Tentar cache primeiro
-            key = f"{self.prefix}{codigo}"
-            produto = await redis_client.get(key)
+            produto, delta, expira_em = self._desembrulhar(
+                await redis_client.hgetall(self.chave(codigo))
+            )
+            consulta_cache('redis', bool(produto))
             
             if produto:
                 logger.debug(f"Produto {codigo} encontrado no cache")
+                if deve_recalcular(delta, expira_em, self.xfetch_beta):
+                    self._agendar_atualizacao(codigo)
                 return produto
             
             # Se não está no cache, buscar na API
             logger.info(f"Produto {codigo} não está no cache, buscando na API...")
-            produto = await tiny_client.buscar_produto_por_codigo(codigo)
-            
-            if produto:
-                # Cachear para próximas buscas
-                await self.cachear_produto(produto)
-                return produto
-                
-            return None
+            return await self._buscar_com_lock(codigo)
             
         except Exception as e:
             logger.error(f"Erro ao obter produto: {e}")
             return None
     
-    async def popular_cache_produtos_ph(self, inicio: int = 1, fim: int = 999) -> Dict[str, Any]:
+    def saldo_valido(self, saldo_em: Optional[str]) -> bool:
+        """O saldo cacheado foi confirmado pelo Tiny há menos de saldo_ttl?"""
+        return bool(saldo_em) and time.time() - float(saldo_em) < self.saldo_ttl
+    
+    async def versao_saldo(self, codigo: str) -> int:
+        """Versão atual do saldo; deve ser lida antes de consultar o Tiny"""
+        return int((await redis_client.hmget(self.chave(codigo), ['versao']))[0] or 0)
+    
+    async def obter_registro(self, codigo: str) -> Dict[str, str]:
+        """Hash completo do produto (vazio se não estiver em cache)"""
+        return await redis_client.hgetall(self.chave(codigo))
+    
+    async def obter_registros(self, codigos: List[str]) -> List[Dict[str, str]]:
+        """Hashes de vários produtos numa única ida ao Redis"""
+        return await redis_client.hgetall_lote([self.chave(codigo) for codigo in codigos])
+    
+    @staticmethod
+    def depositos_do_registro(registro: Dict[str, str]) -> Dict[str, int]:
+        """Saldo por depósito gravado no hash"""
+        return {
+            campo[len(CAMPO_DEPOSITO):]: int(valor)
+            for campo, valor in registro.items()
+            if campo.startswith(CAMPO_DEPOSITO)
+        }
+    
+    async def definir_saldo(
+        self,
+        codigo: str,
+        saldo: int,
+        versao_lida: int,
+        depositos: Optional[Dict[str, int]] = None
+    ) -> bool:
+        """
+        Grava o saldo (e a divisão por depósito) lido do Tiny, desde que
+        nenhuma movimentação tenha terminado ou esteja em andamento desde
+        que versao_lida foi obtida.
+        """
+        args = [int(saldo), time.time(), versao_lida, self.movimento_timeout]
+        if depositos is None:
+            args.append(-1)
+        else:
+            args.append(len(depositos))
+            for nome, valor in depositos.items():
+                args.extend([nome, int(valor)])
+        args.append(self._ttl_com_jitter())
+        versao = await redis_client.executar_script(LUA_DEFINIR_SALDO, [self.chave(codigo)], args)
+        return versao is not None
+    
+    async def iniciar_movimentacao(self, codigo: str) -> None:
+        """Marca uma movimentação em andamento antes de enviá-la ao Tiny"""
+        await redis_client.executar_script(LUA_INICIAR_MOVIMENTACAO, [self.chave(codigo)], [
+            time.time(), self._ttl_com_jitter()
+        ])
+    
+    async def concluir_movimentacao(
+        self,
+        codigo: str,
+        quantidade: Optional[int],
+        sucesso: bool = True,
+        deposito: Optional[str] = None
+    ) -> Optional[int]:
+        """
+        Aplica a variação ao saldo cacheado (total e do depósito) no próprio
+        Redis, sem ler e regravar, encerrando a movimentação iniciada.
+        Retorna o novo saldo, ou None se não havia saldo recente para atualizar.
+        Com sucesso=False o resultado no Tiny é incerto: o saldo cacheado é
+        descartado e a versão avança, para uma leitura anterior não regravá-lo.
+        """
+        resultado = await redis_client.executar_script(LUA_CONCLUIR_MOVIMENTACAO, [self.chave(codigo)], [
+            '' if quantidade is None else int(quantidade),
+            time.time(),
+            self.saldo_ttl,
+            1 if sucesso else 0,
+            deposito or '',
+            self._ttl_com_jitter()
+        ])
+        return int(resultado[0]) if resultado else None
+    
+    async def popular_cache_produtos_ph(
+        self,
+        inicio: int = 1,
+        fim: int = 999,
+        versao: Optional[int] = None
+    ) -> Dict[str, Any]:
         """
         Popula cache com produtos PH-XXX
         Busca produtos de PH-001 até PH-999
+
+        Com versao, grava numa versão em reconstrução: id e nome vêm do que
+        já se sabe (índice, versão atual, cópia local) e só o resto do Tiny.
         """
         logger.info(f"Iniciando população de cache PH-{inicio:03d} até PH-{fim:03d}")
         
@@ -107,6 +571,16 @@ class CacheProdutos:
             codigo = f"PH-{num}"
             
             try:
+                if versao is not None:
+                    produto_id = await self.obter_id_por_codigo(codigo)
+                    if produto_id:
+                        produtos_encontrados += 1
+                        if await self.salvar_produto_cache(
+                            codigo, produto_id, versao=versao, nome=self.nome_por_codigo(codigo)
+                        ):
+                            produtos_cacheados += 1
+                    continue
+                
                 # Verificar se já está no cache
                 if await self.obter_id_por_codigo(codigo):
                     produtos_encontrados += 1
@@ -128,7 +602,6 @@ class CacheProdutos:
             
             # Pequena pausa para não sobrecarregar API
             if num % 10 == 0:
-                import asyncio
                 await asyncio.sleep(0.5)
         
         resultado = {
@@ -141,11 +614,20 @@ class CacheProdutos:
         logger.info(f"População de cache concluída: {resultado}")
         return resultado
     
-    async def salvar_produto_cache(self, codigo: str, produto_id: str) -> bool:
+    async def salvar_produto_cache(
+        self,
+        codigo: str,
+        produto_id: str,
+        versao: Optional[int] = None,
+        nome: Optional[str] = None
+    ) -> bool:
         """Salva ID do produto no cache"""
         try:
-            chave = f"{self.prefix}{codigo}"
-            await redis_client.set(chave, produto_id, ex=self.ttl)
+            campos = {'id': produto_id, 'codigo': codigo}
+            if nome:
+                campos['nome'] = nome
+            await redis_client.hset(self.chave(codigo, versao), campos, ex=self._ttl_com_jitter())
+            self._indexar(codigo, produto_id, nome)
             logger.info(f"Produto {codigo} (ID: {produto_id}) salvo no cache")
             return True
         except Exception as e:
@@ -156,16 +638,16 @@ class CacheProdutos:
         """Lista produtos cacheados com determinado prefixo"""
         try:
             produtos = []
-            pattern = f"{self.prefix}{prefixo}*"
+            pattern = f"{self.namespace.prefixo()}{prefixo}*"
             
             # Usar scan para buscar chaves
             async for key in redis_client.scan_iter(match=pattern):
-                produto = await redis_client.get(key)
-                if produto:
+                produto_id, codigo, nome = await redis_client.hmget(key, ['id', 'codigo', 'nome'])
+                if produto_id and codigo:
                     produtos.append({
-                        'codigo': produto.get('codigo'),
-                        'nome': produto.get('nome'),
-                        'id': produto.get('id')
+                        'codigo': codigo,
+                        'nome': nome,
+                        'id': produto_id
                     })
             
             return sorted(produtos, key=lambda x: x['codigo'])
@@ -174,28 +656,82 @@ class CacheProdutos:
             logger.error(f"Erro ao listar produtos: {e}")
             return []
     
+    async def reconstruir(self, preencher: Callable[[int], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Reconstrói o cache sem deixá-lo vazio: preencher(versao) grava os
+        produtos numa versão nova enquanto a atual continua servindo; depois
+        o ponteiro é trocado e a versão antiga é apagada após a carência.
+        Uma reconstrução por vez, em todos os processos.
+        """
+        token = await self.namespace.reservar_reconstrucao(self.reconstrucao_ttl)
+        if not token:
+            return {'success': False, 'message': 'Redis indisponível ou reconstrução já em andamento'}
+        nova = None
+        try:
+            antiga = await self.namespace.atualizar()
+            nova = await self.namespace.nova_versao()
+            if nova is None:
+                return {'success': False, 'message': 'Redis indisponível'}
+            logger.info(f"Reconstruindo cache de produtos na versão {nova} (atual: {antiga})")
+            resultado = await preencher(nova)
+            if not await self.namespace.trocar(antiga, nova):
+                await self.namespace.coletar(nova)
+                return {'success': False, 'message': 'Versão do cache trocada durante a reconstrução'}
+            self._agendar_coleta(antiga)
+            return {'success': True, 'versao': nova, 'versao_anterior': antiga, **resultado}
+        except Exception:
+            if nova is not None:
+                await self.namespace.coletar(nova)
+            raise
+        finally:
+            await self.namespace.liberar_reconstrucao(token)
+    
+    def reconstruir_em_segundo_plano(self, preencher: Callable[[int], Awaitable[Dict[str, Any]]]) -> bool:
+        """Dispara reconstruir() numa tarefa; False se já há uma neste processo"""
+        if self._reconstrucao and not self._reconstrucao.done():
+            return False
+        self._reconstrucao = asyncio.create_task(self.reconstruir(preencher))
+        return True
+    
+    def _agendar_coleta(self, versao: int) -> None:
+        """Apaga a versão antiga depois que todos os processos já leram o novo ponteiro"""
+        async def coletar():
+            await asyncio.sleep(self.carencia)
+            await self.namespace.coletar(versao)
+        
+        tarefa = asyncio.create_task(coletar())
+        self._coletas.add(tarefa)
+        tarefa.add_done_callback(self._coletas.discard)
+    
     async def limpar_cache(self, prefixo: Optional[str] = None):
-        """Limpa cache de produtos"""
+        """
+        Limpa cache de produtos. Sem prefixo, aponta para uma versão vazia
+        (troca atômica) e agenda a coleta da anterior para depois da
+        carência, como em reconstruir (devolve 0: nada foi apagado ainda);
+        com prefixo, remove só essas chaves da versão atual e devolve quantas.
+        """
         try:
-            if prefixo:
-                pattern = f"{self.prefix}{prefixo}*"
-            else:
-                pattern = f"{self.prefix}*"
-            
-            count = 0
-            async for key in redis_client.scan_iter(match=pattern):
-                await redis_client.delete(key)
-                count += 1
+            for indice in (self.indice, self.indice_local):
+                for codigo in [c for c in indice if c.startswith(prefixo or '')]:
+                    del indice[codigo]
+            await self.salvar_snapshot(forcar=True)
             
-            # Limpar índices também
+            versao = await self.namespace.atualizar()
             if prefixo:
-                pattern = f"{self.index_prefix}{prefixo}*"
+                count = await redis_client.remover_padrao(
+                    f"{self.namespace.prefixo(versao)}{prefixo}*",
+                    filtro=lambda key: self.namespace.pertence(key, versao)
+                )
             else:
-                pattern = f"{self.index_prefix}*"
-                
-            async for key in redis_client.scan_iter(match=pattern):
-                await redis_client.delete(key)
-                count += 1
+                nova = await self.namespace.nova_versao()
+                if nova is None or not await self.namespace.trocar(versao, nova):
+                    return 0
+                # Os outros processos ainda leem o ponteiro antigo por até
+                # verificar_a_cada segundos. Na versão 0 a coleta remove
+                # também as chaves produto:index:* do formato antigo
+                self._agendar_coleta(versao)
+                logger.info(f"Cache limpo: versão {versao} será apagada em {self.carencia}s")
+                return 0
             
             logger.info(f"Cache limpo: {count} chaves removidas")
             return count
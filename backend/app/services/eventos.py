@@ -0,0 +1,132 @@
+"""
+Eventos de movimentação de estoque para os dashboards (SSE)
+
+Cada entrada/saída publica um evento no canal ESTOQUE_EVENTOS_CANAL do
+Redis (o Flask publica no mesmo canal). Cada processo mantém uma única
+assinatura no Redis e reparte os eventos em filas por cliente, filtradas
+pelos códigos que o cliente pediu.
+
+Backpressure: a fila de cada cliente é limitada; se o cliente não consome
+a tempo, os eventos mais antigos são descartados e ele recebe um evento
+'perdidos' para saber que deve recarregar os saldos.
+"""
+import asyncio
+import json
+import time
+from typing import Any, Dict, Iterable, Optional, Set
+import redis.asyncio as aioredis
+from ..core.config import settings
+from ..core.redis_client import redis_client
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def formatar_sse(evento: str, dados: Dict[str, Any]) -> str:
+    """Serializa um evento no formato text/event-stream"""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
+
+class Assinante:
+    """Fila de eventos de um cliente conectado ao stream"""
+
+    def __init__(self, codigos: Optional[Set[str]], tamanho_fila: int):
+        self.codigos = codigos
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.perdidos = 0
+
+    def aceita(self, evento: Dict[str, Any]) -> bool:
+        """Sem filtro recebe tudo; com filtro, só os códigos (ou ids) pedidos"""
+        if not self.codigos:
+            return True
+        return (
+            evento.get('codigo') in self.codigos
+            or str(evento.get('produto_id')) in self.codigos
+        )
+
+    def entregar(self, evento: Dict[str, Any]) -> None:
+        """Enfileira sem bloquear; com a fila cheia descarta o mais antigo"""
+        try:
+            self.fila.put_nowait(evento)
+        except asyncio.QueueFull:
+            self.fila.get_nowait()
+            self.perdidos += 1
+            self.fila.put_nowait(evento)
+
+
+class HubEventos:
+    """Assinatura única do canal no Redis, repartida entre os clientes do processo"""
+
+    def __init__(self):
+        self.canal = settings.ESTOQUE_EVENTOS_CANAL
+        self.tamanho_fila = settings.ESTOQUE_EVENTOS_FILA
+        self._assinantes: Set[Assinante] = set()
+        self._escuta: Optional[asyncio.Task] = None
+        self.espera_reconexao = 1.0
+
+    def assinar(self, codigos: Optional[Iterable[str]] = None) -> Assinante:
+        """
+        Registra um cliente. A escuta no Redis começa com o primeiro, mesmo
+        com o Redis fora: ela tenta de novo até conectar, e quem assinou
+        durante a inicialização ou uma queda recebe os eventos quando o
+        Redis volta (publicar() passa a usar o canal no mesmo momento).
+        """
+        assinante = Assinante(set(codigos) if codigos else None, self.tamanho_fila)
+        self._assinantes.add(assinante)
+        if self._escuta is None or self._escuta.done():
+            self._escuta = asyncio.create_task(self._escutar())
+        return assinante
+
+    def cancelar(self, assinante: Assinante) -> None:
+        """Remove o cliente; sem clientes a assinatura no Redis é encerrada"""
+        self._assinantes.discard(assinante)
+        if not self._assinantes and self._escuta:
+            self._escuta.cancel()
+            self._escuta = None
+
+    def distribuir(self, evento: Dict[str, Any]) -> None:
+        for assinante in list(self._assinantes):
+            if assinante.aceita(evento):
+                assinante.entregar(evento)
+
+    async def publicar(self, evento: Dict[str, Any]) -> None:
+        """Publica o evento para todos os processos (ou só localmente, sem Redis)"""
+        evento = {**evento, 'timestamp': time.time()}
+        if redis_client.connected:
+            await redis_client.publish(self.canal, json.dumps(evento, ensure_ascii=False))
+        else:
+            self.distribuir(evento)
+
+    async def _escutar(self) -> None:
+        """Lê o canal e reparte os eventos; reconecta se a conexão cair"""
+        falhas = 0
+        while True:
+            conexao = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+            pubsub = conexao.pubsub()
+            try:
+                await pubsub.subscribe(self.canal)
+                if falhas:
+                    logger.info(f"Escuta de {self.canal} restabelecida")
+                falhas = 0
+                async for mensagem in pubsub.listen():
+                    if mensagem.get('type') != 'message':
+                        continue
+                    try:
+                        self.distribuir(json.loads(mensagem['data']))
+                    except (TypeError, ValueError):
+                        logger.warning(f"Evento inválido em {self.canal}: {mensagem['data']!r}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Com o Redis fora, registra só a primeira falha da sequência
+                if not falhas:
+                    logger.error(f"Erro na escuta de {self.canal}: {e}")
+                falhas += 1
+                await asyncio.sleep(self.espera_reconexao)
+            finally:
+                await pubsub.aclose()
+                await conexao.aclose()
+
+
+# Instância global
+hub_eventos = HubEventos()
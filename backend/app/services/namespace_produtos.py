@@ -0,0 +1,126 @@
+"""
+Namespace versionado das chaves de produto
+
+As chaves de CacheProdutos ficam em produto:v{N}:{codigo}, e o N em uso
+está no ponteiro produtos:versao. Uma reconstrução grava a versão N+1
+inteira enquanto a N continua servindo, troca o ponteiro atomicamente
+(só se ninguém trocou antes) e, depois de uma carência, apaga a versão
+antiga com UNLINK em lotes. Nunca há uma janela com o cache vazio.
+
+Sem ponteiro no Redis a versão é 0: o formato antigo, produto:{codigo},
+que continua valendo até a primeira troca (sem migração no deploy).
+
+Cada processo relê o ponteiro a cada verificar_a_cada segundos numa
+tarefa de fundo (manter_atualizado), então montar uma chave não custa ida
+ao Redis; a carência antes da coleta deve ser maior que esse intervalo.
+Uma escrita atrasada na versão antiga depois da coleta vira lixo com TTL,
+que expira sozinho.
+"""
+import asyncio
+import re
+import uuid
+from typing import Optional
+import logging
+
+from estoque_comum.cache import LUA_LIBERAR_TRAVA, CacheRedisAsync
+
+logger = logging.getLogger(__name__)
+
+PONTEIRO = "produtos:versao"
+SEQUENCIA = "produtos:versao:seq"
+TRAVA_RECONSTRUCAO = "produtos:reconstrucao"
+
+# KEYS: ponteiro
+LUA_LER_VERSAO = "return redis.call('GET', KEYS[1]) or '0'"
+
+# KEYS: ponteiro, sequência. A nova versão é sempre maior que a atual,
+# mesmo se a sequência tiver sido apagada
+LUA_NOVA_VERSAO = """
+local atual = tonumber(redis.call('GET', KEYS[1]) or '0')
+local seq = redis.call('INCR', KEYS[2])
+if seq <= atual then
+  seq = atual + 1
+  redis.call('SET', KEYS[2], seq)
+end
+return seq
+"""
+
+# KEYS: ponteiro; ARGV: versão esperada, nova versão
+LUA_TROCAR_VERSAO = """
+if tonumber(redis.call('GET', KEYS[1]) or '0') ~= tonumber(ARGV[1]) then
+  return 0
+end
+redis.call('SET', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class NamespaceProdutos:
+    """Versão atual das chaves de produto e troca atômica do ponteiro"""
+
+    def __init__(self, redis: CacheRedisAsync, base: str = "produto:", verificar_a_cada: float = 2.0):
+        self.redis = redis
+        self.base = base
+        self.verificar_a_cada = verificar_a_cada
+        self.versao = 0
+        # Chaves de outras versões e locks, que não pertencem à versão 0
+        self._fora_da_versao_0 = re.compile(rf"^{re.escape(base)}(v\d+|lock):")
+
+    async def atualizar(self) -> int:
+        """Relê o ponteiro; sem Redis fica a última versão conhecida"""
+        valor = await self.redis.executar_script(LUA_LER_VERSAO, [PONTEIRO], [])
+        if valor is not None:
+            self.versao = int(valor)
+        return self.versao
+
+    async def manter_atualizado(self) -> None:
+        """Tarefa de fundo do app: acompanha trocas feitas por outros processos"""
+        while True:
+            try:
+                await self.atualizar()
+            except Exception as e:
+                logger.error(f"Erro ao ler versão do cache de produtos: {e}")
+            await asyncio.sleep(self.verificar_a_cada)
+
+    def prefixo(self, versao: Optional[int] = None) -> str:
+        """Prefixo das chaves da versão (a atual, se não informada)"""
+        versao = self.versao if versao is None else versao
+        return self.base if versao == 0 else f"{self.base}v{versao}:"
+
+    def pertence(self, key: str, versao: int) -> bool:
+        """A chave é de um produto da versão? (na 0 o padrão também pega as outras)"""
+        if not key.startswith(self.prefixo(versao)):
+            return False
+        return versao != 0 or not self._fora_da_versao_0.match(key)
+
+    async def nova_versao(self) -> Optional[int]:
+        """Reserva o número da próxima versão (None sem Redis)"""
+        versao = await self.redis.executar_script(LUA_NOVA_VERSAO, [PONTEIRO, SEQUENCIA], [])
+        return int(versao) if versao is not None else None
+
+    async def trocar(self, de: int, para: int) -> bool:
+        """Aponta para a nova versão, se o ponteiro ainda estiver em `de`"""
+        if await self.redis.executar_script(LUA_TROCAR_VERSAO, [PONTEIRO], [de, para]) != 1:
+            return False
+        self.versao = para
+        logger.info(f"Cache de produtos trocado da versão {de} para a {para}")
+        return True
+
+    async def coletar(self, versao: int, lote: int = 500) -> int:
+        """Apaga as chaves da versão com UNLINK em lotes (numa thread); devolve quantas"""
+        removidas = await self.redis.remover_padrao(
+            f"{self.prefixo(versao)}*", lote, lambda key: self.pertence(key, versao)
+        )
+        logger.info(f"Versão {versao} do cache de produtos coletada: {removidas} chaves")
+        return removidas
+
+    async def reservar_reconstrucao(self, ttl: int) -> Optional[str]:
+        """Uma reconstrução por vez (em todos os processos); devolve o token"""
+        token = uuid.uuid4().hex
+        if await self.redis.set(TRAVA_RECONSTRUCAO, token, ex=ttl, nx=True):
+            return token
+        return None
+
+    async def liberar_reconstrucao(self, token: str) -> None:
+        """Solta a trava só se ainda for deste token (comparar e apagar atomicamente)"""
+        await self.redis.executar_script(LUA_LIBERAR_TRAVA, [TRAVA_RECONSTRUCAO], [token])
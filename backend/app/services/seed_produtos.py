@@ -0,0 +1,119 @@
+"""
+Carga do índice de produtos a partir de um arquivo semente versionado
+
+A semente (seeds/produtos_ph.csv, no git) lista código e id de cada
+produto, com o nome opcional:
+
+    codigo,id,nome
+    PH-510,892412345,Arruela Trava
+
+Em vez de limpar o cache e preencher de novo (janela em que toda consulta
+vai ao Tiny), a carga compara a semente com o que já está no Redis e
+grava só o que falta ou mudou, em pipelines de `lote` produtos. Códigos
+cacheados que não estão na semente ficam como estão.
+"""
+import csv
+import hashlib
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Relativo à raiz do backend
+SEMENTE_PADRAO = "seeds/produtos_ph.csv"
+
+# Hash com a versão da última semente aplicada (fora de produto:*)
+CHAVE_VERSAO = "seed:produtos"
+
+
+def ler_semente(caminho: str) -> Tuple[Dict[str, Dict[str, str]], str]:
+    """
+    Lê o CSV da semente: (codigo -> {'id', 'nome'?}, versão). A versão é
+    o hash do conteúdo e muda sempre que o arquivo muda.
+    """
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    produtos: Dict[str, Dict[str, str]] = {}
+    for linha, registro in enumerate(csv.DictReader(conteudo.decode('utf-8').splitlines()), start=2):
+        codigo = (registro.get('codigo') or '').strip()
+        produto_id = (registro.get('id') or '').strip()
+        if not codigo or not produto_id:
+            raise ValueError(f"{caminho}:{linha}: código e id são obrigatórios")
+        if codigo in produtos:
+            raise ValueError(f"{caminho}:{linha}: código {codigo} repetido")
+        produtos[codigo] = {'id': produto_id}
+        nome = (registro.get('nome') or '').strip()
+        if nome:
+            produtos[codigo]['nome'] = nome
+    return produtos, hashlib.sha256(conteudo).hexdigest()[:12]
+
+
+def comparar(
+    client,
+    produtos: Dict[str, Dict[str, str]],
+    chave: Callable[[str], str],
+    lote: int = 500
+) -> Dict[str, Any]:
+    """
+    Lê id/nome de cada código da semente no Redis (HMGET em pipeline, um
+    por lote) e separa os códigos novos, os alterados e a contagem de iguais.
+    Os alterados cujo id mudou também vão para 'trocados': o hash guarda o
+    saldo do produto anterior e precisa ser recriado (ver `aplicar`).
+    """
+    diferencas: Dict[str, Any] = {'novos': [], 'alterados': [], 'trocados': [], 'iguais': 0}
+    codigos = list(produtos)
+    for inicio in range(0, len(codigos), lote):
+        parte = codigos[inicio:inicio + lote]
+        pipe = client.pipeline(transaction=False)
+        for codigo in parte:
+            pipe.hmget(chave(codigo), ['id', 'nome'])
+        for codigo, (produto_id, nome) in zip(parte, pipe.execute()):
+            esperado = produtos[codigo]
+            if produto_id is None:
+                diferencas['novos'].append(codigo)
+            elif produto_id != esperado['id'] or ('nome' in esperado and nome != esperado['nome']):
+                diferencas['alterados'].append(codigo)
+                if produto_id != esperado['id']:
+                    diferencas['trocados'].append(codigo)
+            else:
+                diferencas['iguais'] += 1
+    return diferencas
+
+
+def aplicar(
+    client,
+    produtos: Dict[str, Dict[str, str]],
+    codigos: List[str],
+    chave: Callable[[str], str],
+    ttl: Callable[[], int],
+    lote: int = 500,
+    recriar: Iterable[str] = ()
+) -> int:
+    """
+    Grava os códigos informados (HSET + EXPIRE cada) em pipelines de
+    `lote` produtos; devolve quantos lotes foram enviados.
+
+    Os códigos de `recriar` (id trocado) têm a chave apagada antes do HSET,
+    senão saldo, saldo_em e depósitos do produto anterior continuariam no
+    hash, servidos com o id novo.
+    """
+    recriar = set(recriar)
+    lotes = 0
+    for inicio in range(0, len(codigos), lote):
+        pipe = client.pipeline(transaction=False)
+        for codigo in codigos[inicio:inicio + lote]:
+            key = chave(codigo)
+            if codigo in recriar:
+                pipe.delete(key)
+            pipe.hset(key, mapping={'codigo': codigo, **produtos[codigo]})
+            pipe.expire(key, ttl())
+        pipe.execute()
+        lotes += 1
+    return lotes
+
+
+def versao_aplicada(client) -> Optional[str]:
+    """Versão da última semente aplicada neste Redis"""
+    return client.hget(CHAVE_VERSAO, 'versao')
+
+
+def registrar_versao(client, versao: str, total: int) -> None:
+    client.hset(CHAVE_VERSAO, mapping={'versao': versao, 'produtos': total, 'aplicada_em': time.time()})
@@ -1,17 +1,80 @@
-from fastapi import FastAPI
+# Primeiro import: o relatório de inicialização mede as etapas a seguir
+from app.core.inicializacao import inicializacao
+inicializacao.marcar("interpretador")
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from pathlib import Path
 import os
 import logging
-from app.api import estoque
+from app.api import estoque, scanner
+from app.core.config import settings
+from app.core.estaticos import ArquivosEstaticos
+from app.core.log_acesso import LogAcessoMiddleware
+from app.core.metricas import MetricasMiddleware
+from app.core.redis_client import redis_client
+from app.services.cache_produtos import cache_produtos
+from app.services.tiny_api import tiny_client
+from estoque_comum.metricas import CONTENT_TYPE, coletar, exportar, iniciar_gravacao
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # pragma: no cover - dependência opcional
+    BrotliMiddleware = None
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+inicializacao.orcamento_ms = settings.INICIALIZACAO_ORCAMENTO_MS
+inicializacao.marcar("imports")
+
+async def aquecer():
+    """Depois de aceitar conexões: cópia local do índice, Redis e índice de produtos"""
+    await cache_produtos.carregar_snapshot()
+    inicializacao.marcar(f"copia local ({len(cache_produtos.indice_local)} produtos)")
+    estado = await redis_client.aguardar_conexao()
+    # Versão das chaves de produto antes de servir como pronto
+    await cache_produtos.namespace.atualizar()
+    inicializacao.marcar(f"redis ({estado})")
+    if settings.CACHE_INDICE_AQUECER:
+        await cache_produtos.aquecer_indice()
+        inicializacao.marcar(f"indice ({len(cache_produtos.indice)} produtos)")
+    inicializacao.concluir()
 
-app = FastAPI(title="Dashboard Estoque API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada de rede antes de aceitar conexões: o PING do Redis vai numa
+    # thread, o índice é aquecido numa tarefa e o cliente HTTP do Tiny só
+    # é criado na primeira chamada
+    redis_client.conectar_em_segundo_plano()
+    iniciar_gravacao()
+    aquecimento = asyncio.create_task(aquecer())
+    snapshot = asyncio.create_task(
+        cache_produtos.manter_snapshot(settings.CACHE_INDICE_SNAPSHOT_INTERVALO)
+    )
+    namespace = asyncio.create_task(cache_produtos.namespace.manter_atualizado())
+    inicializacao.marcar("lifespan")
+    yield
+    aquecimento.cancel()
+    snapshot.cancel()
+    namespace.cancel()
+    await cache_produtos.salvar_snapshot()
+    await tiny_client.fechar()
+
+app = FastAPI(
+    title="Dashboard Estoque API",
+    version="2.0.0",
+    lifespan=lifespan,
+    # orjson serializa bem mais rápido que o json da stdlib
+    default_response_class=ORJSONResponse if orjson else JSONResponse
+)
 
 # Configurar CORS
 app.add_middleware(
@@ -22,75 +85,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compressão: brotli quando o cliente aceita, senão gzip. O stream SSE fica
+# de fora porque cada evento precisa sair na hora, sem buffer do compressor
+if BrotliMiddleware:
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=settings.COMPRESSAO_BROTLI_QUALIDADE,
+        minimum_size=settings.COMPRESSAO_TAMANHO_MINIMO,
+        gzip_fallback=True,
+        # /static já sai pré-comprimido da memória
+        excluded_handlers=[r"^/api/v2/estoque/stream", r"^/static/"]
+    )
+else:
+    logger.warning("brotli-asgi não instalado; respostas sem compressão")
+
+# Log de acesso amostrado (substitui o access log do uvicorn)
+app.add_middleware(
+    LogAcessoMiddleware,
+    amostra=settings.LOG_ACESSO_AMOSTRA,
+    lento_ms=settings.LOG_ACESSO_LENTO_MS
+)
+
+# Duração das requisições por rota (a mais externa: inclui compressão e log)
+app.add_middleware(MetricasMiddleware)
+
 # Incluir rotas da API
 app.include_router(estoque.router, prefix="/api/v2/estoque", tags=["estoque"])
+# WebSocket para leitores de código de barras (ws://.../api/v2/estoque/scanner)
+app.include_router(scanner.router, prefix="/api/v2/estoque", tags=["scanner"])
+inicializacao.marcar("app")
 
 # Health check endpoint
 @app.get("/api/health")
 async def health_check():
     return {"status": "healthy"}
 
-# Debug endpoint para verificar estrutura de arquivos
+# Readiness: 503 enquanto a primeira conexão com o Redis e o aquecimento do
+# índice não terminaram (sem Redis o app segue pronto, só que sem cache)
+@app.get("/api/ready")
+async def ready_check():
+    pronto = inicializacao.concluida
+    corpo = {
+        "status": "pronto" if pronto else "iniciando",
+        "redis": redis_client.estado,
+        "indice": {"estado": cache_produtos.estado_indice, "produtos": len(cache_produtos.indice)},
+        "inicializacao": inicializacao.relatorio()
+    }
+    return JSONResponse(corpo, status_code=200 if pronto else 503)
+
+# Métricas no formato do Prometheus: rotas, chamadas ao Tiny, limitador,
+# Redis e camadas de cache (somadas entre workers com PROMETHEUS_MULTIPROC_DIR)
+@app.get("/metrics", include_in_schema=False)
+async def metricas():
+    # A soma dos workers lê arquivos: fora do event loop
+    registro_coletado = await asyncio.to_thread(coletar)
+    # Content-Type pronto no header: com media_type o Starlette repetiria o charset
+    return Response(exportar(registro_coletado), headers={"content-type": CONTENT_TYPE})
+
+# Debug endpoint para verificar estrutura de arquivos (manifesto calculado na inicialização)
 @app.get("/api/debug/static")
 async def debug_static():
-    static_info = {
+    return {
         "static_path": str(static_path.absolute()),
-        "static_exists": static_path.exists(),
-        "contents": []
+        "static_exists": estaticos.existe,
+        "index_html": estaticos.index is not None,
+        "total": len(estaticos.manifesto),
+        "tamanho_total": sum(a["tamanho"] for a in estaticos.manifesto),
+        "arquivos": estaticos.manifesto
     }
-    
-    if static_path.exists():
-        for item in static_path.iterdir():
-            item_info = {
-                "name": item.name,
-                "is_dir": item.is_dir(),
-                "size": item.stat().st_size if item.is_file() else None
-            }
-            if item.is_dir():
-                item_info["contents"] = [sub.name for sub in item.iterdir()]
-            static_info["contents"].append(item_info)
-    
-    return static_info
 
 # API info endpoint
 @app.get("/api")
 async def api_info():
     return {"message": "Dashboard Estoque API v2.0", "status": "online"}
 
-# Servir arquivos estáticos do frontend em produção
+# Servir arquivos estáticos do frontend em produção (carregados uma vez, da memória)
 static_path = Path("static")
-logger.info(f"Verificando pasta static: {static_path.absolute()}")
-logger.info(f"Static existe: {static_path.exists()}")
+estaticos = ArquivosEstaticos(static_path).carregar()
+inicializacao.marcar("estaticos")
 
-if static_path.exists():
-    # Listar conteúdo da pasta static
-    logger.info(f"Conteúdo de static: {list(static_path.iterdir())}")
-    
-    # Verificar se existe a subpasta static/static
-    static_static = static_path / "static"
-    if static_static.exists():
-        logger.info(f"Encontrada subpasta static/static com: {list(static_static.iterdir())}")
-    
-    # Montar arquivos estáticos - IMPORTANTE: o HTML espera /static/css e /static/js
-    app.mount("/static", StaticFiles(directory="static"), name="static_root")
+if estaticos.existe:
+    # IMPORTANTE: o HTML espera /static/css e /static/js
+    @app.api_route("/static/{caminho:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def serve_static(caminho: str, request: Request):
+        arquivo = estaticos.obter(f"static/{caminho}")
+        if not arquivo:
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        return estaticos.responder(arquivo, request)
     
     # Catch-all para React Router
-    @app.get("/{full_path:path}")
-    async def serve_react_app(full_path: str):
-        logger.info(f"Requisição para: {full_path}")
-        
+    @app.api_route("/{full_path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def serve_react_app(full_path: str, request: Request):
         # Se for uma rota da API, deixar passar
         if full_path.startswith("api/"):
-            return {"error": "Not found"}, 404
+            return JSONResponse({"error": "Not found"}, status_code=404)
+        
+        # Arquivos da raiz do build (favicon.ico, manifest.json...)
+        arquivo = estaticos.obter(full_path)
+        if arquivo:
+            return estaticos.responder(arquivo, request)
             
         # Servir index.html para todas as outras rotas
-        index_path = static_path / "index.html"
-        if index_path.exists():
-            logger.info(f"Servindo index.html de: {index_path}")
-            return FileResponse(index_path)
+        if estaticos.index:
+            return estaticos.responder(estaticos.index, request)
         
-        logger.error(f"index.html não encontrado em: {index_path}")
-        return {"error": "Frontend not found"}, 404
-else:
-    logger.error(f"Pasta static não encontrada em: {static_path.absolute()}")
-
+        logger.error(f"index.html não encontrado em: {static_path / 'index.html'}")
+        return JSONResponse({"error": "Frontend not found"}, status_code=404)
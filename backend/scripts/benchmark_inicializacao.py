@@ -0,0 +1,167 @@
+"""
+Benchmark da partida a frio: tempo até a primeira /entrada bem-sucedida
+
+Simula a máquina do fly.io acordando: sobe um Tiny falso local (cada
+chamada demora --atraso segundos), inicia o uvicorn do zero apontando
+para ele e mede, a partir do spawn do processo, quando respondem pela
+primeira vez /api/health, /api/ready (200) e POST /entrada (200). Repete
+--rodadas vezes e mostra a mediana, junto com o relatório de etapas que o
+próprio app expõe em /api/ready.
+
+Por padrão o Redis é inalcançável (pior caso para o índice); para medir
+com cache, aponte BENCHMARK_REDIS_URL para um Redis já populado.
+
+Uso (de dentro de backend/):
+    python scripts/benchmark_inicializacao.py
+    BENCHMARK_REDIS_URL=redis://localhost:6379 python scripts/benchmark_inicializacao.py --rodadas 10
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+PREFIXO = "/api/v2/estoque"
+PRODUTO = {"id": "123456", "codigo": "PH-510", "nome": "Produto de teste", "unidade": "UN"}
+RESPOSTAS = {
+    "produtos.pesquisa.php": {"status": "OK", "produtos": [{"produto": PRODUTO}]},
+    "produto.obter.php": {"status": "OK", "produto": PRODUTO},
+    "produto.obter.estoque.php": {"status": "OK", "produto": {
+        **PRODUTO, "saldo": 10, "depositos": [{"deposito": {"nome": "Geral", "saldo": 10}}]
+    }},
+    "produto.atualizar.estoque.php": {"status": "OK", "registros": [{"registro": {"status": "OK"}}]},
+}
+
+
+def tiny_falso(atraso: float) -> ThreadingHTTPServer:
+    """Servidor HTTP que imita os endpoints do Tiny usados por /entrada"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(atraso)
+            corpo = json.dumps({"retorno": RESPOSTAS.get(self.path.rsplit("/", 1)[-1], {"status": "Erro"})})
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo.encode())
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def aguardar(url: str, metodo: str, inicio: float, prazo: float,
+             corpo: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """Repete a requisição até o primeiro 200; devolve os ms desde o spawn"""
+    with httpx.Client(timeout=10) as cliente:
+        while time.perf_counter() < prazo:
+            try:
+                if cliente.request(metodo, url, json=corpo).status_code == 200:
+                    return (time.perf_counter() - inicio) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.01)
+    return None
+
+
+def rodada(args, url_tiny: str) -> Dict[str, Any]:
+    """Um processo novo do zero até a primeira entrada"""
+    porta = porta_livre()
+    base = f"http://127.0.0.1:{porta}"
+    env = {
+        **os.environ,
+        "TINY_API_BASE_URL": url_tiny,
+        "TINY_API_TOKEN": "benchmark",
+        "VALKEY_PUBLIC_URL": os.getenv("BENCHMARK_REDIS_URL", "redis://127.0.0.1:1"),
+    }
+    entrada = {"codigo_produto": args.produto, "quantidade": 1, "descricao": "benchmark de inicialização"}
+    alvos = {
+        "health": (f"{base}/api/health", "GET", None),
+        "ready": (f"{base}/api/ready", "GET", None),
+        "entrada": (f"{base}{PREFIXO}/entrada", "POST", entrada),
+    }
+    tempos: Dict[str, Optional[float]] = {}
+
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(porta), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        prazo = inicio + args.prazo
+
+        def medir(nome: str) -> None:
+            url, metodo, corpo = alvos[nome]
+            tempos[nome] = aguardar(url, metodo, inicio, prazo, corpo)
+
+        threads = [threading.Thread(target=medir, args=(nome,)) for nome in alvos]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        relatorio = httpx.get(f"{base}/api/ready", timeout=5).json().get("inicializacao", {})
+    finally:
+        processo.terminate()
+        processo.wait()
+    return {**tempos, "relatorio": relatorio}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=5)
+    parser.add_argument("--produto", default="PH-510")
+    parser.add_argument("--atraso", type=float, default=0.2, help="Latência simulada de cada chamada ao Tiny (s)")
+    parser.add_argument("--prazo", type=float, default=30.0, help="Desiste da rodada depois de tantos segundos")
+    args = parser.parse_args()
+
+    tiny = tiny_falso(args.atraso)
+    url_tiny = f"http://127.0.0.1:{tiny.server_address[1]}"
+    resultados: List[Dict[str, Any]] = []
+    try:
+        for i in range(args.rodadas):
+            r = rodada(args, url_tiny)
+            resultados.append(r)
+            print(f"rodada {i + 1}: " + "  ".join(
+                f"{nome} {r[nome]:.0f}ms" if r[nome] is not None else f"{nome} -"
+                for nome in ("health", "ready", "entrada")
+            ))
+    finally:
+        tiny.shutdown()
+
+    print(f"\nMediana de {args.rodadas} rodadas (ms desde o spawn do processo, Tiny com {args.atraso * 1000:.0f}ms):")
+    for nome in ("health", "ready", "entrada"):
+        valores = [r[nome] for r in resultados if r[nome] is not None]
+        if valores:
+            print(f"  {nome:<8} {statistics.median(valores):>8.0f}  (min {min(valores):.0f}, max {max(valores):.0f})")
+        else:
+            print(f"  {nome:<8}        -  (não respondeu 200 em {args.prazo:.0f}s)")
+
+    etapas = resultados[-1]["relatorio"].get("etapas", [])
+    if etapas:
+        print("\nEtapas da última rodada (relatório do app):")
+        for etapa in etapas:
+            print(f"  {etapa['etapa']:<28} {etapa['duracao_ms']:>7.1f}ms  (acumulado {etapa['ms']:.0f}ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark de tamanho e latência das respostas da API por codificação
+
+Mede /cache/produtos e /produtos/batch (e opcionalmente /produto/{codigo},
+que existe nos dois backends) sem compressão, com gzip e com brotli.
+
+Uso:
+    python scripts/benchmark_respostas.py --url http://localhost:8000 --repeticoes 50
+    python scripts/benchmark_respostas.py --url http://localhost:5000 --produto PH-510 --so-produto
+"""
+import argparse
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+CODIFICACOES = ["identity", "gzip", "br"]
+PREFIXO = "/api/v2/estoque"
+
+
+def medir(cliente: httpx.Client, metodo: str, caminho: str, codificacao: str,
+          repeticoes: int, corpo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Mede latência (ms) e bytes transferidos de uma requisição repetida"""
+    tempos: List[float] = []
+    tamanho = 0
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        with cliente.stream(metodo, caminho, json=corpo, headers={"Accept-Encoding": codificacao}) as resposta:
+            # Bytes como vieram pela rede (antes de descomprimir)
+            tamanho = sum(len(parte) for parte in resposta.iter_raw())
+            resposta.raise_for_status()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "mediana_ms": statistics.median(tempos),
+        "p95_ms": sorted(tempos)[max(0, int(len(tempos) * 0.95) - 1)],
+        "bytes": tamanho,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--repeticoes", type=int, default=30)
+    parser.add_argument("--prefixo", default="PH", help="Prefixo dos códigos em /cache/produtos")
+    parser.add_argument("--lote", type=int, default=100, help="Códigos enviados em /produtos/batch")
+    parser.add_argument("--produto", help="Código para medir também /produto/{codigo}")
+    parser.add_argument("--so-produto", action="store_true", help="Só /produto/{codigo} (backend Flask)")
+    args = parser.parse_args()
+
+    casos = []
+    with httpx.Client(base_url=args.url, timeout=60) as cliente:
+        if not args.so_produto:
+            listagem = cliente.get(f"{PREFIXO}/cache/produtos", params={"prefixo": args.prefixo}).json()
+            codigos = [p["codigo"] for p in listagem.get("produtos", [])][:args.lote]
+            print(f"{listagem.get('total', 0)} produtos em cache, lote com {len(codigos)} códigos")
+            casos.append(("GET", f"{PREFIXO}/cache/produtos?prefixo={args.prefixo}", None))
+            if codigos:
+                casos.append(("POST", f"{PREFIXO}/produtos/batch", {"codigos": codigos}))
+        if args.produto:
+            casos.append(("GET", f"{PREFIXO}/produto/{args.produto}", None))
+
+        print(f"{'endpoint':<45} {'codificação':<10} {'mediana':>9} {'p95':>9} {'bytes':>9}")
+        for metodo, caminho, corpo in casos:
+            # Aquece cache/conexão antes de medir
+            cliente.request(metodo, caminho, json=corpo)
+            for codificacao in CODIFICACOES:
+                r = medir(cliente, metodo, caminho, codificacao, args.repeticoes, corpo)
+                print(f"{metodo + ' ' + caminho[:40]:<45} {codificacao:<10} "
+                      f"{r['mediana_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms {r['bytes']:>9}")
+
+
+if __name__ == "__main__":
+    main()
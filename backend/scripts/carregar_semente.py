@@ -0,0 +1,120 @@
+"""
+Carrega a semente de produtos (seeds/produtos_ph.csv) no Redis
+
+Substitui o antigo populate_cache.py (lista de ids no código, limpar-cache
+e depois popular-cache-bulk pela API pública): compara a semente com o
+que está no Redis e grava só o que mudou, em pipelines, sem apagar nada
+antes (só a chave de um código cujo id mudou é recriada). Pode rodar quantas vezes quiser; a segunda não grava nada.
+
+Com --reconstruir a semente vira uma versão nova e completa do cache de
+produtos: gravada ao lado da atual, trocada atomicamente pelo ponteiro e
+a anterior apagada depois da carência (CACHE_NAMESPACE_CARENCIA). Produtos
+cacheados que não estão na semente ficam de fora da nova versão.
+
+Uso (de dentro de backend/; Redis de VALKEY_PUBLIC_URL ou --redis-url):
+    python scripts/carregar_semente.py --simular
+    python scripts/carregar_semente.py
+    python scripts/carregar_semente.py --semente seeds/outros.csv --lote 200
+    python scripts/carregar_semente.py --reconstruir
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from estoque_comum.cache import CacheRedisAsync  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.services.cache_produtos import cache_produtos  # noqa: E402
+from app.services.namespace_produtos import NamespaceProdutos  # noqa: E402
+from app.services.seed_produtos import (  # noqa: E402
+    SEMENTE_PADRAO, aplicar, comparar, ler_semente, registrar_versao, versao_aplicada
+)
+
+
+async def reconstruir(cache: CacheRedisAsync, namespace: NamespaceProdutos, produtos, versao: str, lote: int) -> None:
+    """Semente inteira numa versão nova, troca do ponteiro e coleta da anterior"""
+    token = await namespace.reservar_reconstrucao(cache_produtos.reconstrucao_ttl)
+    if not token:
+        raise SystemExit("Outra reconstrução do cache está em andamento")
+    try:
+        antiga = await namespace.atualizar()
+        nova = await namespace.nova_versao()
+        if nova is None:
+            raise SystemExit("Redis indisponível")
+        inicio = time.perf_counter()
+        lotes = aplicar(
+            cache.client, produtos, list(produtos),
+            lambda codigo: f"{namespace.prefixo(nova)}{codigo}", cache_produtos._ttl_com_jitter, lote
+        )
+        print(
+            f"Versão {nova}: {len(produtos)} produtos em {lotes} pipelines "
+            f"({(time.perf_counter() - inicio) * 1000:.0f}ms)"
+        )
+        if not await namespace.trocar(antiga, nova):
+            await namespace.coletar(nova)
+            raise SystemExit("O ponteiro mudou durante a carga; versão nova descartada")
+        registrar_versao(cache.client, versao, len(produtos))
+    finally:
+        await namespace.liberar_reconstrucao(token)
+
+    print(f"Ponteiro trocado {antiga} -> {nova}; apagando a versão {antiga} em {settings.CACHE_NAMESPACE_CARENCIA}s")
+    await asyncio.sleep(settings.CACHE_NAMESPACE_CARENCIA)
+    print(f"Versão {antiga}: {await namespace.coletar(antiga)} chaves removidas")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--semente", default=SEMENTE_PADRAO)
+    parser.add_argument("--redis-url", default=settings.REDIS_URL)
+    parser.add_argument("--lote", type=int, default=500, help="Produtos por pipeline")
+    parser.add_argument("--simular", action="store_true", help="Só mostra as diferenças, sem gravar")
+    parser.add_argument("--reconstruir", action="store_true", help="Troca o cache inteiro pela semente")
+    args = parser.parse_args()
+
+    produtos, versao = ler_semente(args.semente)
+    print(f"Semente {args.semente}: {len(produtos)} produtos (versão {versao})")
+
+    cache = CacheRedisAsync(args.redis_url, timeout=10, timeout_conexao=10)
+    if not cache.connected:
+        raise SystemExit("Redis indisponível")
+    client = cache.client
+    namespace = NamespaceProdutos(cache, cache_produtos.prefix)
+    print(f"Versão atual do cache de produtos: {await namespace.atualizar()}")
+
+    anterior = versao_aplicada(client)
+    if anterior:
+        print(f"Última versão aplicada neste Redis: {anterior}")
+
+    if args.reconstruir and not args.simular:
+        await reconstruir(cache, namespace, produtos, versao, args.lote)
+        return
+
+    def chave(codigo: str) -> str:
+        return f"{namespace.prefixo()}{codigo}"
+
+    inicio = time.perf_counter()
+    diferencas = comparar(client, produtos, chave, args.lote)
+    print(
+        f"Comparação em {(time.perf_counter() - inicio) * 1000:.0f}ms: {len(diferencas['novos'])} novos, "
+        f"{len(diferencas['alterados'])} alterados, {diferencas['iguais']} iguais"
+    )
+    for codigo in diferencas['alterados']:
+        print(f"  ~ {codigo} -> {produtos[codigo]['id']}")
+
+    codigos = diferencas['novos'] + diferencas['alterados']
+    if args.simular:
+        return
+    if codigos:
+        inicio = time.perf_counter()
+        lotes = aplicar(
+            client, produtos, codigos, chave, cache_produtos._ttl_com_jitter, args.lote, diferencas['trocados']
+        )
+        print(f"{len(codigos)} produtos gravados em {lotes} pipelines ({(time.perf_counter() - inicio) * 1000:.0f}ms)")
+    registrar_versao(client, versao, len(produtos))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 import os
+import time
 
 router = APIRouter()
 
@@ -10,46 +12,96 @@ router = APIRouter()
 BASE_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = BASE_DIR.parent
 
-# Função helper para servir React apps
-def serve_react_app(teste_name: str):
-    """Tenta servir um app React buildado ou retorna JSON de fallback"""
-    
-    # Caminhos possíveis para build do React
-    build_paths = [
+TESTES = [f"teste{i}" for i in range(1, 6)]
+
+ENDPOINTS_MAP = {
+    "teste1": ["/teste1/api/v2/health", "/teste1/api/v2/estoque/produto/{codigo}"],
+    "teste2": ["/teste2/api/health", "/teste2/debug/env"],
+    "teste3": ["/teste3/api/health", "/teste3/api/notas"],
+    "teste4": ["/teste4/api/health", "/teste4/api/produtos"],
+    "teste5": ["/teste5/api/health", "/teste5/api/dashboard"]
+}
+
+def _caminhos_index(teste_name: str) -> List[Path]:
+    """Onde o index.html de cada teste pode estar, em ordem de preferência"""
+    return [
+        # Build do React
         PROJECT_ROOT / teste_name / "build" / "index.html",
         PROJECT_ROOT / teste_name / "dist" / "index.html",
-        f"/app/{teste_name}/build/index.html",
-        f"/app/dashboard-v2/{teste_name}/build/index.html"
+        Path(f"/app/{teste_name}/build/index.html"),
+        Path(f"/app/dashboard-v2/{teste_name}/build/index.html"),
+        # Fallback para HTML simples
+        PROJECT_ROOT / teste_name / "index.html",
+        Path(f"/app/{teste_name}/index.html"),
+        Path(f"/app/dashboard-v2/{teste_name}/index.html"),
     ]
+
+class TabelaFrontends:
+    """
+    index.html de cada teste resolvido uma vez e mantido em memória.
+    Com recarregar=True o mtime é conferido no máximo a cada `intervalo`
+    segundos, para pegar um build novo sem reiniciar o servidor.
+    """
     
-    for build_path in build_paths:
-        if Path(build_path).exists():
-            return FileResponse(str(build_path), media_type="text/html")
+    def __init__(self, nomes: List[str], recarregar: bool = False, intervalo: float = 2.0):
+        self.nomes = nomes
+        self.recarregar = recarregar
+        self.intervalo = intervalo
+        self.entradas: Dict[str, Tuple[Path, float, bytes]] = {}
+        self._verificado_em = 0.0
     
-    # Fallback para HTML simples
-    html_paths = [
-        PROJECT_ROOT / teste_name / "index.html",
-        f"/app/{teste_name}/index.html",
-        f"/app/dashboard-v2/{teste_name}/index.html"
-    ]
+    def carregar(self) -> "TabelaFrontends":
+        entradas = {}
+        for nome in self.nomes:
+            for caminho in _caminhos_index(nome):
+                try:
+                    entradas[nome] = (caminho, caminho.stat().st_mtime, caminho.read_bytes())
+                    break
+                except OSError:
+                    continue
+        self.entradas = entradas
+        self._verificado_em = time.monotonic()
+        return self
     
-    for html_path in html_paths:
-        if Path(html_path).exists():
-            return FileResponse(str(html_path), media_type="text/html")
+    def _mudou(self) -> bool:
+        for nome in self.nomes:
+            atual = self.entradas.get(nome)
+            for caminho in _caminhos_index(nome):
+                try:
+                    mtime = caminho.stat().st_mtime
+                except OSError:
+                    continue
+                # Outro arquivo passou a valer ou o mesmo foi reescrito
+                if not atual or atual[0] != caminho or atual[1] != mtime:
+                    return True
+                break  # este não mudou: confere o próximo teste
+            else:
+                if atual:
+                    return True  # o index sumiu
+        return False
     
-    # Retornar info da API se não encontrar frontend
-    endpoints_map = {
-        "teste1": ["/teste1/api/v2/health", "/teste1/api/v2/estoque/produto/{codigo}"],
-        "teste2": ["/teste2/api/health", "/teste2/debug/env"],
-        "teste3": ["/teste3/api/health", "/teste3/api/notas"],
-        "teste4": ["/teste4/api/health", "/teste4/api/produtos"],
-        "teste5": ["/teste5/api/health", "/teste5/api/dashboard"]
-    }
+    def obter(self, nome: str) -> Optional[bytes]:
+        if self.recarregar and time.monotonic() - self._verificado_em >= self.intervalo:
+            self._verificado_em = time.monotonic()
+            if self._mudou():
+                self.carregar()
+        entrada = self.entradas.get(nome)
+        return entrada[2] if entrada else None
+
+frontends = TabelaFrontends(TESTES, recarregar=os.getenv("FRONTENDS_RECARREGAR") == "1").carregar()
+
+# Função helper para servir React apps
+def serve_react_app(teste_name: str):
+    """Serve o app React buildado (da memória) ou retorna JSON de fallback"""
+    conteudo = frontends.obter(teste_name)
+    if conteudo is not None:
+        return HTMLResponse(conteudo)
     
+    # Retornar info da API se não encontrar frontend
     return JSONResponse({
         "message": f"Dashboard {teste_name.upper()}",
         "status": "API funcionando - Frontend não encontrado",
-        "endpoints": endpoints_map.get(teste_name, []),
+        "endpoints": ENDPOINTS_MAP.get(teste_name, []),
         "hint": f"Execute 'cd {teste_name} && npm install && npm run build' para criar o frontend"
     })
 
@@ -25,6 +25,17 @@ def event_loop():
     yield loop
     loop.close()
 
+@pytest.fixture(autouse=True)
+def arquivo_indice_temporario(tmp_path, monkeypatch):
+    """Cópia local do índice de produtos num diretório temporário, nunca no repositório"""
+    from app.core.config import settings
+    from app.services.cache_produtos import cache_produtos
+
+    arquivo = str(tmp_path / "indice_produtos.msgpack")
+    monkeypatch.setattr(settings, "CACHE_INDICE_ARQUIVO", arquivo)
+    monkeypatch.setattr(cache_produtos, "arquivo_indice", arquivo)
+    return arquivo
+
 @pytest.fixture
 async def test_client() -> AsyncGenerator[AsyncClient, None]:
     """Cliente HTTP para testar a API"""
@@ -5,6 +5,7 @@ import pytest
 from httpx import AsyncClient
 from datetime import datetime
 import json
+from unittest.mock import AsyncMock, patch
 
 from app.models.estoque import EntradaEstoqueRequest
 
@@ -89,6 +90,29 @@ class TestAPIEstoque:
         assert data["unidade"] == "UN"
         assert data["saldo"] == 1000
     
+    @pytest.mark.integration
+    async def test_buscar_produto_if_none_match(self, test_client: AsyncClient, mock_tiny_client):
+        """Produto inalterado deve responder 304 sem corpo"""
+        response1 = await test_client.get("/api/v2/estoque/produto/PH-510")
+        etag = response1.headers["etag"]
+        assert etag.startswith('W/"')
+        assert "cache-control" in response1.headers
+        
+        response2 = await test_client.get(
+            "/api/v2/estoque/produto/PH-510", headers={"If-None-Match": etag}
+        )
+        assert response2.status_code == 304
+        assert response2.content == b""
+        
+        # Saldo mudou: ETag novo e corpo completo
+        mock_tiny_client.obter_estoque.return_value = {'produto': {'id': '123456', 'saldo': '990'}}
+        response3 = await test_client.get(
+            "/api/v2/estoque/produto/PH-510", headers={"If-None-Match": etag}
+        )
+        assert response3.status_code == 200
+        assert response3.headers["etag"] != etag
+        assert response3.json()["saldo"] == 990
+    
     @pytest.mark.integration
     async def test_buscar_produto_cache(self, test_client: AsyncClient, mock_tiny_client, redis_client):
         """Deve usar cache na segunda busca"""
@@ -97,8 +121,8 @@ class TestAPIEstoque:
         assert response1.status_code == 200
         
         # Verificar que foi salvo no cache
-        cached = await redis_client.get("estoque:produto:PH-CACHE")
-        assert cached is not None
+        cached = await redis_client.hgetall("produto:PH-CACHE")
+        assert cached
         assert cached["codigo"] == "PH-CACHE"
         
         # Segunda busca (deve vir do cache)
@@ -109,6 +133,62 @@ class TestAPIEstoque:
         # Mock não deve ter sido chamado novamente
         mock_tiny_client.buscar_produto_por_codigo.assert_not_called()
     
+    @pytest.mark.integration
+    async def test_saida_omite_resposta_do_tiny(self, test_client: AsyncClient, mock_tiny_client):
+        """tiny_response só deve vir com ?debug=true"""
+        payload = {"codigo_produto": "PH-510", "quantidade": 1}
+        
+        response = await test_client.post("/api/v2/estoque/saida", json=payload)
+        assert response.status_code == 200
+        assert "tiny_response" not in response.json()
+        
+        response = await test_client.post("/api/v2/estoque/saida?debug=true", json=payload)
+        assert response.status_code == 200
+        assert response.json()["tiny_response"] == {'retorno': {'status': 'OK'}}
+    
+    @pytest.mark.integration
+    async def test_buscar_produto_com_id_indexado(self, test_client: AsyncClient, mock_tiny_client):
+        """Com o id no índice não deve pesquisar pelo código"""
+        mock_tiny_client.obter_produto = AsyncMock(return_value={
+            'id': '123456', 'codigo': 'PH-510', 'nome': 'Produto de Teste', 'unidade': 'UN'
+        })
+        
+        with patch('app.api.estoque.cache_produtos') as mock_cache:
+            mock_cache.obter_registro = AsyncMock(return_value={'id': '123456', 'codigo': 'PH-510'})
+            mock_cache.versao_saldo = AsyncMock(return_value=0)
+            mock_cache.definir_saldo = AsyncMock(return_value=True)
+            mock_cache.cachear_produto = AsyncMock(return_value=True)
+            
+            response = await test_client.get("/api/v2/estoque/produto/PH-510")
+        
+        assert response.status_code == 200
+        assert response.json()["nome"] == "Produto de Teste"
+        assert response.json()["saldo"] == 1000
+        mock_tiny_client.buscar_produto_por_codigo.assert_not_called()
+        mock_tiny_client.obter_produto.assert_called_once_with('123456')
+        mock_tiny_client.obter_estoque.assert_called_once_with('123456', fresco=True)
+    
+    @pytest.mark.integration
+    async def test_buscar_produtos_lote(self, test_client: AsyncClient, mock_tiny_client):
+        """Deve devolver todos os códigos pedidos e listar os não encontrados"""
+        mock_tiny_client.buscar_produto_por_codigo.side_effect = [
+            None if codigo == "INEXISTENTE" else {
+                'id': '123456', 'codigo': codigo, 'nome': 'Produto de Teste', 'unidade': 'UN'
+            }
+            for codigo in ["PH-510", "PH-511", "INEXISTENTE"]
+        ]
+        
+        response = await test_client.post(
+            "/api/v2/estoque/produtos/batch",
+            json={"codigos": ["PH-510", "PH-511", "INEXISTENTE", "PH-510"]}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert list(data["produtos"]) == ["PH-510", "PH-511"]
+        assert data["produtos"]["PH-511"]["saldo"] == 1000
+        assert data["nao_encontrados"] == ["INEXISTENTE"]
+    
     @pytest.mark.integration
     async def test_validacao_quantidade_invalida(self, test_client: AsyncClient):
         """Deve validar quantidade inválida"""
@@ -162,11 +242,159 @@ class TestAPIEstoque:
         assert response.status_code == 200
         
         # Verificar cache do produto
-        cache_key = "estoque:produto:PH-REDIS"
-        cached_product = await redis_client.get(cache_key)
-        assert cached_product is not None
-        assert cached_product["saldo"] == 1000
+        cache_key = "produto:PH-REDIS"
+        cached_product = await redis_client.hgetall(cache_key)
+        assert cached_product
+        assert cached_product["saldo"] == "1000"
         
         # Verificar histórico
         historico_keys = await redis_client.client.keys("estoque:historico:PH-REDIS:*")
-        assert len(historico_keys) > 0
\ No newline at end of file
+        assert len(historico_keys) > 0
+
+class TestMovimentacao:
+    """Evento, histórico e marcador de movimentação pendente de /entrada"""
+
+    @pytest.fixture
+    def cache_mock(self):
+        with patch('app.api.estoque.cache_produtos') as mock:
+            mock.obter_id_por_codigo = AsyncMock(return_value='123456')
+            mock.nome_por_codigo.return_value = 'Produto de Teste'
+            mock.iniciar_movimentacao = AsyncMock()
+            mock.concluir_movimentacao = AsyncMock(return_value=1000)
+            yield mock
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('tipo,nome', [('E', 'entrada'), ('S', 'saida'), ('B', 'balanco')])
+    async def test_tipo_do_evento_e_do_historico(
+        self, test_client: AsyncClient, mock_tiny_client, cache_mock, tipo, nome
+    ):
+        """O evento e o histórico seguem o tipo pedido, não sempre 'entrada'"""
+        with patch('app.api.estoque.hub_eventos') as hub, \
+                patch('app.api.estoque.redis_client') as redis:
+            hub.publicar = AsyncMock()
+            redis.set = AsyncMock()
+            response = await test_client.post(
+                "/api/v2/estoque/entrada",
+                json={"codigo_produto": "PH-510", "quantidade": 5, "tipo": tipo}
+            )
+
+        assert response.status_code == 200
+        assert mock_tiny_client.alterar_estoque.call_args.kwargs['tipo'] == tipo
+        assert hub.publicar.call_args.args[0]['tipo'] == nome
+        assert redis.set.call_args.args[1]['tipo'] == nome
+
+    @pytest.mark.integration
+    async def test_deposito_nao_aplicado_vem_na_resposta(
+        self, test_client: AsyncClient, mock_tiny_client, cache_mock
+    ):
+        """Sem envio do depósito ao Tiny, a resposta diz onde a movimentação caiu"""
+        mock_tiny_client.alterar_estoque.return_value = {
+            'success': True, 'message': 'Estoque atualizado com sucesso', 'deposito': 'Geral'
+        }
+        with patch('app.api.estoque.hub_eventos') as hub, \
+                patch('app.api.estoque.redis_client') as redis:
+            hub.publicar = AsyncMock()
+            redis.set = AsyncMock()
+            response = await test_client.post(
+                "/api/v2/estoque/entrada",
+                json={"codigo_produto": "PH-510", "quantidade": 5, "deposito": "Fundição"}
+            )
+
+        data = response.json()
+        assert data["deposito_aplicado"] == "Geral"
+        assert "depósito Geral, não em Fundição" in data["message"]
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('rota', ['entrada', 'saida'])
+    async def test_excecao_encerra_movimentacao_pendente(
+        self, test_client: AsyncClient, mock_tiny_client, cache_mock, rota
+    ):
+        """Exceção depois de iniciar a movimentação não deixa a marca pendente até o TTL"""
+        mock_tiny_client.alterar_estoque.side_effect = RuntimeError('conexão perdida')
+
+        response = await test_client.post(
+            f"/api/v2/estoque/{rota}", json={"codigo_produto": "PH-510", "quantidade": 5}
+        )
+
+        assert response.status_code == 500
+        cache_mock.iniciar_movimentacao.assert_called_once_with('PH-510')
+        cache_mock.concluir_movimentacao.assert_called_once_with('PH-510', None, sucesso=False)
+
+    @pytest.mark.integration
+    async def test_timeout_do_tiny_encerra_sem_confirmar(
+        self, test_client: AsyncClient, mock_tiny_client, cache_mock
+    ):
+        """Timeout no Tiny encerra a movimentação como não confirmada (saldo descartado)"""
+        mock_tiny_client.alterar_estoque.return_value = {
+            'success': False, 'message': 'Erro na comunicação com Tiny: timed out', 'response': None
+        }
+
+        response = await test_client.post(
+            "/api/v2/estoque/entrada", json={"codigo_produto": "PH-510", "quantidade": 5}
+        )
+
+        assert response.status_code == 400
+        cache_mock.concluir_movimentacao.assert_called_once_with('PH-510', None, sucesso=False)
+
+    @pytest.mark.integration
+    async def test_sucesso_encerra_movimentacao_uma_vez(
+        self, test_client: AsyncClient, mock_tiny_client, cache_mock
+    ):
+        """Falha depois de aplicar o saldo não encerra a movimentação de novo"""
+        with patch('app.api.estoque.hub_eventos') as hub, \
+                patch('app.api.estoque.redis_client') as redis:
+            hub.publicar = AsyncMock()
+            redis.set = AsyncMock()
+            cache_mock.concluir_movimentacao.return_value = None  # sem saldo recente: relê o Tiny
+            cache_mock.versao_saldo = AsyncMock(side_effect=RuntimeError('Redis caiu'))
+            response = await test_client.post(
+                "/api/v2/estoque/entrada", json={"codigo_produto": "PH-510", "quantidade": 5}
+            )
+
+        assert response.status_code == 500
+        assert cache_mock.concluir_movimentacao.call_count == 1
+        assert cache_mock.concluir_movimentacao.call_args.kwargs.get('sucesso', True) is True
+
+class TestProntidao:
+    """Testes para /api/health e /api/ready durante a inicialização"""
+
+    @pytest.mark.integration
+    @pytest.mark.parametrize('concluida,status_code', [
+        (False, 503),
+        (True, 200),
+    ])
+    async def test_ready_segue_inicializacao(self, test_client: AsyncClient, concluida, status_code):
+        """Só fica pronto quando a conexão com o Redis e o aquecimento do índice terminam"""
+        with patch('main.redis_client') as mock_redis, patch('main.inicializacao.concluida', concluida):
+            mock_redis.estado = 'conectado'
+            response = await test_client.get("/api/ready")
+
+        assert response.status_code == status_code
+        data = response.json()
+        assert data["redis"] == 'conectado'
+        assert data["inicializacao"]["concluida"] is concluida
+
+    @pytest.mark.integration
+    async def test_aquecimento_sem_redis_conclui(self):
+        """Sem Redis a inicialização termina sem índice (e o app fica pronto)"""
+        import main
+
+        with patch('main.redis_client') as mock_redis, \
+                patch.object(main, 'inicializacao', main.inicializacao.__class__(inicio=0)) as inicializacao, \
+                patch('app.services.cache_produtos.redis_client', mock_redis):
+            mock_redis.aguardar_conexao = AsyncMock(return_value='indisponivel')
+            mock_redis.executar_script = AsyncMock(return_value=None)
+            await main.aquecer()
+
+        assert inicializacao.concluida is True
+        assert [e["etapa"] for e in inicializacao.relatorio()["etapas"]][-1] == "pronto"
+        mock_redis.varrer_campos.assert_not_called()
+
+    @pytest.mark.integration
+    async def test_health_nao_depende_do_redis(self, test_client: AsyncClient):
+        """Health responde mesmo com o Redis ainda conectando"""
+        with patch('main.redis_client') as mock_redis:
+            mock_redis.estado = 'conectando'
+            response = await test_client.get("/api/health")
+
+        assert response.status_code == 200
@@ -0,0 +1,43 @@
+"""
+Testes de integração para o WebSocket dos leitores de código de barras
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+
+
+class TestScannerWebSocket:
+    """Testes para o canal de movimentações via WebSocket"""
+
+    @pytest.mark.integration
+    def test_movimentacoes_confirmadas_em_ordem(self, mock_tiny_client):
+        """Cada mensagem recebe 'recebido' e depois o resultado, na ordem de envio"""
+        with TestClient(app).websocket_connect("/api/v2/estoque/scanner") as ws:
+            for i in range(3):
+                ws.send_json({"id": i, "codigo_produto": "PH-510", "quantidade": i + 1, "tipo": "S"})
+
+            mensagens = [ws.receive_json() for _ in range(6)]
+
+        recebidos = [m["id"] for m in mensagens if m["status"] == "recebido"]
+        resultados = [m for m in mensagens if m["status"] == "ok"]
+        assert recebidos == [0, 1, 2]
+        assert [m["id"] for m in resultados] == [0, 1, 2]
+        assert resultados[0]["resultado"]["produto_id"] == "123456"
+        quantidades = [c.kwargs["quantidade"] for c in mock_tiny_client.alterar_estoque.call_args_list]
+        assert quantidades == [1, 2, 3]
+
+    @pytest.mark.integration
+    def test_mensagem_invalida_nao_derruba_conexao(self, mock_tiny_client):
+        """Erros de validação voltam como 'invalido' e a conexão segue aberta"""
+        with TestClient(app).websocket_connect("/api/v2/estoque/scanner") as ws:
+            ws.send_json({"id": "a", "codigo_produto": "PH-510", "quantidade": 0})
+            invalido = ws.receive_json()
+            ws.send_json({"id": "b", "codigo_produto": "PH-510", "quantidade": 5, "tipo": "S"})
+            recebido = ws.receive_json()
+            resultado = ws.receive_json()
+
+        assert invalido["id"] == "a"
+        assert invalido["status"] == "invalido"
+        assert recebido == {"id": "b", "status": "recebido"}
+        assert resultado["status"] == "ok"
@@ -0,0 +1,296 @@
+"""
+Testes unitários para o cache de produtos (proteção contra stampede)
+"""
+import time
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.services.cache_produtos import (
+    CacheProdutos, LUA_CONCLUIR_MOVIMENTACAO, LUA_DEFINIR_SALDO, LUA_LIBERAR_TRAVA, deve_recalcular
+)
+
+
+class TestXFetch:
+    """Testes para a decisão de recálculo antecipado"""
+
+    @pytest.mark.unit
+    def test_longe_da_expiracao_nao_recalcula(self):
+        """Com delta pequeno e expiração distante não deve antecipar"""
+        agora = time.time()
+        assert not any(
+            deve_recalcular(delta=0.5, expira_em=agora + 3600, agora=agora)
+            for _ in range(1000)
+        )
+
+    @pytest.mark.unit
+    def test_expirado_sempre_recalcula(self):
+        """Entrada já expirada sempre deve ser recalculada"""
+        agora = time.time()
+        assert deve_recalcular(delta=0.0, expira_em=agora - 1, agora=agora)
+
+    @pytest.mark.unit
+    def test_ttl_com_jitter(self):
+        """TTL deve variar dentro da faixa configurada"""
+        cache = CacheProdutos()
+        cache.ttl = 1000
+        cache.ttl_jitter = 0.1
+        ttls = {cache._ttl_com_jitter() for _ in range(200)}
+
+        assert all(900 <= ttl <= 1000 for ttl in ttls)
+        assert len(ttls) > 1
+
+
+class TestCacheProdutos:
+    """Testes para leitura do cache com lock por chave"""
+
+    @pytest.fixture
+    def mock_redis(self):
+        with patch('app.services.cache_produtos.redis_client') as mock:
+            mock.connected = True
+            mock.get = AsyncMock(return_value=None)
+            mock.set = AsyncMock(return_value=True)
+            mock.hgetall = AsyncMock(return_value={})
+            mock.hmget = AsyncMock(side_effect=lambda key, campos: [None] * len(campos))
+            mock.hset = AsyncMock(return_value=True)
+            mock.delete = AsyncMock(return_value=True)
+            mock.exists = AsyncMock(return_value=False)
+            mock.executar_script = AsyncMock(return_value=None)
+            yield mock
+
+    @pytest.fixture
+    def mock_tiny(self):
+        with patch('app.services.cache_produtos.tiny_client') as mock:
+            mock.buscar_produto_por_codigo = AsyncMock(return_value={
+                'id': '123', 'codigo': 'PH-510', 'nome': 'Arruela Trava'
+            })
+            yield mock
+
+    @pytest.mark.unit
+    async def test_hit_perto_de_expirar_serve_valor_antigo(self, mock_redis, mock_tiny):
+        """Deve devolver o valor em cache e agendar o refresh em background"""
+        mock_redis.hgetall.return_value = {
+            'id': '123', 'codigo': 'PH-510', 'nome': 'Antigo',
+            'delta': '1.0', 'expira_em': str(time.time() - 1)
+        }
+        cache = CacheProdutos()
+
+        with patch.object(cache, '_agendar_atualizacao') as agendar:
+            produto = await cache.obter_produto('PH-510')
+
+        assert produto['nome'] == 'Antigo'
+        agendar.assert_called_once_with('PH-510')
+        mock_tiny.buscar_produto_por_codigo.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_miss_com_lock_ocupado_aguarda_cache(self, mock_redis, mock_tiny):
+        """Sem o lock, deve esperar o outro worker preencher o cache"""
+        registro = {
+            'id': '123', 'codigo': 'PH-510', 'nome': 'Novo',
+            'delta': '0.2', 'expira_em': str(time.time() + 3600)
+        }
+        mock_redis.set.return_value = False  # lock pertence a outro worker
+        mock_redis.hgetall.side_effect = [{}, registro]
+        mock_redis.exists.return_value = True
+        cache = CacheProdutos()
+
+        produto = await cache.obter_produto('PH-510')
+
+        assert produto['nome'] == 'Novo'
+        mock_tiny.buscar_produto_por_codigo.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_miss_com_lock_consulta_tiny(self, mock_redis, mock_tiny):
+        """Com o lock, deve buscar no Tiny e gravar o hash com TTL"""
+        cache = CacheProdutos()
+
+        produto = await cache.obter_produto('PH-510')
+
+        assert produto['id'] == '123'
+        mock_tiny.buscar_produto_por_codigo.assert_called_once_with('PH-510', fresco=False)
+        chave, campos = mock_redis.hset.call_args.args
+        assert chave == 'produto:PH-510'
+        assert campos['nome'] == 'Arruela Trava'
+        assert mock_redis.hset.call_args.kwargs['ex'] > 0
+
+        # O lock sai por comparar-e-apagar no Redis, com o token gravado ao pegá-lo
+        lock_key, token = mock_redis.set.call_args.args[:2]
+        mock_redis.executar_script.assert_called_once_with(LUA_LIBERAR_TRAVA, [lock_key], [token])
+        mock_redis.delete.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_concluir_movimentacao_aplica_delta_no_redis(self, mock_redis, mock_tiny):
+        """O delta deve ser aplicado pelo script Lua, sem ler e regravar o saldo"""
+        mock_redis.executar_script = AsyncMock(return_value=[1100, 4])
+        cache = CacheProdutos()
+
+        saldo = await cache.concluir_movimentacao('PH-510', 100)
+
+        assert saldo == 1100
+        fonte, keys, args = mock_redis.executar_script.call_args.args
+        assert fonte == LUA_CONCLUIR_MOVIMENTACAO
+        assert keys == ['produto:PH-510']
+        assert args[0] == 100
+        mock_redis.hset.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_concluir_movimentacao_sem_saldo(self, mock_redis, mock_tiny):
+        """Sem saldo recente o script devolve nil e o chamador relê o Tiny"""
+        mock_redis.executar_script = AsyncMock(return_value=None)
+        cache = CacheProdutos()
+
+        assert await cache.concluir_movimentacao('PH-510', -5) is None
+
+    @pytest.mark.unit
+    async def test_movimentacao_sem_confirmacao_descarta_saldo(self):
+        """Timeout ou erro do Tiny: o saldo cacheado vira desconhecido e a versão avança"""
+        fakeredis = pytest.importorskip('fakeredis')
+        pytest.importorskip('lupa')
+        from estoque_comum.cache import CacheRedisAsync
+        redis = CacheRedisAsync(None)
+        redis.client = fakeredis.FakeRedis(decode_responses=True)
+        redis.connected = True
+        redis.client.hset('produto:PH-510', mapping={
+            'id': '123', 'saldo': 1000, 'saldo_em': time.time(), 'versao': 3,
+            'deposito:Geral': 1000, 'depositos_em': time.time(), 'pendentes': 1
+        })
+
+        with patch('app.services.cache_produtos.redis_client', redis):
+            cache = CacheProdutos()
+            await cache.iniciar_movimentacao('PH-510')
+            saldo = await cache.concluir_movimentacao('PH-510', None, sucesso=False)
+
+        registro = redis.client.hgetall('produto:PH-510')
+        assert saldo is None
+        assert registro['versao'] == '4'
+        assert registro['pendentes'] == '1'  # só a movimentação encerrada sai
+        assert 'saldo' not in registro and 'saldo_em' not in registro
+        assert not any(campo.startswith('deposito') for campo in registro)
+        assert registro['id'] == '123'
+
+    @pytest.mark.unit
+    async def test_definir_saldo_envia_versao_lida(self, mock_redis, mock_tiny):
+        """A gravação do saldo do Tiny deve ser condicionada à versão"""
+        mock_redis.executar_script = AsyncMock(return_value=None)
+        cache = CacheProdutos()
+
+        gravou = await cache.definir_saldo('PH-510', 950, versao_lida=3)
+
+        assert gravou is False
+        fonte, keys, args = mock_redis.executar_script.call_args.args
+        assert fonte == LUA_DEFINIR_SALDO
+        assert args[0] == 950
+        assert args[2] == 3
+
+
+class TestIndiceEmMemoria:
+    """Testes para o índice código -> id carregado na subida"""
+
+    @pytest.fixture
+    def mock_redis(self):
+        with patch('app.services.cache_produtos.redis_client') as mock:
+            mock.aguardar_conexao = AsyncMock(return_value='conectado')
+            mock.executar_script = AsyncMock(return_value='0')  # ponteiro de versão
+            mock.varrer_campos = AsyncMock(return_value=[
+                ('produto:PH-510', ['123', 'PH-510', 'Arruela Trava']),
+                ('produto:PH-511', ['124', 'PH-511', None]),
+                ('produto:PH-512', [None, None, None]),
+            ])
+            mock.hmget = AsyncMock(side_effect=lambda key, campos: [None] * len(campos))
+            mock.hset = AsyncMock(return_value=True)
+            yield mock
+
+    @pytest.mark.unit
+    async def test_aquecer_indice_carrega_do_redis(self, mock_redis):
+        """Uma varredura carrega todos os produtos com id"""
+        cache = CacheProdutos()
+
+        carregados = await cache.aquecer_indice()
+
+        assert carregados == 2
+        assert cache.estado_indice == 'pronto'
+        assert cache.indice['PH-510'] == {'id': '123', 'nome': 'Arruela Trava'}
+        assert cache.indice['PH-511'] == {'id': '124'}
+        mock_redis.varrer_campos.assert_called_once_with('produto:*', ['id', 'codigo', 'nome'])
+
+    @pytest.mark.unit
+    async def test_aquecer_indice_sem_redis(self, mock_redis):
+        """Sem Redis não varre, mas o aquecimento termina"""
+        mock_redis.aguardar_conexao.return_value = 'indisponivel'
+        cache = CacheProdutos()
+
+        assert await cache.aquecer_indice() == 0
+        assert cache.estado_indice == 'pronto'
+        mock_redis.varrer_campos.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_obter_id_usa_indice(self, mock_redis):
+        """Com o índice aquecido o id sai da memória, sem ida ao Redis"""
+        cache = CacheProdutos()
+        await cache.aquecer_indice()
+
+        assert await cache.obter_id_por_codigo('PH-510') == '123'
+        mock_redis.hmget.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_cachear_e_limpar_atualizam_indice(self, mock_redis):
+        """Produtos cacheados entram no índice e limpar_cache os remove"""
+        mock_redis.scan_iter = lambda match: _async_iter([])
+        cache = CacheProdutos()
+
+        await cache.cachear_produto({'id': '200', 'codigo': 'PH-600', 'nome': 'Porca'})
+        await cache.salvar_produto_cache('XY-1', '300')
+        assert cache.indice['PH-600'] == {'id': '200', 'nome': 'Porca'}
+
+        await cache.limpar_cache('PH')
+        assert list(cache.indice) == ['XY-1']
+
+
+async def _async_iter(itens):
+    for item in itens:
+        yield item
+
+
+class TestCopiaLocalDoIndice:
+    """Testes para a cópia local do índice (abaixo do Redis)"""
+
+    @pytest.fixture
+    def mock_redis(self):
+        with patch('app.services.cache_produtos.redis_client') as mock:
+            mock.hmget = AsyncMock(side_effect=lambda key, campos: [None] * len(campos))
+            yield mock
+
+    @pytest.mark.unit
+    async def test_grava_e_carrega_na_subida(self, mock_redis, arquivo_indice_temporario):
+        """O que foi gravado por um processo é lido pelo próximo"""
+        anterior = CacheProdutos()
+        anterior._indexar('PH-510', '123', 'Arruela Trava')
+        assert await anterior.salvar_snapshot() is True
+        # Sem mudanças desde a última gravação, não regrava
+        assert await anterior.salvar_snapshot() is False
+
+        novo = CacheProdutos()
+        assert await novo.carregar_snapshot() == 1
+        assert novo.indice_local == {'PH-510': {'id': '123', 'nome': 'Arruela Trava'}}
+        assert novo.nome_por_codigo('PH-510') == 'Arruela Trava'
+
+    @pytest.mark.unit
+    async def test_redis_fora_usa_copia_local(self, mock_redis):
+        """Sem o código no Redis, a cópia local responde antes do Tiny"""
+        cache = CacheProdutos()
+        cache.indice_local = {'PH-510': {'id': '123'}}
+
+        with patch.object(cache, '_buscar_com_lock') as buscar:
+            assert await cache.obter_id_por_codigo('PH-510') == '123'
+
+        buscar.assert_not_called()
+        mock_redis.hmget.assert_called_once()
+
+    @pytest.mark.unit
+    async def test_arquivo_corrompido_e_ignorado(self, mock_redis, arquivo_indice_temporario):
+        """Um arquivo ilegível não impede a subida"""
+        with open(arquivo_indice_temporario, 'wb') as f:
+            f.write(b'\xc1lixo')
+        cache = CacheProdutos()
+
+        assert await cache.carregar_snapshot() == 0
+        assert cache.indice_local == {}
@@ -0,0 +1,61 @@
+"""
+Testes unitários para os arquivos estáticos servidos da memória
+"""
+import pytest
+from starlette.requests import Request
+
+from app.core.estaticos import ArquivosEstaticos, CACHE_IMUTAVEL, CACHE_REVALIDAR
+
+
+def _request(**headers) -> Request:
+    return Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(k.replace('_', '-').encode(), v.encode()) for k, v in headers.items()],
+    })
+
+
+@pytest.fixture
+def build(tmp_path):
+    """Build do React copiado inteiro para static/"""
+    (tmp_path / "static" / "js").mkdir(parents=True)
+    (tmp_path / "index.html").write_text("<html>" + "x" * 2000 + "</html>")
+    (tmp_path / "static" / "js" / "main.3f2a1b4c.js").write_text("console.log(1);" * 200)
+    (tmp_path / "favicon.ico").write_bytes(b"\x00" * 10)
+    return ArquivosEstaticos(tmp_path).carregar()
+
+
+class TestArquivosEstaticos:
+    """Testes para a tabela em memória do build"""
+
+    @pytest.mark.unit
+    def test_caminhos_do_build(self, build):
+        """/static/js/... do HTML deve achar static/js/... e a raiz deve ter index e favicon"""
+        assert build.obter("static/js/main.3f2a1b4c.js")
+        assert build.obter("favicon.ico")
+        assert build.index is build.obter("index.html")
+        assert build.obter("static/nada.js") is None
+
+    @pytest.mark.unit
+    def test_asset_com_hash_imutavel_e_comprimido(self, build):
+        """Asset com hash no nome vai com cache imutável e na variante aceita"""
+        arquivo = build.obter("static/js/main.3f2a1b4c.js")
+
+        resposta = build.responder(arquivo, _request(accept_encoding="gzip"))
+
+        assert resposta.headers["cache-control"] == CACHE_IMUTAVEL
+        assert resposta.headers["content-encoding"] == "gzip"
+        assert resposta.body == arquivo.variantes["gzip"]
+
+    @pytest.mark.unit
+    def test_index_revalida_com_etag(self, build):
+        """index.html deve ser revalidado e responder 304 com o mesmo ETag"""
+        primeira = build.responder(build.index, _request())
+        etag = primeira.headers["etag"]
+
+        segunda = build.responder(build.index, _request(if_none_match=etag))
+
+        assert primeira.headers["cache-control"] == CACHE_REVALIDAR
+        assert "content-encoding" not in primeira.headers
+        assert segunda.status_code == 304
@@ -0,0 +1,357 @@
+"""
+Testes unitários para o núcleo compartilhado (estoque_comum) com os dois backends
+"""
+import asyncio
+import threading
+import pytest
+import redis
+from unittest.mock import AsyncMock, MagicMock
+
+from estoque_comum import leitura
+from estoque_comum.cache import CacheRedis, CacheRedisAsync
+from estoque_comum.tiny import TinyAsync, TinySync
+
+
+def resposta(dados):
+    """Resposta do requests com o JSON informado"""
+    mock_response = MagicMock()
+    mock_response.json.return_value = dados
+    mock_response.raise_for_status = MagicMock()
+    return mock_response
+
+
+class CacheEmMemoria:
+    """get/set/delete de CacheRedis sobre um dict (o TTL é guardado, não aplicado)"""
+
+    def __init__(self):
+        self.dados = {}
+        self.ttls = {}
+
+    def get(self, key, codec=None):
+        return self.dados.get(key)
+
+    def set(self, key, value, ex=None, nx=False, codec=None):
+        self.dados[key] = value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, key):
+        return self.dados.pop(key, None) is not None
+
+
+class CacheEmMemoriaAsync(CacheEmMemoria):
+    async def get(self, key, codec=None):
+        return CacheEmMemoria.get(self, key, codec)
+
+    async def set(self, key, value, ex=None, nx=False, codec=None):
+        return CacheEmMemoria.set(self, key, value, ex, nx, codec)
+
+    async def delete(self, key):
+        return CacheEmMemoria.delete(self, key)
+
+
+class TestTinySync:
+    """Fachada síncrona usada pelo Flask: mesmas operações do cliente assíncrono"""
+
+    @pytest.mark.unit
+    def test_buscar_produto(self):
+        """Deve executar a operação com o transporte síncrono"""
+        session = MagicMock()
+        session.post.return_value = resposta({
+            'retorno': {'status': 'OK', 'produtos': [{'produto': {'id': '123', 'codigo': 'PH-510'}}]}
+        })
+        cliente = TinySync('token', session=session, timeout=5)
+
+        produto = cliente.buscar_produto_por_codigo('PH-510')
+
+        assert produto == {'id': '123', 'codigo': 'PH-510'}
+        url = session.post.call_args[0][0]
+        assert url.endswith('/produtos.pesquisa.php')
+        assert 'token=token' in session.post.call_args.kwargs['data']
+        assert session.post.call_args.kwargs['timeout'] == 5
+
+    @pytest.mark.unit
+    def test_erro_de_transporte_vira_none(self):
+        """Exceções do transporte chegam à operação, que trata como nas versões anteriores"""
+        session = MagicMock()
+        session.post.side_effect = ConnectionError('Tiny fora do ar')
+        cliente = TinySync('token', session=session)
+
+        assert cliente.obter_produto('123') is None
+
+    @pytest.mark.unit
+    def test_alterar_estoque_erro_no_registro(self):
+        """Erro no registro deve virar mensagem legível"""
+        session = MagicMock()
+        session.post.return_value = resposta({'retorno': {
+            'status': 'Erro',
+            'registros': [{'registro': {'status': 'Erro', 'erros': [{'erro': 'Quantidade inválida'}]}}]
+        }})
+        cliente = TinySync('token', session=session)
+
+        resultado = cliente.alterar_estoque('123', 5, tipo='S')
+
+        assert resultado['success'] is False
+        assert 'Quantidade inválida' in resultado['message']
+
+
+class TestCacheRedis:
+    """Serviço de cache sem Redis disponível"""
+
+    @pytest.mark.unit
+    def test_sem_url_nao_conecta(self):
+        """Sem URL todas as operações devolvem o valor vazio"""
+        cache = CacheRedis(None)
+
+        assert cache.connected is False
+        assert cache.get('x') is None
+        assert cache.set('x', {'a': 1}) is False
+        assert cache.hgetall_lote(['a', 'b']) == [{}, {}]
+        assert list(cache.scan_iter('produto:*')) == []
+
+    @pytest.mark.unit
+    def test_reconecta_depois_de_queda(self):
+        """Queda de conexão desliga o cache só até a próxima tentativa"""
+        cache = CacheRedis(None, reconectar_apos=0)
+        cache.client = MagicMock()
+        cache.connected = True
+        cache.client.get.side_effect = [redis.ConnectionError('queda'), '{"a": 1}']
+
+        assert cache.get('x') is None
+        assert cache.connected is False
+
+        # Próxima operação testa a conexão com PING e volta a usar o Redis
+        assert cache.get('x') == {'a': 1}
+        assert cache.connected is True
+        cache.client.ping.assert_called_once()
+
+    @pytest.mark.unit
+    def test_sem_nova_tentativa_antes_do_intervalo(self):
+        """Enquanto o intervalo não passa, nenhuma operação toca o Redis"""
+        cache = CacheRedis(None, reconectar_apos=60)
+        cache.client = MagicMock()
+        cache.connected = True
+        cache.client.get.side_effect = redis.TimeoutError('lento')
+
+        assert cache.get('x') is None
+        assert cache.get('x') is None
+
+        assert cache.client.get.call_count == 1
+        cache.client.ping.assert_not_called()
+
+    @pytest.mark.unit
+    def test_conexao_em_segundo_plano(self):
+        """Enquanto o PING inicial não volta, as operações não esperam por ele"""
+        liberar = threading.Event()
+        cache = CacheRedis(None)
+        cache.client = MagicMock()
+        cache.client.ping.side_effect = lambda: liberar.wait(5)
+
+        cache.conectar_em_segundo_plano()
+
+        assert cache.estado == 'conectando'
+        assert cache.get('x') is None
+        cache.client.get.assert_not_called()
+
+        liberar.set()
+        cache._conexao_inicial.join(5)
+        assert cache.estado == 'conectado'
+
+    @pytest.mark.unit
+    async def test_reconexao_assincrona_fora_do_loop(self):
+        """Na fachada assíncrona o PING de reconexão não segura o event loop"""
+        liberar = threading.Event()
+        cache = CacheRedisAsync(None, reconectar_apos=0)
+        cache.client = MagicMock()
+        cache.client.ping.side_effect = lambda: liberar.wait(5)
+        cache.client.get.return_value = '{"a": 1}'
+
+        # Redis fora: devolve na hora, com o PING ainda pendurado
+        assert await asyncio.wait_for(cache.get('x'), timeout=1) is None
+        cache.client.get.assert_not_called()
+
+        liberar.set()
+        for _ in range(100):
+            if cache.connected:
+                break
+            await asyncio.sleep(0.01)
+        assert await cache.get('x') == {'a': 1}
+        cache.client.ping.assert_called_once()
+
+    @pytest.mark.unit
+    def test_varrer_campos_em_pipeline(self):
+        """Um HMGET em pipeline por página do SCAN; chaves que não são hash ficam de fora"""
+        cache = CacheRedis(None)
+        cache.client = MagicMock()
+        cache.connected = True
+        cache.client.scan.side_effect = [(7, ['produto:A', 'produto:lock:A']), (0, ['produto:B'])]
+        pipe = cache.client.pipeline.return_value
+        pipe.execute.side_effect = [
+            [['1', 'A'], redis.ResponseError('WRONGTYPE')],
+            [['2', 'B']],
+        ]
+
+        resultado = cache.varrer_campos('produto:*', ['id', 'codigo'])
+
+        assert resultado == [('produto:A', ['1', 'A']), ('produto:B', ['2', 'B'])]
+        assert pipe.hmget.call_count == 3
+        assert pipe.execute.call_count == 2
+
+    @pytest.mark.unit
+    def test_remover_padrao_com_unlink_por_pagina(self):
+        """Um UNLINK por página do SCAN, só com as chaves aceitas pelo filtro"""
+        cache = CacheRedis(None)
+        cache.client = MagicMock()
+        cache.connected = True
+        cache.client.scan.side_effect = [(3, ['produto:A', 'produto:lock:A']), (0, ['produto:B'])]
+        cache.client.unlink.side_effect = lambda *keys: len(keys)
+
+        removidas = cache.remover_padrao('produto:*', filtro=lambda k: ':lock:' not in k)
+
+        assert removidas == 2
+        assert cache.client.unlink.call_args_list[0].args == ('produto:A',)
+        cache.client.delete.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_fachada_assincrona(self):
+        """A fachada assíncrona expõe as mesmas operações como corrotinas"""
+        cache = CacheRedisAsync(None)
+
+        assert await cache.get('x') is None
+        assert await cache.hmget('x', ['id', 'nome']) == [None, None]
+        assert await cache.publish('canal', {'a': 1}) == 0
+        assert [k async for k in cache.scan_iter('produto:*')] == []
+        assert await cache.varrer_campos('produto:*', ['id']) == []
+        assert await cache.aguardar_conexao() == 'indisponivel'
+
+
+class TestCacheDeLeitura:
+    """Leituras do Tiny pelo cache read-through (@em_cache)"""
+
+    PRODUTO = {'retorno': {'status': 'OK', 'produtos': [{'produto': {'id': '123', 'codigo': 'PH-510'}}]}}
+    ESTOQUE = {'retorno': {'status': 'OK', 'produto': {'id': '123', 'saldo': 7}}}
+
+    @pytest.mark.unit
+    def test_segunda_leitura_vem_do_cache(self):
+        """A segunda busca não vai ao Tiny e a métrica separa miss de hit"""
+        session = MagicMock()
+        session.post.return_value = resposta(self.PRODUTO)
+        cache = CacheEmMemoria()
+        cliente = TinySync('token', session=session, cache=cache, ttl_cadastro=600)
+        antes = leitura.resumo('buscar_produto_por_codigo').get('buscar_produto_por_codigo', {})
+
+        assert cliente.buscar_produto_por_codigo('PH-510') == {'id': '123', 'codigo': 'PH-510'}
+        assert cliente.buscar_produto_por_codigo('PH-510') == {'id': '123', 'codigo': 'PH-510'}
+
+        session.post.assert_called_once()
+        key = next(iter(cache.dados))
+        assert key.startswith('tiny:buscar_produto_por_codigo:') and key.endswith(':PH-510')
+        assert cache.ttls[key] == 600
+        depois = leitura.resumo('buscar_produto_por_codigo')['buscar_produto_por_codigo']
+        assert depois['hit'] - antes.get('hit', 0) == 1
+        assert depois['miss'] - antes.get('miss', 0) == 1
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("falha", [
+        ConnectionError('Tiny fora do ar'),
+        {'retorno': {'status': 'Erro', 'codigo_erro': '6', 'erros': [{'erro': 'API Bloqueada'}]}},
+    ])
+    def test_falha_nao_vira_cache_negativo(self, falha):
+        """Erro de rede ou limite do Tiny devolve None sem lembrar o produto como inexistente"""
+        session = MagicMock()
+        if isinstance(falha, Exception):
+            session.post.side_effect = falha
+        else:
+            session.post.return_value = resposta(falha)
+        cache = CacheEmMemoria()
+        cliente = TinySync('token', session=session, cache=cache)
+
+        assert cliente.obter_produto('123') is None
+        assert cache.dados == {}
+
+    @pytest.mark.unit
+    def test_produto_inexistente_fica_no_ttl_negativo(self):
+        """Consulta sem registros é resposta: fica em cache pelo TTL negativo"""
+        session = MagicMock()
+        session.post.return_value = resposta({'retorno': {'status': 'Erro', 'codigo_erro': '20'}})
+        cache = CacheEmMemoria()
+        cliente = TinySync('token', session=session, cache=cache, ttl_negativo=45)
+
+        assert cliente.buscar_produto_por_codigo('NADA') is None
+        assert cliente.buscar_produto_por_codigo('NADA') is None
+
+        session.post.assert_called_once()
+        assert list(cache.dados.values()) == [[None]]
+        assert list(cache.ttls.values()) == [45]
+
+    @pytest.mark.unit
+    def test_alterar_estoque_invalida_o_estoque(self):
+        """Depois da movimentação o estoque volta a ser lido do Tiny"""
+        session = MagicMock()
+        session.post.side_effect = [
+            resposta(self.ESTOQUE),
+            resposta({'retorno': {'status': 'OK', 'registros': [{'registro': {'status': 'OK'}}]}}),
+            resposta(self.ESTOQUE),
+        ]
+        cliente = TinySync('token', session=session, cache=CacheEmMemoria())
+
+        cliente.obter_estoque('123')
+        cliente.alterar_estoque('123', 1)
+        cliente.obter_estoque('123')
+
+        assert session.post.call_count == 3
+
+    @pytest.mark.unit
+    async def test_leituras_simultaneas_fazem_uma_chamada(self):
+        """Single-flight: leituras concorrentes da mesma chave esperam a primeira"""
+        liberar = asyncio.Event()
+
+        async def post(*args, **kwargs):
+            await liberar.wait()
+            return resposta(self.ESTOQUE)
+
+        cliente = TinyAsync('token', client=MagicMock(post=AsyncMock(side_effect=post)), cache=CacheEmMemoriaAsync())
+        leituras = [asyncio.ensure_future(cliente.obter_estoque('123')) for _ in range(5)]
+        await asyncio.sleep(0)
+        liberar.set()
+
+        resultados = await asyncio.gather(*leituras)
+
+        assert all(r == self.ESTOQUE['retorno'] for r in resultados)
+        cliente.client.post.assert_called_once()
+
+    @pytest.mark.unit
+    async def test_lider_cancelado_nao_cancela_quem_espera(self):
+        """Cancelar a leitura que os outros esperavam faz um deles assumir, não propaga o cancelamento"""
+        chamadas = []
+
+        async def post(*args, **kwargs):
+            chamadas.append(1)
+            if len(chamadas) == 1:
+                await asyncio.Event().wait()  # a primeira fica presa até ser cancelada
+            return resposta(self.ESTOQUE)
+
+        cliente = TinyAsync('token', client=MagicMock(post=AsyncMock(side_effect=post)), cache=CacheEmMemoriaAsync())
+        lider = asyncio.ensure_future(cliente.obter_estoque('123'))
+        await asyncio.sleep(0.01)
+        espera = asyncio.ensure_future(cliente.obter_estoque('123'))
+        await asyncio.sleep(0.01)
+
+        lider.cancel()
+
+        assert await asyncio.wait_for(espera, timeout=1) == self.ESTOQUE['retorno']
+        assert lider.cancelled()
+        assert len(chamadas) == 2
+
+    @pytest.mark.unit
+    async def test_fresco_ignora_o_cache_e_regrava(self):
+        """fresco=True sempre consulta o Tiny e atualiza o valor em cache"""
+        cliente = TinyAsync(
+            'token', client=MagicMock(post=AsyncMock(return_value=resposta(self.ESTOQUE))), cache=CacheEmMemoriaAsync()
+        )
+
+        await cliente.obter_estoque('123')
+        await cliente.obter_estoque('123', fresco=True)
+        await cliente.obter_estoque('123')
+
+        assert cliente.client.post.call_count == 2
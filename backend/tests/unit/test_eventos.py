@@ -0,0 +1,145 @@
+"""
+Testes unitários para os eventos de movimentação (stream SSE)
+"""
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.eventos import Assinante, HubEventos, formatar_sse
+
+
+class TestAssinante:
+    """Testes para o filtro e a fila de cada cliente"""
+
+    @pytest.mark.unit
+    def test_filtro_por_codigo_ou_id(self):
+        """Com filtro só aceita os códigos ou ids pedidos"""
+        assinante = Assinante({'PH-510', '999'}, tamanho_fila=10)
+
+        assert assinante.aceita({'codigo': 'PH-510'})
+        assert assinante.aceita({'codigo': None, 'produto_id': 999})
+        assert not assinante.aceita({'codigo': 'PH-511', 'produto_id': '123'})
+        assert Assinante(None, tamanho_fila=10).aceita({'codigo': 'PH-511'})
+
+    @pytest.mark.unit
+    def test_fila_cheia_descarta_mais_antigo(self):
+        """Cliente lento perde os eventos mais antigos, não bloqueia os outros"""
+        assinante = Assinante(None, tamanho_fila=2)
+        for i in range(5):
+            assinante.entregar({'seq': i})
+
+        assert assinante.perdidos == 3
+        assert [assinante.fila.get_nowait()['seq'] for _ in range(2)] == [3, 4]
+
+
+class TestHubEventos:
+    """Testes para publicação e distribuição dos eventos"""
+
+    @staticmethod
+    async def _encerrar(hub, *assinantes):
+        escuta = hub._escuta
+        for assinante in assinantes:
+            hub.cancelar(assinante)
+        if escuta is not None:
+            await asyncio.gather(escuta, return_exceptions=True)
+
+    @pytest.mark.unit
+    async def test_sem_redis_distribui_localmente(self):
+        """Sem Redis o evento vai direto para os clientes do processo"""
+        with patch('app.services.eventos.redis_client') as mock_redis:
+            mock_redis.connected = False
+            hub = HubEventos()
+            todos = hub.assinar()
+            filtrado = hub.assinar(['PH-511'])
+
+            await hub.publicar({'tipo': 'entrada', 'codigo': 'PH-510'})
+            await self._encerrar(hub, todos, filtrado)
+
+        assert todos.fila.get_nowait()['codigo'] == 'PH-510'
+        assert filtrado.fila.empty()
+
+    @pytest.mark.unit
+    async def test_com_redis_publica_no_canal(self):
+        """Com Redis o evento é publicado no canal para todos os processos"""
+        with patch('app.services.eventos.redis_client') as mock_redis:
+            mock_redis.connected = True
+            mock_redis.publish = AsyncMock(return_value=1)
+            hub = HubEventos()
+
+            await hub.publicar({'tipo': 'saida', 'codigo': 'PH-510'})
+
+        canal, mensagem = mock_redis.publish.call_args.args
+        assert canal == hub.canal
+        assert json.loads(mensagem)['tipo'] == 'saida'
+
+    @pytest.mark.unit
+    async def test_assina_sem_redis_e_recebe_quando_conecta(self):
+        """Quem assinou com o Redis fora recebe os eventos publicados depois que ele volta"""
+        canal_redis: asyncio.Queue = asyncio.Queue()
+        redis_no_ar = asyncio.Event()
+
+        class PubSub:
+            async def subscribe(self, canal):
+                if not redis_no_ar.is_set():
+                    raise ConnectionError("Redis fora")
+
+            async def listen(self):
+                while True:
+                    yield {'type': 'message', 'data': await canal_redis.get()}
+
+            async def aclose(self):
+                pass
+
+        def conectar(url, **kwargs):
+            return MagicMock(pubsub=PubSub, aclose=AsyncMock())
+
+        async def publicar_no_canal(canal, mensagem):
+            await canal_redis.put(mensagem)
+            return 1
+
+        with patch('app.services.eventos.redis_client') as mock_redis, \
+                patch('app.services.eventos.aioredis.from_url', side_effect=conectar):
+            mock_redis.connected = False
+            mock_redis.publish = AsyncMock(side_effect=publicar_no_canal)
+            hub = HubEventos()
+            hub.espera_reconexao = 0.01
+            assinante = hub.assinar()
+            await asyncio.sleep(0.05)  # escuta tentando reconectar
+
+            redis_no_ar.set()
+            mock_redis.connected = True
+            await asyncio.sleep(0.05)
+            await hub.publicar({'tipo': 'entrada', 'codigo': 'PH-510'})
+            evento = await asyncio.wait_for(assinante.fila.get(), timeout=1)
+            await self._encerrar(hub, assinante)
+
+        assert evento['codigo'] == 'PH-510'
+
+    @pytest.mark.unit
+    async def test_stream_so_assina_quando_comeca(self):
+        """Cliente que desconecta antes da primeira iteração não deixa assinante no hub"""
+        from app.api.estoque import stream_movimentacoes
+
+        with patch('app.services.eventos.redis_client') as mock_redis:
+            mock_redis.connected = False
+            hub = HubEventos()
+            with patch('app.api.estoque.hub_eventos', hub):
+                resposta = await stream_movimentacoes(codigos='PH-510')
+                assert not hub._assinantes
+
+                corpo = resposta.body_iterator
+                assert await corpo.__anext__() == "retry: 3000\n\n"
+                assert len(hub._assinantes) == 1
+                escuta = hub._escuta
+                await corpo.aclose()
+                await asyncio.gather(escuta, return_exceptions=True)
+
+        assert not hub._assinantes
+
+    @pytest.mark.unit
+    def test_formatar_sse(self):
+        """Evento deve seguir o formato text/event-stream"""
+        texto = formatar_sse('movimentacao', {'codigo': 'PH-510'})
+
+        assert texto == 'event: movimentacao\ndata: {"codigo": "PH-510"}\n\n'
@@ -0,0 +1,40 @@
+"""
+Testes unitários para ETags e respostas condicionais
+"""
+import pytest
+
+from app.core.http_cache import etag_fraco, etag_corresponde, nao_modificado
+
+
+class TestETag:
+    """Testes para geração e comparação de ETags fracos"""
+
+    @pytest.mark.unit
+    def test_etag_fraco_estavel(self):
+        """Mesmas partes geram o mesmo ETag; partes diferentes, outro"""
+        assert etag_fraco('PH-510', 3, '1700000000.0') == etag_fraco('PH-510', 3, '1700000000.0')
+        assert etag_fraco('PH-510', 3, '1700000000.0') != etag_fraco('PH-510', 4, '1700000000.0')
+        assert etag_fraco('PH-510', 3).startswith('W/"')
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize("if_none_match,esperado", [
+        (None, False),
+        ('W/"abc"', True),
+        ('"abc"', True),  # comparação fraca ignora o W/
+        ('"x", W/"abc"', True),
+        ('*', True),
+        ('W/"outro"', False),
+    ])
+    def test_etag_corresponde(self, if_none_match, esperado):
+        """If-None-Match deve aceitar listas, '*' e comparação fraca"""
+        assert etag_corresponde(if_none_match, 'W/"abc"') is esperado
+
+    @pytest.mark.unit
+    def test_nao_modificado_sem_corpo(self):
+        """304 deve manter ETag e Cache-Control e não ter corpo"""
+        resposta = nao_modificado('W/"abc"')
+
+        assert resposta.status_code == 304
+        assert resposta.body == b''
+        assert resposta.headers['etag'] == 'W/"abc"'
+        assert 'must-revalidate' in resposta.headers['cache-control']
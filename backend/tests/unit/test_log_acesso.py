@@ -0,0 +1,57 @@
+"""
+Testes unitários para o log de acesso amostrado
+"""
+import json
+import logging
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.log_acesso import LogAcessoMiddleware
+
+
+def _app(**opcoes) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(LogAcessoMiddleware, **opcoes)
+
+    @app.get("/ok")
+    async def ok():
+        return {"ok": True}
+
+    @app.get("/erro")
+    async def erro():
+        raise RuntimeError("falhou")
+
+    return TestClient(app, raise_server_exceptions=False)
+
+
+class TestLogAcesso:
+    """Testes para a amostragem do log de acesso"""
+
+    @pytest.mark.unit
+    def test_fora_da_amostra_nao_loga(self, caplog):
+        """Requisição rápida e sem erro fora da amostra não gera linha"""
+        with caplog.at_level(logging.INFO, logger="acesso"):
+            _app(amostra=0.0).get("/ok")
+
+        assert not [r for r in caplog.records if r.name == "acesso"]
+
+    @pytest.mark.unit
+    def test_erro_sempre_loga(self, caplog):
+        """Erro 5xx é sempre registrado, em JSON"""
+        with caplog.at_level(logging.INFO, logger="acesso"):
+            _app(amostra=0.0).get("/erro")
+
+        linhas = [json.loads(r.getMessage()) for r in caplog.records if r.name == "acesso"]
+        assert linhas[0]["caminho"] == "/erro"
+        assert linhas[0]["status"] == 500
+
+    @pytest.mark.unit
+    def test_amostra_total_loga_tudo(self, caplog):
+        """Com amostra 1.0 toda requisição é registrada"""
+        with caplog.at_level(logging.INFO, logger="acesso"):
+            cliente = _app(amostra=1.0)
+            cliente.get("/ok")
+            cliente.get("/ok")
+
+        assert len([r for r in caplog.records if r.name == "acesso"]) == 2
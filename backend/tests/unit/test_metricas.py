@@ -0,0 +1,177 @@
+"""
+Testes unitários para as métricas (registro, formato do Prometheus e /metrics)
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import MagicMock
+
+from estoque_comum.metricas import (
+    DIRETORIO_ENV, Registro, agregar, coletar, consolidar_processo, exportar, gravar, registro
+)
+from estoque_comum.cache import CacheRedis, LATENCIA_REDIS
+from estoque_comum.tiny import ERROS_TINY, TinySync
+from app.core.metricas import MetricasMiddleware, REQUISICOES
+
+
+class TestRegistro:
+    """Contadores, histogramas e a exportação em texto"""
+
+    @pytest.mark.unit
+    def test_exporta_contador_e_histograma(self):
+        """Baldes cumulativos com +Inf, soma e contagem por combinação de rótulos"""
+        registro = Registro()
+        erros = registro.contador("erros_total", "Erros", ("endpoint",))
+        latencia = registro.histograma("latencia_segundos", "Latência", ("rota",), limites=(0.1, 1.0))
+        erros.inc(endpoint='produto.obter.php')
+        erros.inc(2, endpoint='produto.obter.php')
+        latencia.observar(0.05, rota='/a')
+        latencia.observar(0.1, rota='/a')
+        latencia.observar(3.0, rota='/a')
+
+        linhas = exportar(registro).splitlines()
+
+        assert "# TYPE erros_total counter" in linhas
+        assert 'erros_total{endpoint="produto.obter.php"} 3.0' in linhas
+        assert 'latencia_segundos_bucket{rota="/a",le="0.1"} 2' in linhas
+        assert 'latencia_segundos_bucket{rota="/a",le="1.0"} 2' in linhas
+        assert 'latencia_segundos_bucket{rota="/a",le="+Inf"} 3' in linhas
+        assert 'latencia_segundos_count{rota="/a"} 3' in linhas
+        assert 'latencia_segundos_sum{rota="/a"} 3.15' in linhas
+
+    @pytest.mark.unit
+    def test_mesmo_nome_devolve_a_mesma_metrica(self):
+        """Módulos diferentes compartilham a métrica pelo nome; tipo diferente é erro"""
+        registro = Registro()
+        contador = registro.contador("consultas_total", "Consultas", ("camada",))
+
+        assert registro.contador("consultas_total", "Consultas", ("camada",)) is contador
+        with pytest.raises(ValueError):
+            registro.histograma("consultas_total", "Consultas", ("camada",))
+
+    @pytest.mark.unit
+    def test_rotulos_escapados(self):
+        """Aspas e barras nos valores dos rótulos não quebram o formato"""
+        registro = Registro()
+        registro.contador("x_total", "X", ("rota",)).inc(rota='a"b\\c')
+
+        assert 'x_total{rota="a\\"b\\\\c"} 1.0' in exportar(registro)
+
+
+class TestVariosProcessos:
+    """Soma dos registros dos workers do gunicorn pelo diretório compartilhado"""
+
+    @staticmethod
+    def _worker(erros: int, latencias):
+        registro = Registro()
+        contador = registro.contador("erros_total", "Erros", ("endpoint",))
+        histograma = registro.histograma("latencia_segundos", "Latência", ("rota",), limites=(0.1, 1.0))
+        contador.inc(erros, endpoint='produto.obter.php')
+        for valor in latencias:
+            histograma.observar(valor, rota='/a')
+        return registro
+
+    @pytest.mark.unit
+    def test_soma_dois_registros(self, tmp_path):
+        """A coleta vê a soma dos workers, não só o que respondeu"""
+        gravar(str(tmp_path), self._worker(2, [0.05, 3.0]), pid=101)
+        gravar(str(tmp_path), self._worker(3, [0.5]), pid=102)
+
+        linhas = exportar(agregar(str(tmp_path))).splitlines()
+
+        assert 'erros_total{endpoint="produto.obter.php"} 5.0' in linhas
+        assert 'latencia_segundos_bucket{rota="/a",le="0.1"} 1' in linhas
+        assert 'latencia_segundos_bucket{rota="/a",le="1.0"} 2' in linhas
+        assert 'latencia_segundos_count{rota="/a"} 3' in linhas
+        assert 'latencia_segundos_sum{rota="/a"} 3.55' in linhas
+
+    @pytest.mark.unit
+    def test_worker_encerrado_continua_na_soma(self, tmp_path):
+        """Reciclar um worker não faz os contadores voltarem para trás"""
+        gravar(str(tmp_path), self._worker(2, []), pid=101)
+        consolidar_processo(str(tmp_path), 101)
+        gravar(str(tmp_path), self._worker(4, []), pid=103)
+        consolidar_processo(str(tmp_path), 103)
+        gravar(str(tmp_path), self._worker(1, []), pid=104)
+
+        assert not (tmp_path / "metricas_101.json").exists()
+        assert 'erros_total{endpoint="produto.obter.php"} 7.0' in exportar(agregar(str(tmp_path)))
+
+
+    @pytest.mark.unit
+    def test_diretorio_removido_e_recriado(self, tmp_path):
+        """Diretório apagado depois da subida (ou nunca criado) não derruba a gravação"""
+        diretorio = tmp_path / "metricas"
+
+        assert gravar(str(diretorio), self._worker(2, []), pid=101) is True
+        assert 'erros_total{endpoint="produto.obter.php"} 2.0' in exportar(agregar(str(diretorio)))
+
+    @pytest.mark.unit
+    def test_coleta_sem_poder_gravar_usa_a_memoria(self, tmp_path, monkeypatch):
+        """Sem como gravar, /metrics responde com o registro do próprio processo"""
+        (tmp_path / "arquivo").write_text("")
+        monkeypatch.setenv(DIRETORIO_ENV, str(tmp_path / "arquivo" / "metricas"))
+        registro.contador("teste_coleta_total", "Teste").inc()
+
+        assert "teste_coleta_total 1.0" in exportar(coletar())
+
+
+class TestInstrumentacao:
+    """Pontos medidos no caminho quente"""
+
+    @pytest.mark.unit
+    def test_rota_pelo_template(self):
+        """A requisição entra no histograma pela rota casada, não pelo caminho"""
+        app = FastAPI()
+        app.add_middleware(MetricasMiddleware)
+
+        @app.get("/produto/{codigo}")
+        async def produto(codigo: str):
+            return {"codigo": codigo}
+
+        cliente = TestClient(app)
+        antes = REQUISICOES.contagens().get(('GET', '/produto/{codigo}', '200'), 0)
+        cliente.get("/produto/PH-510")
+        cliente.get("/produto/PH-511")
+        cliente.get("/nada")
+
+        contagens = REQUISICOES.contagens()
+        assert contagens[('GET', '/produto/{codigo}', '200')] - antes == 2
+        assert contagens[('GET', 'desconhecida', '404')] >= 1
+
+    @pytest.mark.unit
+    def test_erro_do_tiny_por_endpoint(self):
+        """Limite de acessos do Tiny conta como erro do endpoint chamado"""
+        session = MagicMock()
+        session.post.return_value.json.return_value = {'retorno': {'status': 'Erro', 'codigo_erro': '6'}}
+        antes = ERROS_TINY.valores().get(('produto.obter.estoque.php', 'tiny'), 0)
+
+        assert TinySync('token', session=session).obter_estoque('123') is None
+        assert ERROS_TINY.valores()[('produto.obter.estoque.php', 'tiny')] - antes == 1
+
+    @pytest.mark.unit
+    def test_redis_so_medido_quando_usado(self):
+        """Sem Redis a operação volta na hora e não entra no histograma"""
+        sem_redis = CacheRedis(None)
+        antes = LATENCIA_REDIS.contagens().get(('hgetall',), 0)
+        sem_redis.hgetall('produto:PH-510')
+        assert LATENCIA_REDIS.contagens().get(('hgetall',), 0) == antes
+
+        com_redis = CacheRedis(None)
+        com_redis.client = MagicMock()
+        com_redis.client.hgetall.return_value = {'id': '1'}
+        com_redis.connected = True
+        com_redis.hgetall('produto:PH-510')
+        assert LATENCIA_REDIS.contagens()[('hgetall',)] == antes + 1
+
+    @pytest.mark.unit
+    def test_endpoint_metrics(self):
+        """/metrics responde no formato texto do Prometheus"""
+        from main import app
+
+        resposta = TestClient(app).get("/metrics")
+
+        assert resposta.status_code == 200
+        assert resposta.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+        assert "# TYPE http_requisicao_segundos histogram" in resposta.text
+        assert "# TYPE tiny_requisicao_segundos histogram" in resposta.text
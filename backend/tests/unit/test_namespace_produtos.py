@@ -0,0 +1,142 @@
+"""
+Testes unitários para o namespace versionado do cache de produtos
+"""
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.cache_produtos import CacheProdutos
+from app.services.namespace_produtos import (
+    LUA_LIBERAR_TRAVA, LUA_TROCAR_VERSAO, TRAVA_RECONSTRUCAO, NamespaceProdutos
+)
+
+
+@pytest.fixture
+def mock_redis():
+    mock = MagicMock()
+    mock.executar_script = AsyncMock(return_value='0')
+    mock.remover_padrao = AsyncMock(return_value=0)
+    mock.set = AsyncMock(return_value=True)
+    mock.get = AsyncMock(return_value=None)
+    mock.delete = AsyncMock(return_value=True)
+    mock.hset = AsyncMock(return_value=True)
+    return mock
+
+
+class TestNamespaceProdutos:
+    """Prefixos por versão e troca do ponteiro"""
+
+    @pytest.mark.unit
+    def test_prefixo_por_versao(self, mock_redis):
+        """A versão 0 é o formato antigo, sem número nas chaves"""
+        namespace = NamespaceProdutos(mock_redis)
+
+        assert namespace.prefixo() == 'produto:'
+        assert namespace.prefixo(3) == 'produto:v3:'
+
+    @pytest.mark.unit
+    def test_versao_0_nao_inclui_outras_versoes(self, mock_redis):
+        """O padrão produto:* da versão 0 também casa com locks e versões novas"""
+        namespace = NamespaceProdutos(mock_redis)
+
+        assert namespace.pertence('produto:PH-10', 0)
+        assert namespace.pertence('produto:index:PH-10', 0)
+        assert not namespace.pertence('produto:v2:PH-10', 0)
+        assert not namespace.pertence('produto:lock:PH-10', 0)
+        assert namespace.pertence('produto:v2:PH-10', 2)
+
+    @pytest.mark.unit
+    async def test_atualizar_sem_redis_mantem_versao(self, mock_redis):
+        """Sem Redis continua usando a última versão lida"""
+        namespace = NamespaceProdutos(mock_redis)
+        mock_redis.executar_script.return_value = '4'
+        assert await namespace.atualizar() == 4
+
+        mock_redis.executar_script.return_value = None
+        assert await namespace.atualizar() == 4
+
+    @pytest.mark.unit
+    async def test_trocar_so_se_ninguem_trocou(self, mock_redis):
+        """A troca é condicionada à versão lida antes da reconstrução"""
+        namespace = NamespaceProdutos(mock_redis)
+        mock_redis.executar_script.return_value = 0
+
+        assert await namespace.trocar(0, 1) is False
+        assert namespace.versao == 0
+        fonte, keys, args = mock_redis.executar_script.call_args.args
+        assert fonte == LUA_TROCAR_VERSAO
+        assert args == [0, 1]
+
+
+class TestReconstrucao:
+    """Reconstrução do cache sem janela vazia"""
+
+    @pytest.mark.unit
+    async def test_reconstruir_troca_e_agenda_coleta(self, mock_redis):
+        """Preenche a versão nova, troca o ponteiro e só depois coleta a antiga"""
+        with patch('app.services.cache_produtos.redis_client', mock_redis):
+            cache = CacheProdutos()
+        cache.carencia = 0
+        mock_redis.executar_script.side_effect = ['0', 1, 1, 1]  # versão atual, nova, troca, trava
+        escritas = []
+
+        async def preencher(versao):
+            escritas.append(cache.chave('PH-10', versao))
+            return {'produtos': 1}
+
+        resultado = await cache.reconstruir(preencher)
+        for tarefa in list(cache._coletas):
+            await tarefa
+
+        assert resultado == {'success': True, 'versao': 1, 'versao_anterior': 0, 'produtos': 1}
+        assert escritas == ['produto:v1:PH-10']
+        assert cache.chave('PH-10') == 'produto:v1:PH-10'
+        assert mock_redis.remover_padrao.call_args.args[0] == 'produto:*'
+
+    @pytest.mark.unit
+    async def test_falha_descarta_versao_nova(self, mock_redis):
+        """Erro no preenchimento apaga a versão nova e mantém a atual"""
+        with patch('app.services.cache_produtos.redis_client', mock_redis):
+            cache = CacheProdutos()
+        mock_redis.executar_script.side_effect = ['0', 1, 0]
+
+        async def preencher(versao):
+            raise RuntimeError('Tiny fora do ar')
+
+        with pytest.raises(RuntimeError):
+            await cache.reconstruir(preencher)
+
+        assert cache.namespace.versao == 0
+        assert mock_redis.remover_padrao.call_args.args[0] == 'produto:v1:*'
+        # A trava sai por comparar-e-apagar no Redis, nunca por GET + DELETE
+        token = mock_redis.set.call_args.args[1]
+        assert mock_redis.executar_script.call_args.args == (LUA_LIBERAR_TRAVA, [TRAVA_RECONSTRUCAO], [token])
+        mock_redis.delete.assert_not_called()
+
+    @pytest.mark.unit
+    async def test_limpar_cache_coleta_depois_da_carencia(self, mock_redis):
+        """Limpar tudo troca o ponteiro na hora, mas só apaga a versão antiga após a carência"""
+        with patch('app.services.cache_produtos.redis_client', mock_redis):
+            cache = CacheProdutos()
+            cache.carencia = 0.05
+            mock_redis.executar_script.side_effect = ['0', 1, 1]  # versão atual, nova, troca
+
+            await cache.limpar_cache()
+            assert cache.namespace.versao == 1
+            mock_redis.remover_padrao.assert_not_called()  # outros processos ainda leem a versão 0
+
+            await asyncio.sleep(0.1)
+
+        assert mock_redis.remover_padrao.call_args.args[0] == 'produto:*'
+
+    @pytest.mark.unit
+    async def test_reconstrucao_em_andamento(self, mock_redis):
+        """Só uma reconstrução por vez"""
+        with patch('app.services.cache_produtos.redis_client', mock_redis):
+            cache = CacheProdutos()
+        mock_redis.set.return_value = False
+
+        resultado = await cache.reconstruir(AsyncMock())
+
+        assert resultado['success'] is False
+        mock_redis.executar_script.assert_not_called()
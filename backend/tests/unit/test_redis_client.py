@@ -0,0 +1,60 @@
+"""
+Testes unitários para os codecs do cliente Redis
+"""
+import pytest
+
+from app.core.redis_client import (
+    Codec, MsgpackCodec, ORJSONCodec, CAMPOS_PRODUTO, msgpack, orjson, obter_codec, projetar
+)
+
+
+PRODUTO_TINY = {
+    'id': '893434458',
+    'codigo': 'PH-510',
+    'nome': 'Arruela Trava',
+    'unidade': 'UN',
+    'preco': '25.78',
+    'gtin': '',
+    'situacao': 'A',
+    'tipoVariacao': 'N'
+}
+
+
+class TestCodecs:
+    """Testes para serialização dos valores gravados no Redis"""
+
+    @pytest.mark.unit
+    @pytest.mark.parametrize('codec', [
+        Codec(),
+        pytest.param(ORJSONCodec(), marks=pytest.mark.skipif(orjson is None, reason='orjson ausente')),
+        pytest.param(MsgpackCodec(), marks=pytest.mark.skipif(msgpack is None, reason='msgpack ausente')),
+    ])
+    def test_ida_e_volta(self, codec):
+        """Deve decodificar exatamente o que foi codificado"""
+        valor = {'produto': PRODUTO_TINY, 'delta': 0.25, 'expira_em': 1753142400.5}
+
+        assert codec.decode(codec.encode(valor)) == valor
+
+    @pytest.mark.unit
+    def test_tags_distintas(self):
+        """Cada codec deve versionar as chaves de forma diferente"""
+        tags = {Codec().tag, ORJSONCodec().tag, MsgpackCodec().tag}
+
+        assert len(tags) == 3
+
+    @pytest.mark.unit
+    def test_codec_desconhecido_usa_json(self):
+        """Nome inválido não deve derrubar o cliente"""
+        assert type(obter_codec('inexistente')) is Codec
+
+    @pytest.mark.unit
+    def test_projetar_campos_produto(self):
+        """Deve manter apenas os campos usados pelo dashboard"""
+        projetado = projetar(PRODUTO_TINY, CAMPOS_PRODUTO)
+
+        assert projetado == {
+            'id': '893434458',
+            'codigo': 'PH-510',
+            'nome': 'Arruela Trava',
+            'unidade': 'UN'
+        }
@@ -0,0 +1,108 @@
+"""
+Testes unitários para a carga da semente de produtos
+"""
+import os
+import pytest
+from unittest.mock import MagicMock
+
+from app.services.seed_produtos import SEMENTE_PADRAO, aplicar, comparar, ler_semente
+
+
+def chave(codigo):
+    return f"produto:{codigo}"
+
+
+@pytest.fixture
+def semente(tmp_path):
+    caminho = tmp_path / "produtos.csv"
+    caminho.write_text("codigo,id,nome\nPH-10,1,\nPH-20,2,Parafuso\nPH-30,3,\n")
+    return str(caminho)
+
+
+class TestSemente:
+    """Leitura, comparação com o Redis e gravação em lotes"""
+
+    @pytest.mark.unit
+    def test_ler_semente(self, semente):
+        """Nome é opcional; a versão muda junto com o conteúdo"""
+        produtos, versao = ler_semente(semente)
+
+        assert produtos == {'PH-10': {'id': '1'}, 'PH-20': {'id': '2', 'nome': 'Parafuso'}, 'PH-30': {'id': '3'}}
+        with open(semente, 'a') as f:
+            f.write("PH-40,4,\n")
+        assert ler_semente(semente)[1] != versao
+
+    @pytest.mark.unit
+    def test_codigo_repetido_e_erro(self, tmp_path):
+        caminho = tmp_path / "produtos.csv"
+        caminho.write_text("codigo,id\nPH-10,1\nPH-10,2\n")
+
+        with pytest.raises(ValueError, match="PH-10 repetido"):
+            ler_semente(str(caminho))
+
+    @pytest.mark.unit
+    def test_semente_do_repositorio(self):
+        """A semente versionada no repositório é válida"""
+        produtos, _ = ler_semente(os.path.join(os.path.dirname(__file__), '..', '..', SEMENTE_PADRAO))
+
+        assert len(produtos) > 0
+        assert all(codigo.startswith('PH-') for codigo in produtos)
+
+    @pytest.mark.unit
+    def test_comparar_separa_novos_e_alterados(self, semente):
+        """Um HMGET por código, num pipeline por lote"""
+        produtos, _ = ler_semente(semente)
+        client = MagicMock()
+        pipe = client.pipeline.return_value
+        pipe.execute.side_effect = [
+            [[None, None], ['2', 'Parafuso velho']],
+            [['3', None]],
+        ]
+
+        diferencas = comparar(client, produtos, chave, lote=2)
+
+        assert diferencas == {'novos': ['PH-10'], 'alterados': ['PH-20'], 'trocados': [], 'iguais': 1}
+        assert pipe.execute.call_count == 2
+
+    @pytest.mark.unit
+    def test_comparar_separa_ids_trocados(self, semente):
+        """Id diferente no Redis: alterado e também trocado"""
+        produtos, _ = ler_semente(semente)
+        client = MagicMock()
+        client.pipeline.return_value.execute.return_value = [['1', None], ['9', 'Parafuso'], ['3', None]]
+
+        diferencas = comparar(client, produtos, chave)
+
+        assert diferencas['alterados'] == ['PH-20']
+        assert diferencas['trocados'] == ['PH-20']
+
+    @pytest.mark.unit
+    def test_aplicar_grava_so_os_codigos_pedidos(self, semente):
+        """Sem apagar nada: HSET + EXPIRE por código, em lotes"""
+        produtos, _ = ler_semente(semente)
+        client = MagicMock()
+        pipe = client.pipeline.return_value
+
+        lotes = aplicar(client, produtos, ['PH-10', 'PH-20'], chave, lambda: 100, lote=1)
+
+        assert lotes == 2
+        pipe.hset.assert_any_call('produto:PH-20', mapping={'codigo': 'PH-20', 'id': '2', 'nome': 'Parafuso'})
+        pipe.expire.assert_any_call('produto:PH-10', 100)
+        pipe.delete.assert_not_called()
+        client.delete.assert_not_called()
+
+    @pytest.mark.unit
+    def test_aplicar_recria_chave_com_id_trocado(self, semente):
+        """Id trocado: a chave é apagada antes do HSET, levando o saldo do produto anterior"""
+        produtos, _ = ler_semente(semente)
+        client = MagicMock()
+        pipe = client.pipeline.return_value
+        chamadas = MagicMock()
+        chamadas.attach_mock(pipe.delete, 'delete')
+        chamadas.attach_mock(pipe.hset, 'hset')
+
+        aplicar(client, produtos, ['PH-10', 'PH-20'], chave, lambda: 100, recriar=['PH-20'])
+
+        pipe.delete.assert_called_once_with('produto:PH-20')
+        nomes = [nome for nome, _, _ in chamadas.mock_calls]
+        assert nomes == ['hset', 'delete', 'hset']
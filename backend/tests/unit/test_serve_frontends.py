@@ -0,0 +1,72 @@
+"""
+Testes unitários para a tabela em memória dos index.html dos testes
+"""
+import os
+import pytest
+
+import serve_frontends
+from serve_frontends import TabelaFrontends
+
+
+def _escrever(caminho, texto, mtime):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    caminho.write_text(texto)
+    os.utime(caminho, (mtime, mtime))
+
+
+@pytest.fixture
+def projeto(tmp_path, monkeypatch):
+    """teste1 com build do React, teste2 só com HTML simples, teste3 sem frontend"""
+    monkeypatch.setattr(serve_frontends, "PROJECT_ROOT", tmp_path)
+    _escrever(tmp_path / "teste1" / "build" / "index.html", "teste1 v1", 1000)
+    _escrever(tmp_path / "teste2" / "index.html", "teste2 v1", 1000)
+    return tmp_path
+
+
+class TestTabelaFrontends:
+    """Testes para a resolução e a recarga dos index.html"""
+
+    @pytest.mark.unit
+    def test_carrega_primeiro_caminho_existente(self, projeto):
+        """Cada teste usa o primeiro index.html encontrado, na ordem de preferência"""
+        _escrever(projeto / "teste1" / "index.html", "teste1 simples", 1000)
+
+        tabela = TabelaFrontends(["teste1", "teste2", "teste3"]).carregar()
+
+        assert tabela.obter("teste1") == b"teste1 v1"
+        assert tabela.obter("teste2") == b"teste2 v1"
+        assert tabela.obter("teste3") is None
+
+    @pytest.mark.unit
+    def test_sem_recarregar_ignora_mudancas(self, projeto):
+        """Sem recarregar o conteúdo fica o da carga, mesmo com o arquivo reescrito"""
+        tabela = TabelaFrontends(["teste1"], intervalo=0).carregar()
+        _escrever(projeto / "teste1" / "build" / "index.html", "teste1 v2", 2000)
+
+        assert tabela.obter("teste1") == b"teste1 v1"
+
+    @pytest.mark.unit
+    def test_recarrega_teste_que_nao_e_o_primeiro(self, projeto):
+        """Com teste1 inalterado, uma mudança no teste2 ainda é percebida"""
+        tabela = TabelaFrontends(["teste1", "teste2"], recarregar=True, intervalo=0).carregar()
+        _escrever(projeto / "teste2" / "index.html", "teste2 v2", 2000)
+
+        assert tabela.obter("teste2") == b"teste2 v2"
+        assert tabela.obter("teste1") == b"teste1 v1"
+
+    @pytest.mark.unit
+    def test_recarrega_build_novo_e_index_removido(self, projeto):
+        """Um build que passa a existir tem preferência; um index removido some da tabela"""
+        tabela = TabelaFrontends(["teste1", "teste2"], recarregar=True, intervalo=0).carregar()
+        _escrever(projeto / "teste2" / "build" / "index.html", "teste2 build", 1000)
+        (projeto / "teste1" / "build" / "index.html").unlink()
+
+        assert tabela.obter("teste2") == b"teste2 build"
+        assert tabela.obter("teste1") is None
+
+    @pytest.mark.unit
+    def test_sem_mudanca_nao_recarrega(self, projeto):
+        """Nada mudou: a tabela não é relida"""
+        tabela = TabelaFrontends(["teste1", "teste2"], recarregar=True, intervalo=0).carregar()
+
+        assert tabela._mudou() is False
@@ -6,7 +6,7 @@ from unittest.mock import AsyncMock, patch, MagicMock
 import httpx
 import json
 
-from app.services.tiny_api import TinyAPIClient
+from app.services.tiny_api import TinyAPIClient, LimitadorTaxa, extrair_saldos
 
 
 class TestTinyAPIClient:
@@ -179,4 +179,60 @@ class TestTinyAPIClient:
         content = call_args.kwargs['content']
         assert 'token=' in content
         assert 'formato=JSON' in content
-        assert 'campo=valor' in content
\ No newline at end of file
+        assert 'campo=valor' in content
+
+
+class TestExtrairSaldos:
+    """Testes para a leitura do saldo por depósito"""
+
+    @pytest.mark.unit
+    def test_saldo_por_deposito(self):
+        """Deve separar o saldo de cada depósito do retorno do Tiny"""
+        retorno = {
+            'status': 'OK',
+            'produto': {
+                'id': '123',
+                'saldo': '1500.00',
+                'depositos': [
+                    {'deposito': {'nome': 'Geral', 'saldo': '1000.00', 'desconsiderar': 'N'}},
+                    {'deposito': {'nome': 'Fundição', 'saldo': '500.00', 'desconsiderar': 'N'}}
+                ]
+            }
+        }
+
+        saldo, depositos = extrair_saldos(retorno)
+
+        assert saldo == 1500
+        assert depositos == {'Geral': 1000, 'Fundição': 500}
+
+    @pytest.mark.unit
+    def test_sem_depositos(self):
+        """Produto sem depósitos deve retornar só o total"""
+        saldo, depositos = extrair_saldos({'produto': {'saldo': '7'}})
+
+        assert saldo == 7
+        assert depositos == {}
+
+
+class TestLimitadorTaxa:
+    """Testes para o limitador de chamadas ao Tiny"""
+
+    @pytest.mark.unit
+    async def test_limita_concorrencia(self):
+        """Nunca deve haver mais chamadas simultâneas que o configurado"""
+        import asyncio
+        limitador = LimitadorTaxa(por_minuto=600, concorrencia=2)
+        ativas = 0
+        maximo = 0
+
+        async def chamada():
+            nonlocal ativas, maximo
+            async with limitador:
+                ativas += 1
+                maximo = max(maximo, ativas)
+                await asyncio.sleep(0.01)
+                ativas -= 1
+
+        await asyncio.gather(*(chamada() for _ in range(6)))
+
+        assert maximo == 2
@@ -0,0 +1,8 @@
+"""
+Núcleo compartilhado pelos backends FastAPI (backend/) e Flask (flask-backend/)
+
+    estoque_comum.tiny      cliente do Tiny com fachadas TinySync e TinyAsync
+    estoque_comum.cache     serviço de cache Redis com fachadas CacheRedis e CacheRedisAsync
+    estoque_comum.leitura   cache read-through das leituras do Tiny (@em_cache)
+    estoque_comum.metricas  contadores e histogramas em memória do processo
+"""
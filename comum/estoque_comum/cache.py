@@ -0,0 +1,585 @@
+"""
+Serviço de cache Redis compartilhado pelos dois backends
+
+CacheRedis concentra as operações (get/set com codec, hashes, pipeline,
+scripts Lua, pub/sub) sobre o cliente síncrono do redis-py; é o que o
+Flask usa. CacheRedisAsync expõe os mesmos métodos como corrotinas para o
+FastAPI, sem duplicar a lógica.
+
+As conexões vêm de um pool limitado (BlockingConnectionPool) com timeouts
+de socket e de conexão e health check, para que uma leitura de cache nunca
+prenda um worker. Sem Redis (URL vazia, conexão recusada ou queda no meio
+do caminho) todos os métodos devolvem o valor "vazio" da operação, e a
+conexão é testada de novo a cada reconectar_apos segundos. Com
+conectar=False nada toca a rede na construção: o app chama
+conectar_em_segundo_plano() ao subir e já atende enquanto o PING não volta.
+"""
+import asyncio
+import functools
+import json
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+import logging
+
+import redis
+
+from .metricas import LIMITES_RAPIDOS, registro
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependência opcional
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependência opcional
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Campos do produto Tiny que realmente usamos; o resto não vai para o Redis
+CAMPOS_PRODUTO = ('id', 'codigo', 'nome', 'unidade', 'saldo')
+
+# Libera uma trava (SET NX EX com token) só se ela ainda for de quem a pegou.
+# KEYS: trava; ARGV: token. GET e DEL num passo: entre os dois a trava pode
+# expirar e ser pega por outro processo
+LUA_LIBERAR_TRAVA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+LATENCIA_REDIS = registro.histograma(
+    "redis_operacao_segundos",
+    "Operações do CacheRedis por tipo (só as que chegaram a usar o Redis)",
+    ("operacao",),
+    limites=LIMITES_RAPIDOS,
+)
+
+
+def _medido(metodo):
+    """
+    Observa a latência da operação. Sem Redis ela volta na hora com o valor
+    vazio e não entra na métrica; uma queda no meio do caminho entra.
+    """
+    operacao = metodo.__name__
+
+    @functools.wraps(metodo)
+    def medir(self, *args, **kwargs):
+        conectado = self.connected
+        inicio = time.perf_counter()
+        try:
+            return metodo(self, *args, **kwargs)
+        finally:
+            if conectado or self.connected:
+                LATENCIA_REDIS.observar(time.perf_counter() - inicio, operacao=operacao)
+    return medir
+
+
+def projetar(valor: Dict[str, Any], campos: Iterable[str]) -> Dict[str, Any]:
+    """Mantém só os campos informados (os ausentes são ignorados)"""
+    return {campo: valor[campo] for campo in campos if campo in valor}
+
+
+class Codec:
+    """
+    Serializa valores gravados no Redis.
+
+    A tag (nome + versão) entra no nome das chaves, de modo que trocar o
+    formato nunca faz um worker ler bytes gravados por outro codec.
+    """
+    nome = "json"
+    versao = 1
+
+    @property
+    def tag(self) -> str:
+        return f"{self.nome}{self.versao}"
+
+    def encode(self, valor: Any) -> bytes:
+        return json.dumps(valor, separators=(',', ':')).encode()
+
+    def decode(self, dado: bytes) -> Any:
+        return json.loads(dado)
+
+
+class ORJSONCodec(Codec):
+    nome = "oj"
+
+    def encode(self, valor: Any) -> bytes:
+        return orjson.dumps(valor)
+
+    def decode(self, dado: bytes) -> Any:
+        return orjson.loads(dado)
+
+
+class MsgpackCodec(Codec):
+    nome = "mp"
+
+    def encode(self, valor: Any) -> bytes:
+        return msgpack.packb(valor, use_bin_type=True)
+
+    def decode(self, dado: bytes) -> Any:
+        return msgpack.unpackb(dado, raw=False)
+
+
+CODECS = {
+    "json": (Codec, True),
+    "orjson": (ORJSONCodec, orjson is not None),
+    "msgpack": (MsgpackCodec, msgpack is not None),
+}
+
+
+def obter_codec(nome: str) -> Codec:
+    """Instancia o codec pelo nome, caindo para JSON se a lib não estiver instalada"""
+    classe, disponivel = CODECS.get(nome, (Codec, True))
+    if not disponivel:
+        logger.warning(f"Codec {nome} indisponível, usando json")
+        classe = Codec
+    return classe()
+
+
+class CacheRedis:
+    """Operações de cache sobre o redis-py síncrono"""
+
+    def __init__(
+        self,
+        url: Optional[str],
+        codec: str = "json",
+        max_conexoes: int = 50,
+        timeout: float = 2.0,
+        timeout_conexao: float = 2.0,
+        health_check: int = 30,
+        reconectar_apos: float = 5.0,
+        conectar: bool = True
+    ):
+        self.client = None
+        self.binary_client = None
+        self.codec = obter_codec(codec)
+        self._scripts: Dict[str, Any] = {}
+        self.connected = False
+        self.max_conexoes = max_conexoes
+        # Depois de uma falha de conexão, as operações devolvem o valor vazio
+        # na hora e só uma thread tenta de novo a cada reconectar_apos segundos
+        self.reconectar_apos = reconectar_apos
+        self._proxima_tentativa = 0.0
+        self._reconexao = threading.Lock()
+        self._tentou = False  # primeira tentativa de conexão já terminou
+        self._conexao_inicial: Optional[threading.Thread] = None
+        if not url:
+            return
+        try:
+            opcoes = dict(
+                max_connections=max_conexoes,
+                timeout=timeout,  # espera por uma conexão livre do pool
+                socket_timeout=timeout,
+                socket_connect_timeout=timeout_conexao,
+                # PING antes de reusar conexão ociosa (o Upstash derruba as paradas).
+                # Sem retry do redis-py: junto com o health check ele entra em
+                # recursão infinita quando o servidor fecha a conexão (redis 5.0)
+                health_check_interval=health_check,
+            )
+            # Os pools não abrem conexão; a primeira sai no conectar()
+            # Para Upstash, a URL já virá com rediss:// incluindo SSL
+            self.client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+                url, decode_responses=True, **opcoes
+            ))
+            # Valores serializados por codec são bytes; usam conexão sem decode
+            self.binary_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(url, **opcoes))
+        except Exception as e:
+            logger.error(f"Erro ao configurar cliente Redis: {e}")
+            return
+        if conectar:
+            self.conectar()
+
+    def conectar(self) -> bool:
+        """Testa a conexão agora (bloqueia até responder ou estourar o timeout)"""
+        if self.client is None:
+            return False
+        with self._reconexao:
+            try:
+                self.client.ping()
+                self.connected = True
+                logger.info(f"Conexão Redis estabelecida com sucesso (pool de {self.max_conexoes} conexões)")
+            except Exception as e:
+                logger.error(f"Erro ao conectar com Redis: {e}")
+                # Não levanta erro para permitir app iniciar sem Redis
+                logger.warning(
+                    "Aplicativo iniciará sem Redis. Algumas funcionalidades estarão limitadas "
+                    f"(nova tentativa em {self.reconectar_apos:.0f}s)."
+                )
+                self.connected = False
+                self._proxima_tentativa = time.monotonic() + self.reconectar_apos
+            finally:
+                self._tentou = True
+        return self.connected
+
+    def conectar_em_segundo_plano(self) -> None:
+        """
+        Conecta numa thread, sem atrasar a subida do app. Até lá as
+        operações respondem como sem Redis (nenhuma espera pelo PING).
+        """
+        if self.client is None or self.connected:
+            return
+        self._proxima_tentativa = float('inf')  # requisições não disparam outro PING
+        self._conexao_inicial = threading.Thread(target=self.conectar, name="redis-conexao", daemon=True)
+        self._conexao_inicial.start()
+
+    def aguardar_conexao(self, timeout: Optional[float] = None) -> str:
+        """Espera a tentativa iniciada por conectar_em_segundo_plano e devolve o estado"""
+        if self._conexao_inicial is not None:
+            self._conexao_inicial.join(timeout)
+        return self.estado
+
+    @property
+    def estado(self) -> str:
+        """'conectado', 'conectando' (primeira tentativa em andamento) ou 'indisponivel'"""
+        if self.connected:
+            return 'conectado'
+        if self.client is not None and not self._tentou:
+            return 'conectando'
+        return 'indisponivel'
+
+    def _disponivel(self) -> bool:
+        """Conectado, ou reconectou agora (no máximo uma tentativa por intervalo)"""
+        if self.connected:
+            return True
+        if not self._reservar_tentativa():
+            return False
+        self._sondar()
+        return self.connected
+
+    def _reservar_tentativa(self) -> bool:
+        """Chegou a vez de testar a conexão? Se sim, fica com o lock de reconexão"""
+        if self.client is None or time.monotonic() < self._proxima_tentativa:
+            return False
+        if not self._reconexao.acquire(blocking=False):
+            return False  # outra thread já está tentando
+        self._proxima_tentativa = time.monotonic() + self.reconectar_apos
+        return True
+
+    def _sondar(self) -> None:
+        """PING de reconexão; libera o lock pego por _reservar_tentativa"""
+        try:
+            self.client.ping()
+            self.connected = True
+            logger.info("Conexão Redis restabelecida")
+        except Exception as e:
+            logger.debug(f"Redis ainda indisponível: {e}")
+        finally:
+            self._tentou = True
+            self._reconexao.release()
+
+    def _falhou(self, erro: Exception) -> None:
+        """Erro de rede: desliga o cache até a próxima tentativa de reconexão"""
+        if isinstance(erro, (redis.ConnectionError, redis.TimeoutError)) and self.connected:
+            self.connected = False
+            self._proxima_tentativa = time.monotonic() + self.reconectar_apos
+            logger.warning(f"Redis indisponível, operando sem cache por {self.reconectar_apos:.0f}s")
+
+    @_medido
+    def get(self, key: str, codec: Optional[Codec] = None) -> Optional[Any]:
+        """Busca valor no Redis (com codec, decodifica o valor binário)"""
+        if not self._disponivel():
+            return None
+        try:
+            if codec:
+                value = self.binary_client.get(key)
+                return codec.decode(value) if value is not None else None
+            value = self.client.get(key)
+            if value:
+                try:
+                    return json.loads(value)
+                except json.JSONDecodeError:
+                    return value
+            return None
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao buscar {key} no Redis: {e}")
+            return None
+
+    @_medido
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ex: Optional[int] = None,
+        nx: bool = False,
+        codec: Optional[Codec] = None
+    ) -> bool:
+        """Salva valor no Redis (nx=True só grava se a chave não existir)"""
+        if not self._disponivel():
+            return False
+        try:
+            if codec:
+                return bool(self.binary_client.set(key, codec.encode(value), ex=ex, nx=nx))
+            if isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            return bool(self.client.set(key, value, ex=ex, nx=nx))
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao salvar {key} no Redis: {e}")
+            return False
+
+    @_medido
+    def delete(self, key: str) -> bool:
+        """Remove chave do Redis"""
+        if not self._disponivel():
+            return False
+        try:
+            return self.client.delete(key) > 0
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao deletar {key} no Redis: {e}")
+            return False
+
+    @_medido
+    def exists(self, key: str) -> bool:
+        """Verifica se chave existe"""
+        if not self._disponivel():
+            return False
+        try:
+            return self.client.exists(key) > 0
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao verificar {key} no Redis: {e}")
+            return False
+
+    @_medido
+    def hgetall(self, key: str) -> Dict[str, str]:
+        """Busca todos os campos de um hash"""
+        if not self._disponivel():
+            return {}
+        try:
+            return self.client.hgetall(key)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao buscar hash {key} no Redis: {e}")
+            return {}
+
+    @_medido
+    def hgetall_lote(self, keys: List[str]) -> List[Dict[str, str]]:
+        """Busca vários hashes numa única ida ao Redis (pipeline)"""
+        if not keys or not self._disponivel():
+            return [{} for _ in keys]
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.hgetall(key)
+            return [r if isinstance(r, dict) else {} for r in pipe.execute(raise_on_error=False)]
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao buscar {len(keys)} hashes no Redis: {e}")
+            return [{} for _ in keys]
+
+    @_medido
+    def hmget(self, key: str, campos: List[str]) -> List[Optional[str]]:
+        """Busca apenas os campos pedidos de um hash"""
+        if not self._disponivel():
+            return [None] * len(campos)
+        try:
+            return self.client.hmget(key, campos)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao buscar campos de {key} no Redis: {e}")
+            return [None] * len(campos)
+
+    @_medido
+    def hset(self, key: str, mapping: Mapping[str, Any], ex: Optional[int] = None) -> bool:
+        """Grava campos de um hash (e renova o TTL, se informado)"""
+        if not self._disponivel():
+            return False
+        try:
+            try:
+                self._hset(key, mapping, ex)
+            except redis.ResponseError as e:
+                if 'WRONGTYPE' not in str(e):
+                    raise
+                # Chave antiga gravada como string: substitui pelo hash
+                self.client.delete(key)
+                self._hset(key, mapping, ex)
+            return True
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao salvar hash {key} no Redis: {e}")
+            return False
+
+    def _hset(self, key: str, mapping: Mapping[str, Any], ex: Optional[int]) -> None:
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping=mapping)
+        if ex:
+            pipe.expire(key, ex)
+        pipe.execute()
+
+    @_medido
+    def hincrby(self, key: str, campo: str, quantidade: int) -> Optional[int]:
+        """Incrementa um campo inteiro do hash atomicamente"""
+        if not self._disponivel():
+            return None
+        try:
+            return self.client.hincrby(key, campo, quantidade)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao incrementar {key}.{campo} no Redis: {e}")
+            return None
+
+    @_medido
+    def publish(self, canal: str, mensagem: Any) -> int:
+        """Publica mensagem no canal (retorna quantos assinantes receberam)"""
+        if not self._disponivel():
+            return 0
+        try:
+            if isinstance(mensagem, (dict, list)):
+                mensagem = json.dumps(mensagem, ensure_ascii=False)
+            return self.client.publish(canal, mensagem)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao publicar em {canal} no Redis: {e}")
+            return 0
+
+    @_medido
+    def executar_script(self, fonte: str, keys: List[str], args: List[Any]) -> Optional[Any]:
+        """Executa um script Lua atomicamente no servidor (EVALSHA com fallback para EVAL)"""
+        if not self._disponivel():
+            return None
+        try:
+            script = self._scripts.get(fonte)
+            if script is None:
+                script = self._scripts[fonte] = self.client.register_script(fonte)
+            return script(keys=keys, args=args)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao executar script Lua em {keys}: {e}")
+            return None
+
+    def scan_iter(self, match: str, count: int = 500):
+        """Itera chaves que casam com o padrão (SCAN, não bloqueia o Redis)"""
+        if not self._disponivel():
+            return
+        try:
+            yield from self.client.scan_iter(match=match, count=count)
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao varrer {match} no Redis: {e}")
+
+    @_medido
+    def varrer_campos(
+        self,
+        match: str,
+        campos: List[str],
+        count: int = 500
+    ) -> List[Tuple[str, List[Optional[str]]]]:
+        """
+        Campos pedidos de todos os hashes que casam com o padrão: SCAN em
+        páginas de count chaves e um HMGET em pipeline por página (uma ida
+        ao Redis por página, não por chave). Chaves que não são hash ficam de fora.
+        """
+        if not self._disponivel():
+            return []
+        resultado: List[Tuple[str, List[Optional[str]]]] = []
+        try:
+            cursor = 0
+            while True:
+                cursor, keys = self.client.scan(cursor, match=match, count=count)
+                if keys:
+                    pipe = self.client.pipeline(transaction=False)
+                    for key in keys:
+                        pipe.hmget(key, campos)
+                    for key, valores in zip(keys, pipe.execute(raise_on_error=False)):
+                        if isinstance(valores, list):
+                            resultado.append((key, valores))
+                if cursor == 0:
+                    return resultado
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao varrer {match} no Redis: {e}")
+            return resultado
+
+    @_medido
+    def remover_padrao(
+        self,
+        match: str,
+        lote: int = 500,
+        filtro: Optional[Callable[[str], bool]] = None
+    ) -> int:
+        """
+        Remove as chaves que casam com o padrão (e com o filtro, se houver)
+        página a página: SCAN de `lote` chaves e um UNLINK por página. O
+        UNLINK libera a memória numa thread do Redis, sem bloquear o servidor
+        como um DEL de milhares de chaves. Devolve quantas foram removidas.
+        """
+        if not self._disponivel():
+            return 0
+        removidas = 0
+        try:
+            cursor = 0
+            while True:
+                cursor, keys = self.client.scan(cursor, match=match, count=lote)
+                keys = [k for k in keys if filtro is None or filtro(k)]
+                if keys:
+                    removidas += self.client.unlink(*keys)
+                if cursor == 0:
+                    return removidas
+        except Exception as e:
+            self._falhou(e)
+            logger.error(f"Erro ao remover {match} do Redis: {e}")
+            return removidas
+
+
+def _corrotina(metodo):
+    """Expõe um método de CacheRedis como corrotina (mesma assinatura e docstring)"""
+    @functools.wraps(metodo)
+    async def chamar(self, *args, **kwargs):
+        return metodo(self, *args, **kwargs)
+    return chamar
+
+
+def _em_thread(metodo):
+    """Como _corrotina, mas roda numa thread: para operações longas (varreduras)"""
+    @functools.wraps(metodo)
+    async def chamar(self, *args, **kwargs):
+        return await asyncio.to_thread(metodo, self, *args, **kwargs)
+    return chamar
+
+
+class CacheRedisAsync(CacheRedis):
+    """
+    Mesmas operações com await, para o FastAPI.
+
+    Os comandos continuam indo pelo cliente síncrono (são rápidos e o
+    event loop já convivia com isso); varreduras inteiras rodam numa
+    thread para não segurar o loop. A troca de transporte fica aqui.
+    """
+
+    def _disponivel(self) -> bool:
+        """
+        Como no CacheRedis, mas o PING de reconexão vai numa thread: com o
+        Redis fora ele pode levar o timeout de conexão inteiro, e o event
+        loop não espera por isso. A operação que disparou a tentativa (e as
+        seguintes, até o PING voltar) seguem sem cache.
+        """
+        if self.connected:
+            return True
+        if self._reservar_tentativa():
+            threading.Thread(target=self._sondar, name="redis-reconexao", daemon=True).start()
+        return False
+    get = _corrotina(CacheRedis.get)
+    set = _corrotina(CacheRedis.set)
+    delete = _corrotina(CacheRedis.delete)
+    exists = _corrotina(CacheRedis.exists)
+    hgetall = _corrotina(CacheRedis.hgetall)
+    hgetall_lote = _corrotina(CacheRedis.hgetall_lote)
+    hmget = _corrotina(CacheRedis.hmget)
+    hset = _corrotina(CacheRedis.hset)
+    hincrby = _corrotina(CacheRedis.hincrby)
+    publish = _corrotina(CacheRedis.publish)
+    executar_script = _corrotina(CacheRedis.executar_script)
+    varrer_campos = _em_thread(CacheRedis.varrer_campos)
+    aguardar_conexao = _em_thread(CacheRedis.aguardar_conexao)
+    remover_padrao = _em_thread(CacheRedis.remover_padrao)
+
+    async def scan_iter(self, match: str, count: int = 500):
+        """Itera chaves que casam com o padrão (SCAN, não bloqueia o Redis)"""
+        for key in CacheRedis.scan_iter(self, match, count):
+            yield key
@@ -0,0 +1,284 @@
+"""
+Cache de leitura (read-through) declarativo para o cliente do Tiny
+
+    @em_cache(lambda produto_id: produto_id, ttl='ttl_estoque', ttl_negativo='ttl_negativo')
+    async def obter_estoque(self, produto_id): ...
+
+O método decorado (síncrono ou corrotina) consulta self.cache (CacheRedis
+ou CacheRedisAsync; None desliga o cache) na chave
+tiny:{método}:{codec}:{chave(*args)} antes de ir ao Tiny e grava o
+resultado por `ttl` segundos. Um None (produto inexistente) fica
+`ttl_negativo` segundos, mas só se nenhuma requisição da leitura falhou:
+as operações também devolvem None em erro de rede ou HTTP, e isso não
+pode ser lembrado como "não existe". Os TTLs são números ou nomes de
+atributos do cliente, para cada backend configurar os seus.
+
+Chamadas simultâneas da mesma chave no processo esperam a primeira
+(single-flight) e recebem o mesmo objeto: quem for alterar o resultado
+deve copiá-lo. Se a primeira for cancelada, uma das que esperavam assume
+a leitura. fresco=True não lê o cache nem espera ninguém, vai ao Tiny
+e grava o valor novo, para quem precisa do dado atual (saldo confirmado).
+Depois de uma escrita no Tiny, invalidar() apaga a chave e impede que uma
+leitura iniciada antes dela regrave o valor antigo.
+
+Cada leitura é observada no histograma tiny_leitura_segundos por método e
+resultado: hit, hit_negativo, miss, compartilhado, fresco ou sem_cache; e
+conta na camada tiny_leitura de cache_consultas_total (hits contra miss e
+compartilhado).
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from .cache import Codec, obter_codec
+from .metricas import consulta_cache, registro
+
+# Invalidações mais antigas que isso não alcançam nenhuma leitura em andamento
+RETENCAO_INVALIDACOES = 300.0
+
+LATENCIA = registro.histograma(
+    "tiny_leitura_segundos",
+    "Leituras do Tiny pelo cache de leitura, por método e resultado",
+    ("metodo", "resultado"),
+)
+
+# Alguma requisição da leitura em andamento falhou (marcada pelo transporte)
+_falha: contextvars.ContextVar = contextvars.ContextVar("estoque_comum_leitura_falha", default=False)
+
+
+def marcar_falha() -> None:
+    """Chamado pelo transporte quando uma requisição ao Tiny falha"""
+    _falha.set(True)
+
+
+class EstadoLeituras:
+    """Leituras em andamento e invalidações recentes de um cliente"""
+
+    def __init__(self):
+        self.voos: Dict[str, Any] = {}
+        self.invalidacoes: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+
+class _LiderCancelado(Exception):
+    """A tarefa que fazia a leitura foi cancelada; quem a esperava tenta de novo"""
+
+
+class _Voo:
+    """Leitura síncrona em andamento, esperada pelas threads que chegam depois"""
+
+    def __init__(self):
+        self.pronto = threading.Event()
+        self.valor: Any = None
+        self.erro: Optional[BaseException] = None
+
+
+class Leitura:
+    """Configuração de um método em cache: chave, TTLs e codec"""
+
+    def __init__(
+        self,
+        metodo: str,
+        chave: Callable[..., Any],
+        ttl: Union[int, str],
+        ttl_negativo: Union[int, str],
+        codec: str
+    ):
+        self.metodo = metodo
+        self.chave = chave
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+        self.nome_codec = codec
+        self._codec: Optional[Codec] = None
+
+    @property
+    def codec(self) -> Codec:
+        if self._codec is None:
+            self._codec = obter_codec(self.nome_codec)
+        return self._codec
+
+    def key(self, args: tuple, kwargs: Dict[str, Any]) -> str:
+        return f"tiny:{self.metodo}:{self.codec.tag}:{self.chave(*args, **kwargs)}"
+
+    def observar(self, resultado: str, inicio: float) -> None:
+        LATENCIA.observar(time.perf_counter() - inicio, metodo=self.metodo, resultado=resultado)
+        if resultado in ('hit', 'hit_negativo', 'miss', 'compartilhado'):
+            consulta_cache('tiny_leitura', resultado.startswith('hit'))
+
+    def acerto(self, guardado: Any, inicio: float) -> tuple:
+        """(encontrado, valor) a partir do que veio do cache"""
+        if not isinstance(guardado, list) or len(guardado) != 1:
+            return False, None
+        self.observar('hit' if guardado[0] is not None else 'hit_negativo', inicio)
+        return True, guardado[0]
+
+    def ttl_para_gravar(self, cliente, key: str, valor: Any, falhou: bool, inicio: float) -> int:
+        """Por quanto tempo gravar o resultado (0 = não gravar)"""
+        if cliente._leituras.invalidacoes.get(key, 0.0) >= inicio:
+            return 0  # houve escrita no Tiny durante a leitura
+        if valor is None:
+            return 0 if falhou else int(_resolver(cliente, self.ttl_negativo))
+        return int(_resolver(cliente, self.ttl))
+
+
+def _resolver(cliente, ttl: Union[int, str]) -> Union[int, float]:
+    return getattr(cliente, ttl) if isinstance(ttl, str) else ttl
+
+
+def em_cache(
+    chave: Callable[..., Any],
+    ttl: Union[int, str],
+    ttl_negativo: Union[int, str] = 0,
+    codec: str = "msgpack"
+):
+    """
+    Decora uma leitura do cliente Tiny com cache read-through. `chave`
+    recebe os mesmos argumentos do método e devolve a parte variável da
+    chave no Redis.
+    """
+    def decorar(metodo):
+        leitura = Leitura(metodo.__name__, chave, ttl, ttl_negativo, codec)
+
+        if asyncio.iscoroutinefunction(metodo):
+            @functools.wraps(metodo)
+            async def ler(self, *args, fresco: bool = False, **kwargs):
+                inicio = time.perf_counter()
+                cache = self.cache
+                if cache is None:
+                    valor = await metodo(self, *args, **kwargs)
+                    leitura.observar('sem_cache', inicio)
+                    return valor
+                key = leitura.key(args, kwargs)
+                voos = self._leituras.voos
+                voo = None
+                if not fresco:
+                    while True:
+                        encontrado, valor = leitura.acerto(await cache.get(key, codec=leitura.codec), inicio)
+                        if encontrado:
+                            return valor
+                        if key not in voos:
+                            break
+                        try:
+                            valor = await asyncio.shield(voos[key])
+                        except _LiderCancelado:
+                            continue  # outra espera assume a leitura (ou já achou no cache)
+                        leitura.observar('compartilhado', inicio)
+                        return valor
+                    voo = voos[key] = asyncio.get_running_loop().create_future()
+                try:
+                    token = _falha.set(False)
+                    try:
+                        valor = await metodo(self, *args, **kwargs)
+                        falhou = _falha.get()
+                    finally:
+                        _falha.reset(token)
+                    if voo is not None:
+                        voo.set_result(valor)
+                    segundos = leitura.ttl_para_gravar(self, key, valor, falhou, inicio)
+                    if segundos > 0:
+                        await cache.set(key, [valor], ex=segundos, codec=leitura.codec)
+                except asyncio.CancelledError:
+                    # Quem esperava não foi cancelado: tenta de novo em vez
+                    # de receber o CancelledError de outra tarefa
+                    if voo is not None and not voo.done():
+                        voo.set_exception(_LiderCancelado())
+                        voo.exception()
+                    raise
+                except BaseException as e:
+                    if voo is not None and not voo.done():
+                        voo.set_exception(e)
+                        voo.exception()  # sem ninguém esperando não vira aviso
+                    raise
+                finally:
+                    if voo is not None:
+                        voos.pop(key, None)
+                leitura.observar('fresco' if fresco else 'miss', inicio)
+                return valor
+        else:
+            @functools.wraps(metodo)
+            def ler(self, *args, fresco: bool = False, **kwargs):
+                inicio = time.perf_counter()
+                cache = self.cache
+                if cache is None:
+                    valor = metodo(self, *args, **kwargs)
+                    leitura.observar('sem_cache', inicio)
+                    return valor
+                key = leitura.key(args, kwargs)
+                estado = self._leituras
+                voo = None
+                if not fresco:
+                    encontrado, valor = leitura.acerto(cache.get(key, codec=leitura.codec), inicio)
+                    if encontrado:
+                        return valor
+                    with estado.lock:
+                        andamento = estado.voos.get(key)
+                        if andamento is None:
+                            voo = estado.voos[key] = _Voo()
+                    if andamento is not None:
+                        andamento.pronto.wait()
+                        leitura.observar('compartilhado', inicio)
+                        if andamento.erro is not None:
+                            raise andamento.erro
+                        return andamento.valor
+                try:
+                    token = _falha.set(False)
+                    try:
+                        valor = metodo(self, *args, **kwargs)
+                        falhou = _falha.get()
+                    finally:
+                        _falha.reset(token)
+                    if voo is not None:
+                        voo.valor = valor
+                        voo.pronto.set()
+                    segundos = leitura.ttl_para_gravar(self, key, valor, falhou, inicio)
+                    if segundos > 0:
+                        cache.set(key, [valor], ex=segundos, codec=leitura.codec)
+                except BaseException as e:
+                    if voo is not None and not voo.pronto.is_set():
+                        voo.erro = e
+                        voo.pronto.set()
+                    raise
+                finally:
+                    if voo is not None:
+                        with estado.lock:
+                            estado.voos.pop(key, None)
+                leitura.observar('fresco' if fresco else 'miss', inicio)
+                return valor
+
+        ler.leitura = leitura
+        return ler
+    return decorar
+
+
+def invalidar(cliente, metodo, *args, **kwargs) -> Optional[str]:
+    """
+    Marca o valor de metodo(*args) como inválido no cliente e devolve a
+    chave a apagar do cache (None sem cache). Leituras iniciadas antes
+    desta chamada não gravam o resultado delas.
+    """
+    if cliente.cache is None:
+        return None
+    key = metodo.leitura.key(args, kwargs)
+    agora = time.perf_counter()
+    with cliente._leituras.lock:
+        invalidacoes = cliente._leituras.invalidacoes
+        for antiga in [k for k, t in invalidacoes.items() if agora - t > RETENCAO_INVALIDACOES]:
+            del invalidacoes[antiga]
+        invalidacoes[key] = agora
+    return key
+
+
+def resumo(metodo: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Leituras por método e resultado, com a taxa de acerto do cache"""
+    por_metodo: Dict[str, Dict[str, Any]] = {}
+    for (nome, resultado), total in LATENCIA.contagens().items():
+        if metodo is None or nome == metodo:
+            por_metodo.setdefault(nome, {})[resultado] = total
+    for contagens in por_metodo.values():
+        acertos = contagens.get('hit', 0) + contagens.get('hit_negativo', 0)
+        consultas = acertos + contagens.get('miss', 0) + contagens.get('compartilhado', 0)
+        contagens['taxa_acerto'] = round(acertos / consultas, 4) if consultas else None
+    return por_metodo
@@ -0,0 +1,372 @@
+"""
+Métricas em memória do processo (contadores e histogramas com rótulos)
+
+Sem dependência externa: cada série é um dicionário protegido por lock,
+barato o bastante para o caminho quente (uma soma e uma busca binária por
+observação) e seguro entre as threads do gunicorn. Os módulos registram
+suas métricas no `registro` global na importação; registrar de novo o
+mesmo nome devolve a métrica já existente.
+
+exportar() gera o formato texto do Prometheus, servido em /metrics pelos
+dois backends. Com vários workers do gunicorn cada processo tem o seu
+registro; se PROMETHEUS_MULTIPROC_DIR estiver definido, cada worker grava
+um instantâneo dele nesse diretório (a cada poucos segundos e ao sair) e
+coletar() soma os arquivos de todos, para a coleta não depender de qual
+worker respondeu. Os arquivos de workers encerrados são somados num só
+(consolidar_processo, chamado pelo child_exit do gunicorn), então os
+contadores não voltam para trás quando um worker é reciclado.
+"""
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos baldes de latência: de 1ms a 10s
+LIMITES_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Para operações de submilissegundo (comandos Redis)
+LIMITES_RAPIDOS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Diretório compartilhado pelos workers (mesmo nome usado pelo prometheus_client)
+DIRETORIO_ENV = "PROMETHEUS_MULTIPROC_DIR"
+INTERVALO_GRAVACAO = 5.0
+ARQUIVO_ENCERRADOS = "metricas_encerrados.json"
+
+Rotulos = Tuple[str, ...]
+
+
+def _numero(valor: float) -> str:
+    if valor == float('inf'):
+        return "+Inf"
+    return repr(float(valor))
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _formatar_rotulos(nomes: Rotulos, valores: Rotulos, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pares = list(zip(nomes, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+class Metrica:
+    tipo = "untyped"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def _chave(self, rotulos: Dict[str, str]) -> Rotulos:
+        if set(rotulos) != set(self.rotulos):
+            raise ValueError(f"{self.nome} espera os rótulos {self.rotulos}, recebeu {tuple(rotulos)}")
+        return tuple(str(rotulos[r]) for r in self.rotulos)
+
+    def amostras(self) -> List[str]:
+        """Linhas de valores no formato texto do Prometheus"""
+        return []
+
+
+class Contador(Metrica):
+    """Valor que só cresce (requisições, erros...)"""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Rotulos, float] = {}
+
+    def inc(self, valor: float = 1.0, **rotulos: str) -> None:
+        chave = self._chave(rotulos)
+        with self._lock:
+            self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def valores(self) -> Dict[Rotulos, float]:
+        with self._lock:
+            return dict(self._valores)
+
+    def instantaneo(self) -> List:
+        return [[list(chave), valor] for chave, valor in self.valores().items()]
+
+    def somar(self, series: List) -> None:
+        with self._lock:
+            for chave, valor in series:
+                chave = tuple(chave)
+                self._valores[chave] = self._valores.get(chave, 0.0) + valor
+
+    def amostras(self) -> List[str]:
+        return [
+            f"{self.nome}{_formatar_rotulos(self.rotulos, chave)} {_numero(valor)}"
+            for chave, valor in sorted(self.valores().items())
+        ]
+
+
+class Histograma(Metrica):
+    """Distribuição de observações (latências) em baldes cumulativos"""
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nome: str,
+        ajuda: str,
+        rotulos: Iterable[str] = (),
+        limites: Iterable[float] = LIMITES_LATENCIA
+    ):
+        super().__init__(nome, ajuda, rotulos)
+        self.limites = tuple(sorted(limites))
+        # rótulos -> [contagem por balde (o último é +Inf), soma]
+        self._series: Dict[Rotulos, List] = {}
+
+    def observar(self, valor: float, **rotulos: str) -> None:
+        chave = self._chave(rotulos)
+        balde = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0]
+            serie[0][balde] += 1
+            serie[1] += valor
+
+    def series(self) -> Dict[Rotulos, Tuple[List[int], float]]:
+        """Por combinação de rótulos: (contagem por balde, soma)"""
+        with self._lock:
+            return {chave: (list(baldes), soma) for chave, (baldes, soma) in self._series.items()}
+
+    def contagens(self) -> Dict[Rotulos, int]:
+        """Total de observações por combinação de rótulos"""
+        with self._lock:
+            return {chave: sum(baldes) for chave, (baldes, _) in self._series.items()}
+
+    def instantaneo(self) -> List:
+        return [[list(chave), baldes, soma] for chave, (baldes, soma) in self.series().items()]
+
+    def somar(self, series: List) -> None:
+        with self._lock:
+            for chave, baldes, soma in series:
+                if len(baldes) != len(self.limites) + 1:
+                    continue  # gravado com outros limites (versão anterior do código)
+                chave = tuple(chave)
+                serie = self._series.get(chave)
+                if serie is None:
+                    serie = self._series[chave] = [[0] * (len(self.limites) + 1), 0.0]
+                for i, contagem in enumerate(baldes):
+                    serie[0][i] += contagem
+                serie[1] += soma
+
+    def amostras(self) -> List[str]:
+        linhas = []
+        limites = self.limites + (float('inf'),)
+        for chave, (baldes, soma) in sorted(self.series().items()):
+            acumulado = 0
+            for limite, contagem in zip(limites, baldes):
+                acumulado += contagem
+                rotulos = _formatar_rotulos(self.rotulos, chave, (("le", _numero(limite)),))
+                linhas.append(f"{self.nome}_bucket{rotulos} {acumulado}")
+            rotulos = _formatar_rotulos(self.rotulos, chave)
+            linhas.append(f"{self.nome}_sum{rotulos} {_numero(soma)}")
+            linhas.append(f"{self.nome}_count{rotulos} {acumulado}")
+        return linhas
+
+
+class Registro:
+    """Métricas do processo, por nome"""
+
+    def __init__(self):
+        self._metricas: Dict[str, Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, classe, nome: str, ajuda: str, rotulos: Iterable[str], **opcoes) -> Metrica:
+        with self._lock:
+            metrica = self._metricas.get(nome)
+            if metrica is None:
+                metrica = self._metricas[nome] = classe(nome, ajuda, rotulos, **opcoes)
+            elif not isinstance(metrica, classe) or metrica.rotulos != tuple(rotulos):
+                raise ValueError(f"Métrica {nome} já registrada com outro tipo ou rótulos")
+            return metrica
+
+    def contador(self, nome: str, ajuda: str, rotulos: Iterable[str] = ()) -> Contador:
+        return self._registrar(Contador, nome, ajuda, rotulos)
+
+    def histograma(
+        self,
+        nome: str,
+        ajuda: str,
+        rotulos: Iterable[str] = (),
+        limites: Iterable[float] = LIMITES_LATENCIA
+    ) -> Histograma:
+        return self._registrar(Histograma, nome, ajuda, rotulos, limites=limites)
+
+    def obter(self, nome: str) -> Optional[Metrica]:
+        return self._metricas.get(nome)
+
+    def metricas(self) -> List[Metrica]:
+        with self._lock:
+            return list(self._metricas.values())
+
+    def instantaneo(self) -> Dict[str, Dict[str, Any]]:
+        """Definição e valores de cada métrica, serializável em JSON"""
+        dados = {}
+        for metrica in self.metricas():
+            dados[metrica.nome] = {
+                "tipo": metrica.tipo,
+                "ajuda": metrica.ajuda,
+                "rotulos": list(metrica.rotulos),
+                "limites": list(getattr(metrica, "limites", ())),
+                "series": metrica.instantaneo(),
+            }
+        return dados
+
+    def somar(self, dados: Dict[str, Dict[str, Any]]) -> None:
+        """Soma um instantâneo (de outro processo) às métricas deste registro"""
+        for nome, definicao in dados.items():
+            if definicao["tipo"] == Histograma.tipo:
+                metrica = self.histograma(nome, definicao["ajuda"], definicao["rotulos"], definicao["limites"])
+            else:
+                metrica = self.contador(nome, definicao["ajuda"], definicao["rotulos"])
+            metrica.somar(definicao["series"])
+
+
+# Registro global do processo
+registro = Registro()
+
+CONSULTAS_CACHE = registro.contador(
+    "cache_consultas_total",
+    "Consultas a cada camada de cache (memoria, local, redis, tiny_leitura) por resultado",
+    ("camada", "resultado"),
+)
+
+
+def consulta_cache(camada: str, acerto: bool) -> None:
+    """Conta uma consulta à camada de cache; a taxa de acerto sai de hit / (hit + miss)"""
+    CONSULTAS_CACHE.inc(camada=camada, resultado='hit' if acerto else 'miss')
+
+
+def exportar(origem: Optional[Registro] = None) -> str:
+    """Todas as métricas do registro no formato texto do Prometheus (0.0.4)"""
+    linhas = []
+    for metrica in (origem or registro).metricas():
+        linhas.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+        linhas.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+        linhas.extend(metrica.amostras())
+    return "\n".join(linhas) + "\n"
+
+
+def _gravar_json(caminho: str, dados: Dict[str, Any]) -> None:
+    # Escreve ao lado e renomeia: quem coleta nunca lê um arquivo pela metade
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(dados, f)
+    os.replace(temporario, caminho)
+
+
+def _ler_json(caminho: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(caminho) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None  # worker consolidado no meio da coleta
+
+
+def diretorio_processos() -> Optional[str]:
+    return os.environ.get(DIRETORIO_ENV) or None
+
+
+def gravar(diretorio: str, origem: Optional[Registro] = None, pid: Optional[int] = None) -> bool:
+    """
+    Grava o instantâneo do registro deste processo no diretório
+    compartilhado (criado se preciso). Falha de disco só é registrada no
+    log: /metrics e a saída do worker não podem quebrar por isso.
+    """
+    pid = os.getpid() if pid is None else pid
+    try:
+        os.makedirs(diretorio, exist_ok=True)
+        _gravar_json(os.path.join(diretorio, f"metricas_{pid}.json"), (origem or registro).instantaneo())
+        return True
+    except OSError as e:
+        logger.warning(f"Falha ao gravar métricas em {diretorio}: {e}")
+        return False
+
+
+def agregar(diretorio: str) -> Registro:
+    """Registro com a soma dos instantâneos de todos os processos do diretório"""
+    soma = Registro()
+    for caminho in sorted(glob.glob(os.path.join(diretorio, "metricas_*.json"))):
+        dados = _ler_json(caminho)
+        if dados:
+            soma.somar(dados)
+    return soma
+
+
+def coletar() -> Registro:
+    """O que /metrics deve exportar: a soma dos workers ou só este processo"""
+    diretorio = diretorio_processos()
+    if diretorio is None:
+        return registro
+    gravou = gravar(diretorio)
+    soma = agregar(diretorio)
+    if not gravou:
+        soma.somar(registro.instantaneo())  # este processo direto da memória
+    return soma
+
+
+def consolidar_processo(diretorio: str, pid: int) -> None:
+    """
+    Soma o instantâneo de um worker encerrado ao dos já encerrados e apaga
+    o dele. Chamado só pelo master do gunicorn (child_exit), um por vez.
+    """
+    caminho = os.path.join(diretorio, f"metricas_{pid}.json")
+    dados = _ler_json(caminho)
+    if dados:
+        encerrados = Registro()
+        encerrados.somar(_ler_json(os.path.join(diretorio, ARQUIVO_ENCERRADOS)) or {})
+        encerrados.somar(dados)
+        _gravar_json(os.path.join(diretorio, ARQUIVO_ENCERRADOS), encerrados.instantaneo())
+    try:
+        os.remove(caminho)
+    except FileNotFoundError:
+        pass
+
+
+def limpar(diretorio: str) -> None:
+    """Apaga os instantâneos de uma execução anterior (início do master)"""
+    os.makedirs(diretorio, exist_ok=True)
+    for caminho in glob.glob(os.path.join(diretorio, "metricas_*.json*")):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+_gravacao: Optional[threading.Thread] = None
+
+
+def iniciar_gravacao(intervalo: float = INTERVALO_GRAVACAO) -> bool:
+    """
+    Grava o instantâneo deste processo a cada `intervalo` segundos e na
+    saída, se PROMETHEUS_MULTIPROC_DIR estiver definido. Idempotente.
+    """
+    global _gravacao
+    diretorio = diretorio_processos()
+    if diretorio is None or _gravacao is not None:
+        return False
+
+    def gravar_sempre():
+        while True:
+            time.sleep(intervalo)
+            gravar(diretorio)
+
+    _gravacao = threading.Thread(target=gravar_sempre, name="metricas-gravacao", daemon=True)
+    _gravacao.start()
+    atexit.register(gravar, diretorio)
+    return True
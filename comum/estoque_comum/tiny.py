@@ -0,0 +1,489 @@
+"""
+Cliente da API do Tiny compartilhado pelos dois backends
+
+Cada operação (pesquisar, obter produto, alterar estoque...) é escrita uma
+vez em TinyBase como um gerador: entrega (endpoint, dados), recebe a
+resposta já decodificada (ou a exceção do transporte) e retorna o
+resultado. Não sabe nada de HTTP. As fachadas só executam o gerador:
+
+    TinySync   requests.Session, para o Flask
+    TinyAsync  httpx.AsyncClient + LimitadorTaxa, para o FastAPI
+
+Correções de parsing, tratamento de erro ou cache entram num lugar só.
+As leituras (pesquisa, produto e estoque) passam pelo cache read-through
+de estoque_comum.leitura quando o cliente recebe um `cache`; alterar o
+estoque invalida o estoque cacheado do produto.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Generator, Optional, Tuple
+from urllib.parse import urlencode
+import logging
+
+from .leitura import EstadoLeituras, em_cache, invalidar, marcar_falha
+from .metricas import registro
+
+logger = logging.getLogger(__name__)
+
+TINY_API_BASE_URL = "https://api.tiny.com.br/api2"
+
+# Uma operação: entrega (endpoint, dados), recebe a resposta, retorna o resultado
+Operacao = Generator[Tuple[str, Dict[str, Any]], Dict[str, Any], Any]
+
+# Erros do Tiny que são resposta de verdade: "a consulta não retornou
+# registros" e "registro não localizado". Os demais (limite de acessos,
+# manutenção, token...) não dizem nada sobre o produto
+CODIGOS_NAO_ENCONTRADO = {'20', '32'}
+
+# Tipo de movimentação do Tiny -> nome usado nos eventos e no histórico
+TIPOS_MOVIMENTACAO = {'E': 'entrada', 'S': 'saida', 'B': 'balanco'}
+
+LATENCIA_TINY = registro.histograma(
+    "tiny_requisicao_segundos",
+    "Chamadas HTTP ao Tiny por endpoint (sem a espera do limitador)",
+    ("endpoint",),
+)
+ERROS_TINY = registro.contador(
+    "tiny_erros_total",
+    "Chamadas ao Tiny que falharam, por endpoint e tipo (transporte ou tiny)",
+    ("endpoint", "tipo"),
+)
+ESPERA_LIMITADOR = registro.histograma(
+    "tiny_limitador_espera_segundos",
+    "Espera por vaga no limitador do Tiny (concorrência e taxa por minuto)",
+)
+
+
+def nome_movimentacao(tipo: str) -> str:
+    """'E' -> 'entrada', 'S' -> 'saida', 'B' -> 'balanco' (igual para os dois backends)"""
+    return TIPOS_MOVIMENTACAO.get(tipo, tipo)
+
+
+def resposta_conclusiva(response: Dict[str, Any]) -> bool:
+    """A resposta vale como resultado (OK ou produto inexistente), não como falha?"""
+    retorno = response.get('retorno', {}) if isinstance(response, dict) else {}
+    if retorno.get('status') != 'Erro':
+        return True
+    return str(retorno.get('codigo_erro', '')) in CODIGOS_NAO_ENCONTRADO
+
+
+def extrair_saldos(estoque_info: Dict[str, Any], inteiro: bool = False) -> Tuple[float, Dict[str, float]]:
+    """Saldo total e saldo por depósito a partir do retorno de produto.obter.estoque"""
+    converter = (lambda v: int(float(v or 0))) if inteiro else (lambda v: float(v or 0))
+    produto = estoque_info.get('produto', estoque_info)
+    depositos = {}
+    for item in produto.get('depositos') or []:
+        dep = item.get('deposito', item)
+        nome = dep.get('nome')
+        if nome:
+            depositos[nome] = converter(dep.get('saldo'))
+    return converter(produto.get('saldo')), depositos
+
+
+def erro_da_resposta(response: Dict[str, Any]) -> str:
+    """Mensagem de erro de um retorno do Tiny com status diferente de OK"""
+    retorno = response.get('retorno', {})
+    # Erros no nível do retorno
+    if 'erros' in retorno:
+        erros = retorno.get('erros', [])
+        return erros[0]['erro'] if erros else 'Erro desconhecido'
+    # Erros no nível do registro
+    if 'registros' in retorno:
+        registros = retorno.get('registros', [])
+        if registros and isinstance(registros, list):
+            registro = registros[0].get('registro', {})
+        elif isinstance(registros, dict):
+            registro = registros.get('registro', {})
+        else:
+            registro = {}
+        if registro.get('status') == 'Erro':
+            erros = registro.get('erros', [])
+            return erros[0]['erro'] if erros else 'Erro no registro'
+        return 'Resposta inesperada da API'
+    return f'Status: {retorno.get("status", "Desconhecido")}'
+
+
+class LimitadorTaxa:
+    """
+    Respeita o limite de requisições por minuto do Tiny (token bucket, com
+    rajada de até um minuto de cota) e o máximo de requisições simultâneas.
+    """
+
+    def __init__(self, por_minuto: int, concorrencia: int):
+        self.capacidade = float(max(1, por_minuto))
+        self.taxa = self.capacidade / 60.0  # fichas por segundo
+        self._fichas = self.capacidade
+        self._atualizado = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._semaforo = asyncio.Semaphore(max(1, concorrencia))
+
+    async def _reservar(self) -> float:
+        """Consome uma ficha e retorna quanto tempo esperar até ela existir"""
+        async with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._atualizado) * self.taxa)
+            self._atualizado = agora
+            self._fichas -= 1
+            return 0.0 if self._fichas >= 0 else -self._fichas / self.taxa
+
+    async def __aenter__(self):
+        inicio = time.perf_counter()
+        await self._semaforo.acquire()
+        try:
+            espera = await self._reservar()
+            if espera > 0:
+                logger.debug(f"Limite do Tiny atingido, aguardando {espera:.2f}s")
+                await asyncio.sleep(espera)
+        except BaseException:
+            self._semaforo.release()
+            raise
+        ESPERA_LIMITADOR.observar(time.perf_counter() - inicio)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._semaforo.release()
+
+
+class TinyBase:
+    """Configuração e operações do Tiny, independentes do transporte HTTP"""
+
+    def __init__(
+        self,
+        token: str,
+        base_url: str = TINY_API_BASE_URL,
+        enviar_deposito: bool = False,
+        deposito_padrao: str = 'Geral',
+        origem: str = 'Dashboard',
+        cache=None,
+        ttl_cadastro: int = 900,
+        ttl_estoque: int = 10,
+        ttl_negativo: int = 60
+    ):
+        self.base_url = base_url
+        self.token = token
+        self.enviar_deposito = enviar_deposito
+        self.deposito_padrao = deposito_padrao
+        self.origem = origem  # vai nas observações padrão das movimentações
+        # Cache das leituras (CacheRedis no Flask, CacheRedisAsync no FastAPI)
+        self.cache = cache
+        self.ttl_cadastro = ttl_cadastro  # pesquisa e produto.obter
+        self.ttl_estoque = ttl_estoque
+        self.ttl_negativo = ttl_negativo  # produto inexistente
+        self._leituras = EstadoLeituras()
+
+    def _montar_requisicao(self, endpoint: str, data: Dict[str, Any]) -> Tuple[str, str, Dict[str, str]]:
+        """URL, corpo form-encoded e headers de uma chamada ao Tiny"""
+        data['token'] = self.token
+        data['formato'] = 'JSON'
+        headers = {
+            'Content-Type': 'application/x-www-form-urlencoded'
+        }
+        return f"{self.base_url}/{endpoint}", urlencode(data), headers
+
+    def _buscar_produto_por_codigo(self, codigo: str) -> Operacao:
+        try:
+            response = yield 'produtos.pesquisa.php', {'pesquisa': codigo}
+
+            if response.get('retorno', {}).get('status') == 'OK':
+                produtos = response['retorno'].get('produtos', [])
+                if produtos:
+                    # Retorna o primeiro produto encontrado
+                    return produtos[0]['produto']
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao buscar produto {codigo}: {e}")
+            return None
+
+    def _obter_produto(self, produto_id: str) -> Operacao:
+        try:
+            response = yield 'produto.obter.php', {'id': produto_id}
+
+            if response.get('retorno', {}).get('status') == 'OK':
+                return response['retorno'].get('produto')
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao obter produto {produto_id}: {e}")
+            return None
+
+    def _obter_estoque(self, produto_id: str) -> Operacao:
+        try:
+            response = yield 'produto.obter.estoque.php', {'id': produto_id}
+
+            if response.get('retorno', {}).get('status') == 'OK':
+                return response['retorno']
+            return None
+        except Exception as e:
+            logger.error(f"Erro ao obter estoque: {e}")
+            return None
+
+    def _alterar_estoque(
+        self,
+        produto_id: str,
+        quantidade: int,
+        tipo: str,
+        deposito: str,
+        observacoes: str
+    ) -> Operacao:
+        try:
+            data_atual = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+            # IMPORTANTE: Campo 'deposito' causa erro na API!
+            # Só é enviado se enviar_deposito estiver ligado.
+            estoque_data = {
+                'estoque': {  # DEVE ter wrapper 'estoque'!
+                    'idProduto': str(produto_id),  # String funciona!
+                    'tipo': tipo,  # E=Entrada, S=Saída, B=Balanço
+                    'quantidade': str(quantidade),  # String também!
+                    'data': data_atual,
+                    'precoUnitario': '25.78',  # Preço unitário
+                    'observacoes': observacoes or f'Entrada via {self.origem}'
+                }
+            }
+            if self.enviar_deposito:
+                estoque_data['estoque']['deposito'] = deposito
+            elif deposito != self.deposito_padrao:
+                logger.info(
+                    f"Depósito {deposito} não enviado ao Tiny; movimentação vai para {self.deposito_padrao}"
+                )
+            deposito_usado = deposito if self.enviar_deposito else self.deposito_padrao
+
+            # Tiny espera um objeto JSON
+            response = yield 'produto.atualizar.estoque.php', {'estoque': json.dumps(estoque_data)}
+
+            # Resposta completa só em DEBUG (o dumps custa caro a cada movimentação)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Resposta Tiny: {json.dumps(response, indent=2)}")
+
+            if response.get('retorno', {}).get('status') == 'OK':
+                return {
+                    'success': True,
+                    'message': 'Estoque atualizado com sucesso',
+                    'deposito': deposito_usado,
+                    'response': response['retorno']
+                }
+
+            erro_msg = erro_da_resposta(response)
+            logger.error(f"Erro retornado pelo Tiny ao alterar estoque: {erro_msg}")
+            return {
+                'success': False,
+                'message': f'Erro ao atualizar estoque: {erro_msg}',
+                'response': response
+            }
+        except Exception as e:
+            logger.exception(f"Exceção ao alterar estoque: {e}")
+            return {
+                'success': False,
+                'message': f'Erro na comunicação com Tiny: {str(e)}',
+                'response': None
+            }
+
+
+class TinySync(TinyBase):
+    """Fachada síncrona (requests)"""
+
+    # Threads para disparar chamadas independentes ao Tiny em paralelo
+    _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tiny")
+
+    def __init__(self, token: str, session=None, timeout: float = 30, **opcoes):
+        super().__init__(token, **opcoes)
+        self._session = session
+        self.timeout = timeout
+
+    def _criar_sessao(self):
+        import requests
+        return requests.Session()
+
+    @property
+    def session(self):
+        # Criada no primeiro uso: importar o módulo não custa nada
+        if self._session is None:
+            self._session = self._criar_sessao()
+        return self._session
+
+    def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Faz requisição para API do Tiny"""
+        url, corpo, headers = self._montar_requisicao(endpoint, data)
+        inicio = time.perf_counter()
+        try:
+            response = self.session.post(url, data=corpo, headers=headers, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Erro na requisição Tiny ({endpoint}): {e}")
+            raise
+        finally:
+            LATENCIA_TINY.observar(time.perf_counter() - inicio, endpoint=endpoint)
+
+    def _executar(self, operacao: Operacao) -> Any:
+        """Roda a operação, fazendo cada requisição que ela pedir"""
+        try:
+            pedido = next(operacao)
+            while True:
+                try:
+                    response = self._make_request(*pedido)
+                except Exception as e:
+                    marcar_falha()
+                    ERROS_TINY.inc(endpoint=pedido[0], tipo='transporte')
+                    pedido = operacao.throw(e)
+                else:
+                    if not resposta_conclusiva(response):
+                        marcar_falha()
+                        ERROS_TINY.inc(endpoint=pedido[0], tipo='tiny')
+                    pedido = operacao.send(response)
+        except StopIteration as fim:
+            return fim.value
+
+    @em_cache(lambda codigo: codigo, ttl='ttl_cadastro', ttl_negativo='ttl_negativo')
+    def buscar_produto_por_codigo(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Busca produto pelo código"""
+        return self._executar(self._buscar_produto_por_codigo(codigo))
+
+    @em_cache(lambda produto_id: produto_id, ttl='ttl_cadastro', ttl_negativo='ttl_negativo')
+    def obter_produto(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Obtém detalhes do produto pelo ID"""
+        return self._executar(self._obter_produto(produto_id))
+
+    @em_cache(lambda produto_id: produto_id, ttl='ttl_estoque', ttl_negativo='ttl_negativo')
+    def obter_estoque(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Obtém estoque atual do produto"""
+        return self._executar(self._obter_estoque(produto_id))
+
+    def alterar_estoque(
+        self,
+        produto_id: str,
+        quantidade: int,
+        tipo: str = 'E',
+        deposito: str = 'Geral',
+        observacoes: str = ''
+    ) -> Dict[str, Any]:
+        """Altera estoque do produto no Tiny (e invalida o estoque cacheado)"""
+        try:
+            return self._executar(self._alterar_estoque(produto_id, quantidade, tipo, deposito, observacoes))
+        finally:
+            # Mesmo com erro: a movimentação pode ter sido registrada
+            key = invalidar(self, TinySync.obter_estoque, produto_id)
+            if key:
+                self.cache.delete(key)
+
+    def obter_produto_e_estoque(
+        self, produto_id: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Obtém detalhes e estoque do produto em paralelo (são independentes)"""
+        futuro_estoque = self._executor.submit(self.obter_estoque, produto_id)
+        produto = self.obter_produto(produto_id)
+        return produto, futuro_estoque.result()
+
+
+class TinyAsync(TinyBase):
+    """Fachada assíncrona (httpx), com limite de taxa e de concorrência"""
+
+    def __init__(
+        self,
+        token: str,
+        client=None,
+        limitador: Optional[LimitadorTaxa] = None,
+        **opcoes
+    ):
+        super().__init__(token, **opcoes)
+        self._client = client
+        self.limitador = limitador or LimitadorTaxa(por_minuto=60, concorrencia=4)
+
+    def _criar_cliente(self):
+        import httpx
+        return httpx.AsyncClient(timeout=30.0)
+
+    @property
+    def client(self):
+        # Criado no primeiro uso (o contexto SSL do httpx custa na inicialização)
+        if self._client is None:
+            self._client = self._criar_cliente()
+        return self._client
+
+    async def fechar(self) -> None:
+        """Fecha o cliente HTTP, se chegou a ser criado"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _make_request(self, endpoint: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Faz requisição para API do Tiny"""
+        url, corpo, headers = self._montar_requisicao(endpoint, data)
+        try:
+            async with self.limitador:
+                inicio = time.perf_counter()
+                try:
+                    response = await self.client.post(url, content=corpo, headers=headers)
+                finally:
+                    LATENCIA_TINY.observar(time.perf_counter() - inicio, endpoint=endpoint)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Erro na requisição Tiny ({endpoint}): {e}")
+            raise
+
+    async def _executar(self, operacao: Operacao) -> Any:
+        """Roda a operação, fazendo cada requisição que ela pedir"""
+        try:
+            pedido = next(operacao)
+            while True:
+                try:
+                    response = await self._make_request(*pedido)
+                except Exception as e:
+                    marcar_falha()
+                    ERROS_TINY.inc(endpoint=pedido[0], tipo='transporte')
+                    pedido = operacao.throw(e)
+                else:
+                    if not resposta_conclusiva(response):
+                        marcar_falha()
+                        ERROS_TINY.inc(endpoint=pedido[0], tipo='tiny')
+                    pedido = operacao.send(response)
+        except StopIteration as fim:
+            return fim.value
+
+    @em_cache(lambda codigo: codigo, ttl='ttl_cadastro', ttl_negativo='ttl_negativo')
+    async def buscar_produto_por_codigo(self, codigo: str) -> Optional[Dict[str, Any]]:
+        """Busca produto pelo código"""
+        return await self._executar(self._buscar_produto_por_codigo(codigo))
+
+    @em_cache(lambda produto_id: produto_id, ttl='ttl_cadastro', ttl_negativo='ttl_negativo')
+    async def obter_produto(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Obtém detalhes do produto pelo ID"""
+        return await self._executar(self._obter_produto(produto_id))
+
+    @em_cache(lambda produto_id: produto_id, ttl='ttl_estoque', ttl_negativo='ttl_negativo')
+    async def obter_estoque(self, produto_id: str) -> Optional[Dict[str, Any]]:
+        """Obtém estoque atual do produto"""
+        return await self._executar(self._obter_estoque(produto_id))
+
+    async def alterar_estoque(
+        self,
+        produto_id: str,
+        quantidade: int,
+        tipo: str = 'E',
+        deposito: str = 'Geral',
+        observacoes: str = ''
+    ) -> Dict[str, Any]:
+        """Altera estoque do produto no Tiny (e invalida o estoque cacheado)"""
+        try:
+            return await self._executar(self._alterar_estoque(produto_id, quantidade, tipo, deposito, observacoes))
+        finally:
+            # Mesmo com erro: a movimentação pode ter sido registrada
+            key = invalidar(self, TinyAsync.obter_estoque, produto_id)
+            if key:
+                await self.cache.delete(key)
+
+    async def obter_produto_e_estoque(
+        self, produto_id: str
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Obtém detalhes e estoque do produto em paralelo (são independentes)"""
+        produto, estoque = await asyncio.gather(self.obter_produto(produto_id), self.obter_estoque(produto_id))
+        return produto, estoque
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.fechar()
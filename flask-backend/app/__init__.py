@@ -1 +1,105 @@
-# Flask app package
\ No newline at end of file
+"""
+App Flask do dashboard de estoque (create_app é usado por wsgi.py e app.py)
+"""
+from flask import Flask, request, send_from_directory
+from flask_cors import CORS
+import os
+from dotenv import load_dotenv
+
+try:
+    from flask_compress import Compress
+except ImportError:  # pragma: no cover - dependência opcional
+    Compress = None
+
+load_dotenv()
+
+def create_app():
+    # Se existir pasta static (build do React), é carregada uma vez na memória
+    # (a rota estática padrão do Flask fica desligada; quem serve é serve_static)
+    static_folder = os.path.abspath('static') if os.path.exists('static') else None
+    app = Flask(__name__, static_folder=None)
+    
+    from app.core.estaticos import ArquivosEstaticos
+    estaticos = ArquivosEstaticos(static_folder).carregar()
+    
+    # Configuração CORS
+    CORS(app, origins=["http://localhost:3000", "https://dashboard-estoque-v2.fly.dev"])
+    
+    # Configurações
+    app.config['JSON_AS_ASCII'] = False
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+    
+    # JSON com orjson, quando instalado
+    from app.core.json_provider import ORJSONProvider, orjson
+    if orjson:
+        app.json = ORJSONProvider(app)
+    
+    # Compressão: brotli quando o cliente aceita, senão gzip
+    app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESSAO_TAMANHO_MINIMO', 1024))
+    app.config['COMPRESS_BR_LEVEL'] = int(os.getenv('COMPRESSAO_BROTLI_QUALIDADE', 4))
+    if Compress:
+        Compress(app)
+    
+    # Duração das requisições por rota e /metrics (Prometheus)
+    from app.core.metricas import registrar_metricas
+    registrar_metricas(app)
+    
+    # Registrar blueprints
+    from app.api.estoque import estoque_bp
+    app.register_blueprint(estoque_bp, url_prefix='/api/v2/estoque')
+    
+    # Redis conecta numa thread: o worker já atende /health enquanto isso
+    # (com gunicorn sem preload, cada worker faz a sua conexão)
+    from app.core.redis_client import redis_client
+    redis_client.conectar_em_segundo_plano()
+    
+    @app.route('/health')
+    def health():
+        return {'status': 'ok', 'service': 'flask-backend'}
+    
+    # Readiness: 503 enquanto a primeira conexão com o Redis não terminou
+    @app.route('/ready')
+    def ready():
+        estado = redis_client.estado
+        if estado == 'conectando':
+            return {'status': 'iniciando', 'redis': estado}, 503
+        return {'status': 'pronto', 'redis': estado}
+    
+    # Servir React app
+    @app.route('/')
+    def serve_react():
+        if estaticos.index:
+            return estaticos.responder(estaticos.index, request)
+        return {'message': 'API Flask rodando! Use /estoque para acessar a interface.'}
+    
+    @app.route('/estoque')
+    def serve_estoque():
+        if estaticos.index:
+            return estaticos.responder(estaticos.index, request)
+        return {'message': 'Interface não encontrada. Execute npm run build primeiro.'}
+    
+    # Arquivos do build (/static/js, /static/css, favicon.ico...)
+    @app.route('/<path:caminho>')
+    def serve_static(caminho):
+        arquivo = estaticos.obter(caminho)
+        if arquivo:
+            return estaticos.responder(arquivo, request)
+        if caminho.startswith('api/'):
+            return {'error': 'Not found'}, 404
+        if estaticos.esta_no_disco(caminho):
+            # Grandes demais para a memória, listados na carga
+            return send_from_directory(static_folder, caminho)
+        if estaticos.index:
+            # Rota do React Router (/estoque/x): index.html sem consultar o disco
+            return estaticos.responder(estaticos.index, request)
+        return {'error': 'Not found'}, 404
+    
+    # Catch all para React Router
+    @app.errorhandler(404)
+    def not_found(e):
+        if estaticos.index and not request.path.startswith('/api/'):
+            return estaticos.responder(estaticos.index, request)
+        return {'error': 'Not found'}, 404
+    
+    return app
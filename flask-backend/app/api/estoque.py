@@ -1,46 +1,62 @@
 from flask import Blueprint, jsonify, request
-from ..services.tiny_api import tiny_client
+from estoque_comum.metricas import consulta_cache
+from estoque_comum.tiny import nome_movimentacao
+from ..services.tiny_api import tiny_client, extrair_saldos
 from ..core.redis_client import redis_client
+from ..core.config import config
 from ..models.estoque import ProdutoModel, EstoqueAjuste
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 estoque_bp = Blueprint('estoque', __name__)
 
+# Índice código -> id vive mais que o produto cacheado (id não muda)
+INDICE_TTL = 7 * 24 * 3600
+
+def _publicar_movimentacao(tipo, codigo, produto_id, quantidade, saldo=None):
+    """Avisa os dashboards conectados ao stream de movimentações"""
+    redis_client.publish(config.ESTOQUE_EVENTOS_CANAL, {
+        'tipo': nome_movimentacao(tipo),
+        'codigo': codigo,
+        'produto_id': produto_id,
+        'quantidade': abs(quantidade),
+        'saldo': saldo,
+        'deposito': None,
+        'origem': 'flask',
+        'timestamp': time.time()
+    })
+
 @estoque_bp.route('/produto/<codigo>', methods=['GET'])
 def obter_produto(codigo):
     """Busca produto por código"""
     try:
-        # Primeiro tenta buscar no cache Redis
-        cache_key = f"produto:codigo:{codigo}"
-        cached = redis_client.get(cache_key)
-        
-        if cached:
-            logger.info(f"Produto {codigo} encontrado no cache")
-            return jsonify(cached)
-        
-        # Se não estiver no cache, busca no Tiny
-        produto_data = tiny_client.buscar_produto_por_codigo(codigo)
-        
-        if not produto_data:
-            return jsonify({'error': f'Produto {codigo} não encontrado'}), 404
+        # Pesquisa, detalhes e estoque passam pelo cache de leitura do
+        # tiny_client. Com o id já conhecido, detalhes e estoque saem em paralelo
+        indice_key = f"produto:indice:{codigo}"
+        produto_id = redis_client.get(indice_key)
+        consulta_cache('redis', bool(produto_id))
+        produto_completo, estoque_data = (
+            tiny_client.obter_produto_e_estoque(produto_id) if produto_id else (None, None)
+        )
         
-        # Busca detalhes completos do produto
-        produto_completo = tiny_client.obter_produto(produto_data['id'])
+        if not produto_completo:
+            # Id desconhecido (ou índice desatualizado): pesquisa pelo código
+            produto_data = tiny_client.buscar_produto_por_codigo(codigo)
+            
+            if not produto_data:
+                return jsonify({'error': f'Produto {codigo} não encontrado'}), 404
+            
+            # Busca detalhes completos e estoque do produto
+            produto_completo, estoque_data = tiny_client.obter_produto_e_estoque(produto_data['id'])
+            redis_client.set(indice_key, produto_data['id'], ex=INDICE_TTL)
         
         if produto_completo:
-            # Busca estoque
-            estoque_data = tiny_client.obter_estoque(produto_data['id'])
-            
-            # Processa dados do estoque
+            # Processa dados do estoque (os depósitos vêm dentro de 'produto')
             saldo_estoque = {}
-            if estoque_data and 'depositos' in estoque_data:
-                for deposito in estoque_data['depositos']:
-                    dep = deposito.get('deposito', {})
-                    nome_deposito = dep.get('nome', 'Desconhecido')
-                    saldo = float(dep.get('saldo', 0))
-                    saldo_estoque[nome_deposito] = saldo
+            if estoque_data:
+                _, saldo_estoque = extrair_saldos(estoque_data)
                 
                 # Calcula total
                 saldo_estoque['Total'] = sum(saldo_estoque.values())
@@ -55,9 +71,6 @@ def obter_produto(codigo):
                 'saldo_estoque': saldo_estoque
             }
             
-            # Salva no cache por 5 minutos
-            redis_client.set(cache_key, produto, ex=300)
-            
             return jsonify(produto)
         
         return jsonify({'error': 'Erro ao obter detalhes do produto'}), 500
@@ -106,13 +119,11 @@ def ajustar_estoque():
         )
         
         if resultado['success']:
-            # Limpa cache do produto para forçar atualização
-            # Precisamos descobrir o código do produto para limpar o cache correto
+            # O estoque cacheado já foi invalidado pelo tiny_client; o código
+            # (para o evento) vem do cadastro, normalmente em cache
             produto = tiny_client.obter_produto(produto_id)
-            if produto and produto.get('codigo'):
-                cache_key = f"produto:codigo:{produto['codigo']}"
-                redis_client.delete(cache_key)
-                logger.info(f"Cache limpo para produto {produto['codigo']}")
+            
+            _publicar_movimentacao(tipo, produto.get('codigo') if produto else None, produto_id, quantidade)
             
             return jsonify({
                 'success': True,
@@ -149,17 +160,15 @@ def adicionar_estoque_ph510():
         )
         
         if resultado['success']:
-            # Limpa cache
-            redis_client.delete('produto:codigo:PH-510')
-            
-            # Busca estoque atualizado
+            # Busca estoque atualizado (o cacheado foi invalidado pelo ajuste)
             produto_atualizado = tiny_client.buscar_produto_por_codigo('PH-510')
             estoque_data = tiny_client.obter_estoque(produto['id'])
             
             saldo_total = 0
-            if estoque_data and 'depositos' in estoque_data:
-                for deposito in estoque_data['depositos']:
-                    saldo_total += float(deposito.get('deposito', {}).get('saldo', 0))
+            if estoque_data:
+                saldo_total = sum(extrair_saldos(estoque_data)[1].values())
+            
+            _publicar_movimentacao('E', 'PH-510', produto['id'], 1, saldo_total)
             
             return jsonify({
                 'success': True,
@@ -196,17 +205,15 @@ def remover_estoque_ph510():
         )
         
         if resultado['success']:
-            # Limpa cache
-            redis_client.delete('produto:codigo:PH-510')
-            
-            # Busca estoque atualizado
+            # Busca estoque atualizado (o cacheado foi invalidado pelo ajuste)
             produto_atualizado = tiny_client.buscar_produto_por_codigo('PH-510')
             estoque_data = tiny_client.obter_estoque(produto['id'])
             
             saldo_total = 0
-            if estoque_data and 'depositos' in estoque_data:
-                for deposito in estoque_data['depositos']:
-                    saldo_total += float(deposito.get('deposito', {}).get('saldo', 0))
+            if estoque_data:
+                saldo_total = sum(extrair_saldos(estoque_data)[1].values())
+            
+            _publicar_movimentacao('S', 'PH-510', produto['id'], 1, saldo_total)
             
             return jsonify({
                 'success': True,
@@ -10,10 +10,23 @@ class Config:
     
     # Redis
     REDIS_URL = os.getenv("VALKEY_PUBLIC_URL", "redis://localhost:6379")
+    # Pool por processo: o gunicorn.conf.py define pelo número de threads do worker
+    REDIS_MAX_CONEXOES = int(os.getenv("REDIS_MAX_CONEXOES", 10))
+    REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 2.0))  # socket e espera por conexão livre
+    REDIS_TIMEOUT_CONEXAO = float(os.getenv("REDIS_TIMEOUT_CONEXAO", 2.0))
+    REDIS_HEALTH_CHECK = int(os.getenv("REDIS_HEALTH_CHECK", 30))  # PING em conexões ociosas há mais que isso
+    REDIS_RECONECTAR = float(os.getenv("REDIS_RECONECTAR", 5.0))  # intervalo entre tentativas sem Redis
     
     # Tiny API
     TINY_API_TOKEN = os.getenv("TINY_API_TOKEN", "")
-    TINY_API_BASE_URL = "https://api.tiny.com.br/api2"
+    TINY_API_BASE_URL = os.getenv("TINY_API_BASE_URL", "https://api.tiny.com.br/api2")
+    # Cache read-through das leituras do Tiny (segundos; 0 não grava)
+    TINY_CACHE_CADASTRO_TTL = int(os.getenv("TINY_CACHE_CADASTRO_TTL", 900))  # pesquisa e produto.obter
+    TINY_CACHE_ESTOQUE_TTL = int(os.getenv("TINY_CACHE_ESTOQUE_TTL", 10))  # invalidado a cada ajuste feito aqui
+    TINY_CACHE_NEGATIVO_TTL = int(os.getenv("TINY_CACHE_NEGATIVO_TTL", 60))  # produto inexistente
+    
+    # Canal de eventos de movimentação (o stream SSE do backend FastAPI assina)
+    ESTOQUE_EVENTOS_CANAL = os.getenv("ESTOQUE_EVENTOS_CANAL", "estoque:eventos")
     
     # CORS
     BACKEND_CORS_ORIGINS = ["http://localhost:3000"]
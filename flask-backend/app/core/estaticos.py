@@ -0,0 +1,130 @@
+"""
+Build do React servido da memória (mesma ideia do backend FastAPI)
+
+Na criação do app o diretório static é lido uma vez: hash de conteúdo
+(ETag), tipo e variantes gzip/brotli para os arquivos de texto. Arquivos
+com hash no nome vão com cache imutável; index.html e afins são
+revalidados pelo ETag. Só os arquivos grandes demais para a memória
+(no_disco) são lidos do disco; qualquer outro caminho é rota do SPA.
+
+As variantes comprimidas (.gz/.br ao lado do arquivo) são reaproveitadas
+do disco quando mais novas que o original; senão são geradas e gravadas
+para o próximo worker ou boot. O Dockerfile já as gera no build, então a
+compressão máxima não pesa na partida a frio.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from typing import Dict, Optional, Set
+from flask import Request, Response
+import logging
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dependência opcional
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PADRAO_HASH = re.compile(r"\.[0-9a-f]{8,}\.")
+TIPOS_COMPRIMIVEIS = (
+    "text/", "application/javascript", "application/json", "application/manifest+json",
+    "application/xml", "image/svg+xml",
+)
+CACHE_IMUTAVEL = "public, max-age=31536000, immutable"
+CACHE_REVALIDAR = "no-cache"
+TAMANHO_MINIMO_COMPRESSAO = 1024
+TAMANHO_MAXIMO_MEMORIA = 4 * 1024 * 1024
+EXTENSOES = {'br': '.br', 'gzip': '.gz'}
+
+
+def _comprimir(conteudo: bytes, codificacao: str) -> bytes:
+    if codificacao == 'br':
+        return brotli.compress(conteudo, quality=11)
+    return gzip.compress(conteudo, compresslevel=9, mtime=0)
+
+
+def _variante(caminho: str, conteudo: bytes, codificacao: str) -> bytes:
+    """Lê a variante pré-comprimida do disco ou gera (e tenta gravar) uma nova"""
+    arquivo_variante = caminho + EXTENSOES[codificacao]
+    try:
+        if os.path.getmtime(arquivo_variante) >= os.path.getmtime(caminho):
+            with open(arquivo_variante, 'rb') as f:
+                return f.read()
+    except OSError:
+        pass
+    comprimido = _comprimir(conteudo, codificacao)
+    try:
+        with open(arquivo_variante, 'wb') as f:
+            f.write(comprimido)
+    except OSError:
+        pass  # diretório somente leitura: fica só na memória
+    return comprimido
+
+
+class Arquivo:
+    def __init__(self, caminho: str, conteudo: bytes, tipo: str):
+        self.caminho = caminho
+        self.conteudo = conteudo
+        self.tipo = tipo
+        self.hash = hashlib.blake2b(conteudo, digest_size=12).hexdigest()
+        self.imutavel = bool(PADRAO_HASH.search(os.path.basename(caminho)))
+        self.variantes: Dict[str, bytes] = {}
+        if len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO and tipo.startswith(TIPOS_COMPRIMIVEIS):
+            for codificacao in ['gzip'] + (['br'] if brotli else []):
+                self.variantes[codificacao] = _variante(caminho, conteudo, codificacao)
+
+
+class ArquivosEstaticos:
+    """Tabela em memória caminho relativo -> arquivo do build"""
+
+    def __init__(self, diretorio: Optional[str]):
+        self.diretorio = diretorio
+        self.arquivos: Dict[str, Arquivo] = {}
+        self.index: Optional[Arquivo] = None
+        # Grandes demais para a memória: os únicos servidos do disco
+        self.no_disco: Set[str] = set()
+
+    def carregar(self) -> "ArquivosEstaticos":
+        if not self.diretorio or not os.path.isdir(self.diretorio):
+            return self
+        for raiz, _, nomes in os.walk(self.diretorio):
+            for nome in nomes:
+                if nome.endswith(('.br', '.gz')):
+                    continue  # variantes pré-comprimidas, lidas junto com o original
+                caminho = os.path.join(raiz, nome)
+                relativo = os.path.relpath(caminho, self.diretorio).replace(os.sep, '/')
+                if os.path.getsize(caminho) > TAMANHO_MAXIMO_MEMORIA:
+                    self.no_disco.add(relativo)  # fica para o send_from_directory
+                    continue
+                tipo = mimetypes.guess_type(nome)[0] or 'application/octet-stream'
+                with open(caminho, 'rb') as f:
+                    self.arquivos[relativo] = Arquivo(caminho, f.read(), tipo)
+        self.index = self.arquivos.get('index.html')
+        logger.info(f"{len(self.arquivos)} arquivos estáticos carregados de {self.diretorio}")
+        return self
+
+    def obter(self, relativo: str) -> Optional[Arquivo]:
+        return self.arquivos.get(relativo.lstrip('/'))
+
+    def esta_no_disco(self, relativo: str) -> bool:
+        return relativo.lstrip('/') in self.no_disco
+
+    def responder(self, arquivo: Arquivo, request: Request) -> Response:
+        """Escolhe a variante pelo Accept-Encoding e responde 304 se o ETag bater"""
+        aceita = request.headers.get('Accept-Encoding', '')
+        codificacao = next((c for c in ('br', 'gzip') if c in arquivo.variantes and c in aceita), None)
+        etag = f"{arquivo.hash}-{codificacao}" if codificacao else arquivo.hash
+
+        resposta = Response(
+            arquivo.variantes[codificacao] if codificacao else arquivo.conteudo,
+            mimetype=arquivo.tipo
+        )
+        resposta.set_etag(etag)
+        resposta.headers['Cache-Control'] = CACHE_IMUTAVEL if arquivo.imutavel else CACHE_REVALIDAR
+        resposta.headers['Vary'] = 'Accept-Encoding'
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+        return resposta.make_conditional(request)
@@ -0,0 +1,42 @@
+"""
+Métricas HTTP do backend Flask e o endpoint /metrics
+
+Mede cada requisição (before_request/after_request) no histograma
+http_requisicao_segundos por método, regra da rota (ex:
+/api/v2/estoque/produto/<codigo>) e status, o mesmo do FastAPI. As
+chamadas ao Tiny, o Redis e as camadas de cache são medidos pelo
+estoque_comum; /metrics exporta tudo no formato do Prometheus, somando
+os workers do gunicorn (gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR).
+"""
+import time
+from flask import Flask, Response, g, request
+from estoque_comum.metricas import CONTENT_TYPE, coletar, exportar, iniciar_gravacao, registro
+
+REQUISICOES = registro.histograma(
+    "http_requisicao_segundos",
+    "Duração das requisições HTTP por método, rota e status",
+    ("metodo", "rota", "status"),
+)
+
+
+def registrar_metricas(app: Flask) -> None:
+    iniciar_gravacao()
+
+    @app.before_request
+    def iniciar_medicao():
+        g.inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def observar_requisicao(response):
+        inicio = g.pop('inicio_requisicao', None)
+        if inicio is not None:
+            rota = request.url_rule.rule if request.url_rule else 'desconhecida'
+            REQUISICOES.observar(
+                time.perf_counter() - inicio,
+                metodo=request.method, rota=rota, status=str(response.status_code)
+            )
+        return response
+
+    @app.route('/metrics')
+    def metricas():
+        return Response(exportar(coletar()), content_type=CONTENT_TYPE)
@@ -0,0 +1,145 @@
+"""
+Configuração do gunicorn para produção
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+As rotas passam quase todo o tempo esperando a API do Tiny e o Redis,
+então o padrão é o worker gthread (vários threads por processo). Com
+GUNICORN_WORKER_CLASS=gevent cada worker atende centenas de conexões em
+greenlets (requer `pip install gevent`; sem ele volta para gthread).
+
+Número de workers vem da CPU disponível (2 * CPUs + 1) limitado pela
+memória do container (cgroup), para não estourar os 512MB do fly.io.
+Tudo pode ser sobrescrito por variável de ambiente:
+
+    GUNICORN_WORKER_CLASS        gthread (padrão) | gevent | sync
+    GUNICORN_WORKERS             número de processos
+    GUNICORN_THREADS             threads por worker gthread (padrão 8)
+    GUNICORN_WORKER_CONNECTIONS  conexões por worker gevent (padrão 200)
+    GUNICORN_MEMORIA_POR_WORKER_MB  estimativa de RSS por worker (padrão 128)
+    GUNICORN_TIMEOUT             segundos (padrão 60; o Tiny tem timeout de 30)
+    REDIS_MAX_CONEXOES           pool Redis por worker (padrão threads + 2)
+    PROMETHEUS_MULTIPROC_DIR     onde os workers gravam as métricas somadas
+                                 em /metrics (padrão /dev/shm/estoque-metricas)
+"""
+import os
+
+
+def _cpus() -> int:
+    # CPUs realmente disponíveis para o processo (affinity/cpuset do container)
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:  # pragma: no cover - macOS
+        return os.cpu_count() or 1
+
+
+def _memoria_mb() -> int:
+    """Limite de memória do container (cgroup v2/v1) ou memória física"""
+    for caminho in ('/sys/fs/cgroup/memory.max', '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(caminho) as f:
+                valor = f.read().strip()
+        except OSError:
+            continue
+        # 'max' (v2) ou um número absurdo (v1) significam sem limite
+        if valor.isdigit() and int(valor) < 1 << 50:
+            return int(valor) // (1024 * 1024)
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):  # pragma: no cover
+        return 512
+
+
+# Avisos da leitura da configuração, registrados pelo when_ready no log do gunicorn
+_avisos = []
+
+
+def _classe_worker() -> str:
+    classe = os.getenv('GUNICORN_WORKER_CLASS', 'gthread').lower()
+    if classe == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            _avisos.append("gevent não instalado, usando gthread")
+            return 'gthread'
+    return classe
+
+
+def _workers(cpus: int, memoria_mb: int) -> int:
+    if os.getenv('GUNICORN_WORKERS'):
+        return max(1, int(os.environ['GUNICORN_WORKERS']))
+    por_worker = int(os.getenv('GUNICORN_MEMORIA_POR_WORKER_MB', 128))
+    # Deixa 25% da memória para o master, page cache e picos
+    pela_memoria = int(memoria_mb * 0.75) // por_worker
+    return max(1, min(2 * cpus + 1, pela_memoria))
+
+
+cpus = _cpus()
+memoria_mb = _memoria_mb()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = _classe_worker()
+workers = _workers(cpus, memoria_mb)
+threads = int(os.getenv('GUNICORN_THREADS', 8)) if worker_class == 'gthread' else 1
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 200))
+
+# Pool Redis de cada worker (lido por app/core/config.py nos processos filhos):
+# uma conexão por thread, mais folga; com gevent, limitado para não estourar
+# o máximo de conexões do Redis gerenciado
+if worker_class == 'gevent':
+    os.environ.setdefault('REDIS_MAX_CONEXOES', str(min(worker_connections, 50)))
+else:
+    os.environ.setdefault('REDIS_MAX_CONEXOES', str(threads + 2))
+
+# Uma chamada ao Tiny pode levar até 30s (timeout do requests)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recicla workers aos poucos (vazamentos de memória não derrubam o container)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+# Cada worker carrega o app (e o build do React) por conta própria: com
+# preload as conexões Redis abertas no master seriam herdadas pelos filhos
+preload_app = False
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+# /tmp do container pode ser disco; heartbeat dos workers em memória
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Cada worker grava as métricas dele aqui e /metrics soma todos (lido por
+# estoque_comum.metricas nos processos filhos)
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(worker_tmp_dir or '/tmp', 'estoque-metricas')
+)
+
+
+def on_starting(server):
+    from estoque_comum import metricas
+    # Instantâneos de uma execução anterior somariam contagens antigas
+    metricas.limpar(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def when_ready(server):
+    for aviso in _avisos:
+        server.log.warning(aviso)
+    server.log.info(
+        f"{workers} workers {worker_class}"
+        + (f" x {threads} threads" if worker_class == 'gthread' else '')
+        + f" ({cpus} CPUs, {memoria_mb}MB), pool Redis de {os.environ['REDIS_MAX_CONEXOES']} por worker"
+    )
+
+
+def worker_exit(server, worker):
+    from estoque_comum import metricas
+    metricas.gravar(os.environ['PROMETHEUS_MULTIPROC_DIR'])
+
+
+def child_exit(server, worker):
+    from estoque_comum import metricas
+    # Os contadores do worker reciclado entram no total dos encerrados
+    metricas.consolidar_processo(os.environ['PROMETHEUS_MULTIPROC_DIR'], worker.pid)
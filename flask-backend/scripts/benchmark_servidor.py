@@ -0,0 +1,165 @@
+"""
+Benchmark do servidor Flask: `python app.py` x gunicorn (gthread/gevent)
+
+Sobe um Tiny falso local (cada chamada demora --atraso segundos, como a
+API real), inicia o backend no modo pedido apontando para ele e dispara
+requisições concorrentes em /produto/{codigo}. Sem Redis, toda requisição
+vai ao Tiny: é o pior caso e o que mais depende de concorrência de I/O.
+
+Uso (de dentro de flask-backend/):
+    python scripts/benchmark_servidor.py --modo dev
+    python scripts/benchmark_servidor.py --modo gunicorn --worker-class gthread
+    python scripts/benchmark_servidor.py --modo gunicorn --worker-class gevent --concorrencia 64
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+import requests
+
+PRODUTO = {'id': '123456', 'codigo': 'PH-510', 'nome': 'Produto de teste', 'unidade': 'UN', 'preco': '10.00'}
+RESPOSTAS = {
+    'produtos.pesquisa.php': {'status': 'OK', 'produtos': [{'produto': PRODUTO}]},
+    'produto.obter.php': {'status': 'OK', 'produto': PRODUTO},
+    'produto.obter.estoque.php': {'status': 'OK', 'produto': {
+        **PRODUTO, 'saldo': 10, 'depositos': [{'deposito': {'nome': 'Geral', 'saldo': 10}}]
+    }},
+}
+
+
+def tiny_falso(atraso: float) -> ThreadingHTTPServer:
+    """Servidor HTTP que imita os endpoints do Tiny usados por /produto"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            tamanho = int(self.headers.get('Content-Length', 0))
+            self.rfile.read(tamanho)
+            time.sleep(atraso)
+            corpo = json.dumps({'retorno': RESPOSTAS.get(self.path.rsplit('/', 1)[-1], {'status': 'Erro'})})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo.encode())
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
+
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def iniciar_backend(args, porta: int, url_tiny: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'PORT': str(porta),
+        'TINY_API_BASE_URL': url_tiny,
+        # Redis inalcançável: mede só o caminho até o Tiny
+        'VALKEY_PUBLIC_URL': os.getenv('BENCHMARK_REDIS_URL', 'redis://127.0.0.1:1'),
+        'GUNICORN_WORKER_CLASS': args.worker_class,
+    }
+    if args.workers:
+        env['GUNICORN_WORKERS'] = str(args.workers)
+    if args.threads:
+        env['GUNICORN_THREADS'] = str(args.threads)
+    if args.modo == 'dev':
+        comando = [sys.executable, 'app.py']
+    else:
+        comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:application']
+    processo = subprocess.Popen(comando, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            if requests.get(f'http://127.0.0.1:{porta}/health', timeout=1).ok:
+                return processo
+        except requests.RequestException:
+            time.sleep(0.2)
+    processo.terminate()
+    raise SystemExit('Backend não respondeu /health em 30s')
+
+
+def carga(url: str, concorrencia: int, duracao: float) -> Dict[str, float]:
+    """Cada thread repete a requisição até acabar o tempo; retorna vazão e latências"""
+    tempos: List[float] = []
+    erros = 0
+    trava = threading.Lock()
+    fim = time.monotonic() + duracao
+
+    def cliente():
+        nonlocal erros
+        sessao = requests.Session()
+        while time.monotonic() < fim:
+            inicio = time.perf_counter()
+            try:
+                ok = sessao.get(url, timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            decorrido = (time.perf_counter() - inicio) * 1000
+            with trava:
+                if ok:
+                    tempos.append(decorrido)
+                else:
+                    erros += 1
+
+    with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+        for _ in range(concorrencia):
+            executor.submit(cliente)
+
+    tempos.sort()
+    return {
+        'req_s': len(tempos) / duracao,
+        'p50_ms': statistics.median(tempos) if tempos else 0.0,
+        'p95_ms': tempos[max(0, int(len(tempos) * 0.95) - 1)] if tempos else 0.0,
+        'erros': erros,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modo', choices=['dev', 'gunicorn'], default='gunicorn')
+    parser.add_argument('--worker-class', default='gthread')
+    parser.add_argument('--workers', type=int, help='Sobrescreve o cálculo do gunicorn.conf.py')
+    parser.add_argument('--threads', type=int)
+    parser.add_argument('--concorrencia', type=int, default=32)
+    parser.add_argument('--duracao', type=float, default=10.0)
+    parser.add_argument('--atraso', type=float, default=0.2, help='Latência simulada de cada chamada ao Tiny (s)')
+    args = parser.parse_args()
+
+    tiny = tiny_falso(args.atraso)
+    url_tiny = f'http://127.0.0.1:{tiny.server_address[1]}'
+    porta = porta_livre()
+    backend = iniciar_backend(args, porta, url_tiny)
+    try:
+        url = f'http://127.0.0.1:{porta}/api/v2/estoque/produto/PH-510'
+        requests.get(url, timeout=60)  # aquece
+        r = carga(url, args.concorrencia, args.duracao)
+    finally:
+        backend.terminate()
+        backend.wait()
+        tiny.shutdown()
+
+    modo = 'python app.py' if args.modo == 'dev' else f'gunicorn {args.worker_class}'
+    print(f"{modo:<20} concorrência {args.concorrencia:>3}  {r['req_s']:>7.1f} req/s  "
+          f"p50 {r['p50_ms']:>7.1f}ms  p95 {r['p95_ms']:>7.1f}ms  erros {r['erros']}")
+
+
+if __name__ == '__main__':
+    main()